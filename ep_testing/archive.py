@@ -0,0 +1,220 @@
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+import json
+import os
+import posixpath
+import tarfile
+import threading
+from typing import Dict, List
+import zipfile
+
+from ep_testing.cache import unique_temp_path
+from ep_testing.exceptions import EPTestingException
+
+
+def path_matches(relative_path: str, pattern: str) -> bool:
+    """Whether an install-relative path is, or is inside, something matching the pattern
+
+    Patterns are matched one path component at a time, so '*' never crosses a '/': 'lib*' matches 'libenergyplusapi.so'
+    and everything under a top level 'lib' directory, but not 'ExampleFiles/library.idf'.  '' matches everything."""
+    if not pattern:
+        return True
+    path_parts = relative_path.split('/')
+    pattern_parts = pattern.replace('\\', '/').strip('/').split('/')
+    if len(path_parts) < len(pattern_parts):
+        return False
+    return all(fnmatchcase(p, q) for p, q in zip(path_parts, pattern_parts))
+
+
+class ArchiveIndex:
+    """The member list of an installer archive, with offsets and sizes, built once and kept beside the archive
+
+    For a zip the offsets are those of the local headers, for a tar.gz they are offsets into the decompressed stream;
+    either way, knowing the members without unpacking anything is what lets tests extract only what they need.  All
+    installers put the install in a single top level directory, which is the root of the install-relative names."""
+
+    Suffix = '.index.json'
+
+    def __init__(self, archive_path: str):
+        self.archive_path = archive_path
+        self.index_path = archive_path + self.Suffix
+        self.format = 'zip' if archive_path.lower().endswith('.zip') else 'tar'
+        archive_size = os.path.getsize(archive_path)
+        content = None
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path) as f:
+                    content = json.load(f)
+            except ValueError:
+                content = None
+        if content is None or content.get('archive_size') != archive_size:
+            content = {'archive_size': archive_size, 'members': self._scan()}
+            temp_path = unique_temp_path(self.index_path)
+            with open(temp_path, 'w') as f:
+                json.dump(content, f)
+            os.replace(temp_path, self.index_path)
+        self.members = content['members']
+        roots = set(m['name'].split('/')[0] for m in self.members)
+        if len(roots) != 1:
+            raise EPTestingException('Archive %s does not hold a single top level directory, problem.' % archive_path)
+        self.root = roots.pop()
+        self.by_name = {m['name']: m for m in self.members}
+
+    def _scan(self) -> List[dict]:
+        members = []
+        try:
+            if self.format == 'zip':
+                with zipfile.ZipFile(self.archive_path) as archive:
+                    for info in archive.infolist():
+                        members.append({
+                            'name': info.filename.rstrip('/'), 'type': 'dir' if info.is_dir() else 'file',
+                            'offset': info.header_offset, 'size': info.file_size,
+                            'compressed_size': info.compress_size, 'link': None,
+                            'mode': (info.external_attr >> 16) & 0o7777 or None,
+                        })
+            else:
+                with tarfile.open(self.archive_path, 'r:gz') as archive:
+                    for info in archive:
+                        if info.isdir():
+                            member_type = 'dir'
+                        elif info.issym():
+                            member_type = 'symlink'
+                        elif info.islnk():
+                            member_type = 'hardlink'
+                        else:
+                            member_type = 'file'
+                        members.append({
+                            'name': posixpath.normpath(info.name), 'type': member_type, 'offset': info.offset_data,
+                            'size': info.size, 'compressed_size': None, 'link': info.linkname or None,
+                            'mode': info.mode,
+                        })
+        except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+            raise EPTestingException('Could not index archive %s; error: %s' % (self.archive_path, str(e)))
+        return members
+
+    def relative_name(self, member: dict) -> str:
+        return member['name'][len(self.root) + 1:]
+
+    def select(self, patterns: List[str]) -> List[dict]:
+        """Members matching any of the install-relative patterns, plus whatever their links point at, archive order"""
+        selected = {
+            m['name'] for m in self.members if any(path_matches(self.relative_name(m), p) for p in patterns)
+        }
+        pending = list(selected)
+        while pending:
+            member = self.by_name.get(pending.pop())
+            if member is None or not member['link']:
+                continue
+            if member['type'] == 'symlink':
+                target = posixpath.normpath(posixpath.join(posixpath.dirname(member['name']), member['link']))
+            else:
+                target = posixpath.normpath(member['link'])
+            for name in self.by_name:
+                # a link to a directory needs the whole directory
+                if (name == target or name.startswith(target + '/')) and name not in selected:
+                    selected.add(name)
+                    pending.append(name)
+        return [m for m in self.members if m['name'] in selected]
+
+
+class SelectiveExtractor:
+    """Extracts members of an installer archive on demand, only the ones asked for and each at most once
+
+    Zip members are spread over a pool of threads, each with its own handle on the archive, since inflating releases
+    the GIL.  A tar.gz can only be read front to back, so each request is one pass over the stream that extracts the
+    selected members and stops after the last one.  What has been extracted is recorded beside the extracted tree, so
+    a cached install picks up where the previous run left off."""
+
+    State_file_name = '.ep_testing_extracted.json'
+
+    def __init__(self, archive_path: str, extract_path: str, jobs: int = None):
+        self.index = ArchiveIndex(archive_path)
+        self.archive_path = archive_path
+        self.extract_path = extract_path
+        self.install_root = os.path.join(extract_path, self.index.root)
+        self.jobs = jobs if jobs else os.cpu_count() or 1
+        self.state_path = os.path.join(extract_path, self.State_file_name)
+        self._lock = threading.Lock()
+        self._extracted = set()
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path) as f:
+                    self._extracted = set(json.load(f))
+            except ValueError:
+                self._extracted = set()
+        os.makedirs(self.install_root, exist_ok=True)
+
+    def ensure(self, patterns: List[str]) -> int:
+        """Extracts every not yet extracted member matching the patterns, returns how many were extracted"""
+        with self._lock:
+            members = [m for m in self.index.select(patterns) if m['name'] not in self._extracted]
+            if not members:
+                return 0
+            try:
+                if self.index.format == 'zip':
+                    self._extract_zip(members)
+                else:
+                    self._extract_tar(members)
+            except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+                raise EPTestingException('Could not extract from %s; error: %s' % (self.archive_path, str(e)))
+            self._extracted.update(m['name'] for m in members)
+            temp_path = unique_temp_path(self.state_path)
+            with open(temp_path, 'w') as f:
+                json.dump(sorted(self._extracted), f)
+            os.replace(temp_path, self.state_path)
+            return len(members)
+
+    def _extract_zip(self, members: List[dict]) -> None:
+        # balance the workers by compressed bytes, largest members dealt out first
+        batches = [[] for _ in range(min(self.jobs, len(members)))]
+        loads = [0] * len(batches)
+        for member in sorted(members, key=lambda m: -(m['compressed_size'] or 0)):
+            lightest = loads.index(min(loads))
+            batches[lightest].append(member['name'] + '/' if member['type'] == 'dir' else member['name'])
+            loads[lightest] += member['compressed_size'] or 0
+
+        def extract_batch(names: List[str]) -> None:
+            with zipfile.ZipFile(self.archive_path) as archive:
+                for name in names:
+                    info = archive.getinfo(name)
+                    path = archive.extract(info, self.extract_path)
+                    mode = info.external_attr >> 16
+                    if mode and not info.is_dir():
+                        os.chmod(path, mode & 0o7777)
+
+        with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            # list() so the first failure is raised here
+            list(executor.map(extract_batch, batches))
+
+    def _extract_tar(self, members: List[dict]) -> None:
+        remaining = set(m['name'] for m in members)
+        with tarfile.open(self.archive_path, 'r:gz') as archive:
+            for info in archive:
+                name = posixpath.normpath(info.name)
+                if name not in remaining:
+                    continue
+                if hasattr(tarfile, 'data_filter'):
+                    archive.extract(info, self.extract_path, filter='tar')
+                else:
+                    archive.extract(info, self.extract_path)
+                remaining.discard(name)
+                if not remaining:
+                    break
+
+
+_lazy_installs: Dict[str, SelectiveExtractor] = {}
+_lazy_installs_lock = threading.Lock()
+
+
+def register_lazy_install(extractor: SelectiveExtractor) -> None:
+    with _lazy_installs_lock:
+        _lazy_installs[os.path.normpath(extractor.install_root)] = extractor
+
+
+def ensure_install_paths(install_root: str, patterns: List[str]) -> int:
+    """Makes sure the install-relative paths exist on a lazily extracted install; anything else is left alone"""
+    with _lazy_installs_lock:
+        extractor = _lazy_installs.get(os.path.normpath(install_root))
+    if extractor is None:
+        return 0
+    return extractor.ensure(patterns)
@@ -0,0 +1,163 @@
+from itertools import combinations
+import json
+from math import erf, factorial, sqrt
+import os
+from tempfile import mkdtemp
+from typing import List
+
+from ep_testing.archive import ensure_install_paths
+from ep_testing.exceptions import EPTestingException
+from ep_testing.process import shared_runner
+from ep_testing.tests.base import example_file_paths, RUNTIME_PATHS
+
+
+def measured_run(command_line: List[str], cwd: str, timeout: float = None) -> dict:
+    """Runs a child to completion through the shared process runner and returns its wall time, user/sys CPU and peak
+    RSS, the last three where the platform reports the child's resource usage; the output goes to run.log in cwd"""
+    result = shared_runner().run(command_line, cwd=cwd, timeout=timeout, log_path=os.path.join(cwd, 'run.log'))
+    usage = result.usage if result.usage else {}
+    return {
+        'returncode': result.returncode, 'timed_out': result.timed_out, 'wall_time': result.duration,
+        'user_time': usage.get('user_time'), 'sys_time': usage.get('system_time'),
+        'peak_rss_kb': usage.get('max_rss_kb'),
+    }
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Linearly interpolated percentile, fraction in [0, 1]"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _u_statistic(slower: List[float], faster: List[float]) -> float:
+    return sum(1.0 if a > b else 0.5 if a == b else 0.0 for a in slower for b in faster)
+
+
+def mann_whitney_greater(candidate: List[float], baseline: List[float]) -> float:
+    """One-sided Mann-Whitney U p-value for the candidate samples being larger than the baseline samples
+
+    Small samples, the usual case here, get the exact permutation distribution; larger ones use the normal
+    approximation with a continuity correction."""
+    n, m = len(candidate), len(baseline)
+    observed = _u_statistic(candidate, baseline)
+    pooled = candidate + baseline
+    if factorial(n + m) // (factorial(n) * factorial(m)) <= 200000:
+        at_least_as_extreme = 0
+        total = 0
+        for chosen in combinations(range(n + m), n):
+            chosen_set = set(chosen)
+            sample = [pooled[i] for i in chosen]
+            rest = [pooled[i] for i in range(n + m) if i not in chosen_set]
+            total += 1
+            if _u_statistic(sample, rest) >= observed:
+                at_least_as_extreme += 1
+        return at_least_as_extreme / total
+    mean = n * m / 2.0
+    sigma = sqrt(n * m * (n + m + 1) / 12.0)
+    z = (observed - mean - 0.5) / sigma
+    return 0.5 * (1.0 - erf(z / sqrt(2.0)))
+
+
+class SimulationBenchmark:
+    """Times a set of ExampleFiles simulations on this release and the last release and flags slowdowns
+
+    Every file is run the requested number of times on each install, alternating between the two so that drift in
+    machine load hits both equally, and each run gets a fresh directory.  A file is flagged when the median wall time
+    grew by more than the threshold and the one-sided Mann-Whitney test says the difference is significant.  The runs
+    are deliberately serial, since concurrent simulations would measure contention instead of EnergyPlus."""
+
+    def __init__(self, this_install: str, last_install: str, test_files: List[str], repetitions: int = 5,
+                 threshold: float = 0.05, alpha: float = 0.05, eplus_args: List[str] = None, working_dir: str = None,
+                 timeout: float = None):
+        self.installs = {'this': this_install, 'last': last_install}
+        self.test_files = test_files
+        self.repetitions = repetitions
+        self.threshold = threshold
+        self.alpha = alpha
+        self.eplus_args = eplus_args if eplus_args is not None else ['-D']
+        self.working_dir = working_dir if working_dir else mkdtemp()
+        # per simulation, a hung release is killed and fails the benchmark instead of stalling it
+        self.timeout = timeout
+        self.results = []
+
+    def _run_once(self, version: str, test_file: str, repetition: int) -> dict:
+        install = self.installs[version]
+        run_dir = os.path.join(self.working_dir, '%s_%s_%i' % (version, os.path.splitext(test_file)[0], repetition))
+        os.makedirs(run_dir)
+        idf_path = os.path.join(install, 'ExampleFiles', test_file)
+        measurement = measured_run(
+            [os.path.join(install, 'energyplus')] + self.eplus_args + [idf_path], run_dir, self.timeout
+        )
+        if measurement['timed_out']:
+            raise EPTestingException('EnergyPlus (%s release) timed out after %.0fs on %s, see %s' % (
+                version, measurement['wall_time'], test_file, run_dir
+            ))
+        if measurement['returncode'] != 0:
+            raise EPTestingException('EnergyPlus (%s release) failed on %s, see %s' % (version, test_file, run_dir))
+        return measurement
+
+    @staticmethod
+    def _statistics(samples: List[dict]) -> dict:
+        wall = [s['wall_time'] for s in samples]
+        stats = {'median': percentile(wall, 0.5), 'p90': percentile(wall, 0.9), 'min': min(wall), 'max': max(wall)}
+        if samples[0]['user_time'] is not None:
+            stats['user_median'] = percentile([s['user_time'] for s in samples], 0.5)
+            stats['sys_median'] = percentile([s['sys_time'] for s in samples], 0.5)
+            stats['peak_rss_kb'] = max(s['peak_rss_kb'] for s in samples)
+        return stats
+
+    def run(self) -> List[dict]:
+        for install in self.installs.values():
+            ensure_install_paths(install, RUNTIME_PATHS + [p for f in self.test_files for p in example_file_paths(f)])
+        for test_file in self.test_files:
+            samples = {'this': [], 'last': []}
+            for repetition in range(self.repetitions):
+                for version in ('last', 'this'):
+                    samples[version].append(self._run_once(version, test_file, repetition))
+            this_stats = self._statistics(samples['this'])
+            last_stats = self._statistics(samples['last'])
+            change = this_stats['median'] / last_stats['median'] - 1.0
+            p_value = mann_whitney_greater(
+                [s['wall_time'] for s in samples['this']], [s['wall_time'] for s in samples['last']]
+            )
+            result = {
+                'test_file': test_file, 'this': this_stats, 'last': last_stats, 'median_change': change,
+                'p_value': p_value, 'regression': change > self.threshold and p_value < self.alpha,
+                'samples': samples,
+            }
+            print('* Benchmarked "%s": median %.2fs -> %.2fs (%+.1f%%, p=%.3f)%s' % (
+                test_file, last_stats['median'], this_stats['median'], 100 * change, p_value,
+                ' [REGRESSION]' if result['regression'] else ''
+            ))
+            self.results.append(result)
+        return self.results
+
+    def summary_table(self) -> str:
+        width = max([len(r['test_file']) for r in self.results] + [len('File')])
+        lines = ['%-*s  %9s  %9s  %9s  %9s  %8s  %7s  %s' % (
+            width, 'File', 'Last med', 'This med', 'This p90', 'This CPU', 'Change', 'p', 'Peak RSS'
+        )]
+        for r in self.results:
+            cpu = r['this'].get('user_median', 0.0) + r['this'].get('sys_median', 0.0)
+            rss = '%i MB' % (r['this']['peak_rss_kb'] // 1024) if 'peak_rss_kb' in r['this'] else '-'
+            lines.append('%-*s  %8.2fs  %8.2fs  %8.2fs  %8.2fs  %+7.1f%%  %7.3f  %s%s' % (
+                width, r['test_file'], r['last']['median'], r['this']['median'], r['this']['p90'], cpu,
+                100 * r['median_change'], r['p_value'], rss, '  REGRESSION' if r['regression'] else ''
+            ))
+        return '\n'.join(lines)
+
+    def write_report(self, report_dir: str) -> str:
+        os.makedirs(report_dir, exist_ok=True)
+        report_path = os.path.join(report_dir, 'ep_testing_benchmark.json')
+        with open(report_path, 'w') as f:
+            json.dump({
+                'installs': self.installs, 'repetitions': self.repetitions, 'threshold': self.threshold,
+                'alpha': self.alpha, 'eplus_args': self.eplus_args, 'results': self.results,
+            }, f, indent=2)
+        return report_path
+
+    def regressions(self) -> List[dict]:
+        return [r for r in self.results if r['regression']]
@@ -0,0 +1,368 @@
+from contextlib import contextmanager
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+from ep_testing.exceptions import EPTestingException
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+
+_path_locks: Dict[str, threading.Lock] = {}
+_path_locks_lock = threading.Lock()
+
+
+@contextmanager
+def exclusive_lock(lock_path: str):
+    """Holds an exclusive lock on the file for the duration of the block, against other threads and processes"""
+    with _path_locks_lock:
+        thread_lock = _path_locks.setdefault(os.path.abspath(lock_path), threading.Lock())
+    with thread_lock, open(lock_path, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ten seconds, keep waiting
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def unique_temp_path(path: str) -> str:
+    # one per writer, so concurrent writers never rename each other's file into place
+    return '%s.%i.%i.tmp' % (path, os.getpid(), threading.get_ident())
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.lstat(os.path.join(root, f)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class InstallerCache:
+    """Persistent on-disk cache of downloaded installers and their extracted trees
+
+    Each entry lives in its own directory named by a digest of the release tag and the asset identity (id, size and,
+    when Github provides one, the content digest), so two run configurations that share an asset share the entry.
+    Entries are built in a staging directory and only renamed into place once extraction succeeded, so an interrupted
+    run never leaves behind something that looks like a hit.  A small json index tracks sizes and last use times, and
+    the least recently used entries are evicted whenever the total size goes over the cap.  Several downloaders, in
+    one process or several, can share the cache: every read-modify-write of the index holds a lock file beside it, and
+    an entry is staged and committed by one of them at a time, under a lock file of its own (see `building`)."""
+
+    Index_file_name = 'index.json'
+
+    def __init__(self, cache_dir: str, max_size_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except Exception as e:
+            raise EPTestingException('Could not create installer cache at %s; error: %s' % (self.cache_dir, str(e)))
+        self.index_path = os.path.join(self.cache_dir, self.Index_file_name)
+        self.lock_path = self.index_path + '.lock'
+
+    @staticmethod
+    def key(release_tag: str, asset: dict) -> str:
+        identity = '|'.join([release_tag, str(asset['id']), str(asset['size']), str(asset.get('digest', ''))])
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()[:24]
+
+    def entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def building(self, key: str):
+        """Lock to hold from a lookup miss through the commit, so only one downloader stages the entry; the others
+        wait, and should look the key up again once they have it"""
+        return exclusive_lock(os.path.join(self.cache_dir, key + '.lock'))
+
+    def staging_dir(self, key: str) -> str:
+        # left in place from an interrupted run on purpose, so a partially downloaded archive can be resumed
+        staging = os.path.join(self.cache_dir, key + '.partial')
+        os.makedirs(staging, exist_ok=True)
+        return staging
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """Returns the entry metadata if the key is cached and its extracted tree is still intact"""
+        with exclusive_lock(self.lock_path):
+            index = self._read_index()
+            entry = index.get(key)
+            if entry is None:
+                return None
+            if not os.path.isdir(self.install_path(key, entry)):
+                # somebody cleaned up underneath us, forget about it
+                self._remove(key, index)
+                self._write_index(index)
+                return None
+            entry['last_used'] = time.time()
+            self._write_index(index)
+            return entry
+
+    def install_path(self, key: str, entry: dict) -> str:
+        return os.path.join(self.entry_dir(key), entry['install_subpath'])
+
+    def commit(self, key: str, staging: str, metadata: dict) -> dict:
+        """Moves a fully populated staging directory into place and evicts old entries to respect the size cap; call
+        it with `building` held"""
+        final_dir = self.entry_dir(key)
+        if os.path.exists(final_dir):
+            shutil.rmtree(final_dir)
+        os.rename(staging, final_dir)
+        entry = dict(metadata)
+        entry['size_on_disk'] = directory_size(final_dir)
+        entry['created'] = entry['last_used'] = time.time()
+        with exclusive_lock(self.lock_path):
+            index = self._read_index()
+            index[key] = entry
+            self._evict(index, keep=key)
+            self._write_index(index)
+        return entry
+
+    def _evict(self, index: dict, keep: str) -> None:
+        total = sum(e['size_on_disk'] for e in index.values())
+        for key in sorted(index, key=lambda k: index[k]['last_used']):
+            if total <= self.max_size_bytes:
+                break
+            if key == keep:
+                continue
+            total -= index[key]['size_on_disk']
+            self._remove(key, index)
+
+    def _remove(self, key: str, index: dict) -> None:
+        shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+        index.pop(key, None)
+
+    def _read_index(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except ValueError:
+            # a corrupt index just means a cold cache, the entries get rebuilt as needed
+            return {}
+
+    def _write_index(self, index: dict) -> None:
+        temp_path = unique_temp_path(self.index_path)
+        with open(temp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(temp_path, self.index_path)
+
+
+class MetadataCache:
+    """Small on-disk cache of Github API responses, revalidated with ETag / If-None-Match
+
+    Github answers a conditional request for an unchanged resource with an empty 304, which does not count against the
+    rate limit, so keeping the last body and its ETag turns repeat lookups into cheap revalidations."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = os.path.join(cache_dir, 'metadata')
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except Exception as e:
+            raise EPTestingException('Could not create metadata cache at %s; error: %s' % (self.cache_dir, str(e)))
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def load(self, url: str) -> Optional[dict]:
+        path = self._path(url)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except ValueError:
+            return None
+
+    def store(self, url: str, etag: str, body: object, headers: dict) -> None:
+        path = self._path(url)
+        temp_path = unique_temp_path(path)
+        with open(temp_path, 'w') as f:
+            json.dump({'url': url, 'etag': etag, 'body': body, 'headers': headers}, f)
+        os.replace(temp_path, path)
+
+
+def package_code_digest() -> str:
+    """Digest of the test code and templates, so any change to how a test runs invalidates its cached results
+
+    config.py is left out on purpose: the settings that matter to a test reach it through its kwargs, which are part
+    of the key anyway, and the rest (report locations, job counts, ...) should not force a rerun."""
+    package_dir = os.path.dirname(os.path.realpath(__file__))
+    hasher = hashlib.sha256()
+    for root, dirs, files in os.walk(package_dir):
+        dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+        for file_name in sorted(files):
+            path = os.path.join(root, file_name)
+            if path == os.path.join(package_dir, 'config.py') or file_name.endswith('.pyc'):
+                continue
+            hasher.update(os.path.relpath(path, package_dir).encode('utf-8') + b'\0')
+            with open(path, 'rb') as f:
+                hasher.update(f.read())
+    return hasher.hexdigest()
+
+
+class ResultCache:
+    """Remembers which tests passed against which inputs, so unchanged tests are reported as cached passes
+
+    The key of a test is made of the content digest of the install files it declares as inputs, the test class, its
+    kwargs and the digest of the test code and templates.  File digests are memoized by size and modification time,
+    so an unchanged install is not rehashed on every run; the memo is written back once, by `save_file_digests` at the
+    end of the run.  Hashing happens outside of any shared lock, so tests with small inputs do not wait for one that
+    hashes the whole install.  Only passes are stored; failures always run again.  The least recently used entries go
+    once there are more than max_entries.  The index is shared between concurrent runs under a lock file."""
+
+    Index_file_name = 'results.json'
+    Digests_file_name = 'file_digests.json'
+
+    def __init__(self, cache_dir: str, max_entries: int):
+        self.cache_dir = os.path.join(cache_dir, 'results')
+        self.max_entries = max_entries
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except Exception as e:
+            raise EPTestingException('Could not create result cache at %s; error: %s' % (self.cache_dir, str(e)))
+        self.index_path = os.path.join(self.cache_dir, self.Index_file_name)
+        self.digests_path = os.path.join(self.cache_dir, self.Digests_file_name)
+        self.code_digest = package_code_digest()
+        self._lock = threading.Lock()
+        self._file_digests = self._read_json(self.digests_path)
+        # paths hashed on this run, the only ones save_file_digests has to write back
+        self._new_file_digests = {}
+        self._input_digests = {}
+        # one lock per input being hashed, so concurrent tests with the same input hash it once
+        self._input_locks: Dict[str, threading.Lock] = {}
+
+    def key(self, test, kwargs: dict, install_root: str) -> str:
+        hasher = hashlib.sha256()
+        hasher.update(self.code_digest.encode('utf-8'))
+        hasher.update(('%s.%s' % (test.__class__.__module__, test.__class__.__name__)).encode('utf-8'))
+        hasher.update(json.dumps(kwargs, sort_keys=True, default=str).encode('utf-8'))
+        for input_path in test.input_paths(kwargs):
+            hasher.update(input_path.encode('utf-8') + b'\0')
+            hasher.update(self.input_digest(install_root, input_path).encode('utf-8'))
+        return hasher.hexdigest()
+
+    def input_digest(self, install_root: str, relative_path: str) -> str:
+        """Content digest of a file, a whole directory tree or a glob pattern of the install, '' meaning all of it"""
+        path = os.path.normpath(os.path.join(install_root, relative_path))
+        with self._lock:
+            if path in self._input_digests:
+                return self._input_digests[path]
+            input_lock = self._input_locks.setdefault(path, threading.Lock())
+        with input_lock:
+            with self._lock:
+                if path in self._input_digests:
+                    return self._input_digests[path]
+            hasher = hashlib.sha256()
+            matches = sorted(glob.glob(path)) if glob.escape(path) != path else [path]
+            for match in matches:
+                for file_path in self._files_under(match):
+                    hasher.update(os.path.relpath(file_path, install_root).encode('utf-8') + b'\0')
+                    hasher.update(self.file_digest(file_path).encode('utf-8'))
+            with self._lock:
+                self._input_digests[path] = hasher.hexdigest()
+            return self._input_digests[path]
+
+    def save_file_digests(self) -> None:
+        """Writes the file digests computed on this run into the memo, merged with what other runs wrote meanwhile"""
+        with self._lock:
+            new_file_digests = dict(self._new_file_digests)
+            self._new_file_digests = {}
+        if not new_file_digests:
+            return
+        with exclusive_lock(self.digests_path + '.lock'):
+            file_digests = self._read_json(self.digests_path)
+            file_digests.update(new_file_digests)
+            self._write_json(self.digests_path, file_digests)
+
+    @staticmethod
+    def _files_under(path: str) -> List[str]:
+        if not os.path.isdir(path) or os.path.islink(path):
+            return [path]
+        found = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            found.extend(os.path.join(root, f) for f in sorted(files))
+        return found
+
+    def file_digest(self, path: str) -> str:
+        """Content digest of one file, from the memo while its size and modification time are unchanged"""
+        try:
+            info = os.lstat(path)
+        except OSError:
+            return 'missing'
+        if os.path.islink(path):
+            return 'link:' + os.readlink(path)
+        with self._lock:
+            known = self._file_digests.get(path)
+        if known and known[0] == info.st_size and known[1] == info.st_mtime_ns:
+            return known[2]
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        with self._lock:
+            self._file_digests[path] = self._new_file_digests[path] = [
+                info.st_size, info.st_mtime_ns, hasher.hexdigest()
+            ]
+        return hasher.hexdigest()
+
+    def lookup(self, key: str) -> Optional[dict]:
+        with exclusive_lock(self.index_path + '.lock'):
+            index = self._read_json(self.index_path)
+            entry = index.get(key)
+            if entry is not None:
+                entry['last_used'] = time.time()
+                self._write_json(self.index_path, index)
+            return entry
+
+    def store(self, key: str, label: str, duration: float) -> None:
+        with exclusive_lock(self.index_path + '.lock'):
+            index = self._read_json(self.index_path)
+            index[key] = {'label': label, 'duration': duration, 'created': time.time(), 'last_used': time.time()}
+            for old_key in sorted(index, key=lambda k: index[k]['last_used'])[:max(len(index) - self.max_entries, 0)]:
+                del index[old_key]
+            self._write_json(self.index_path, index)
+
+    @staticmethod
+    def _read_json(path: str) -> dict:
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    @staticmethod
+    def _write_json(path: str, content: dict) -> None:
+        temp_path = unique_temp_path(path)
+        with open(temp_path, 'w') as f:
+            json.dump(content, f)
+        os.replace(temp_path, path)
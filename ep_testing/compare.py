@@ -0,0 +1,165 @@
+import csv
+import itertools
+import os
+import sqlite3
+from typing import Dict, List
+
+import numpy as np
+
+from ep_testing.eso import EsoReader, variable_key
+from ep_testing.exceptions import EPTestingException
+
+
+# preferred order when a run directory has several of the output formats: the ESO is memory-mapped and parsed with
+# NumPy, where every value of the others has to go through a Python object first
+OUTPUT_FILES = ['eplusout.eso', 'eplusout.sql', 'eplusout.csv']
+# rows of a CSV converted at once
+CSV_CHUNK_ROWS = 1024
+
+
+def load_sql(sql_path: str) -> Dict[str, np.ndarray]:
+    connection = sqlite3.connect('file:%s?mode=ro' % sql_path, uri=True)
+    try:
+        dictionary = connection.execute(
+            'SELECT ReportDataDictionaryIndex, KeyValue, Name, Units, ReportingFrequency FROM ReportDataDictionary'
+        ).fetchall()
+        row_count = connection.execute('SELECT COUNT(*) FROM ReportData').fetchone()[0]
+        # the rows are streamed into one preallocated array in the order they are stored; an ORDER BY would have
+        # SQLite sort the whole table first, which costs more than reading it
+        rows = connection.execute('SELECT ReportDataDictionaryIndex, TimeIndex, Value FROM ReportData')
+        data = np.fromiter(
+            itertools.chain.from_iterable(rows), dtype=np.float64, count=3 * row_count
+        ).reshape(-1, 3)
+    finally:
+        connection.close()
+    data = data[np.lexsort((data[:, 1], data[:, 0]))]
+    # sorted by dictionary index, then time, each variable is one contiguous slice
+    indices, starts = np.unique(data[:, 0].astype(np.int64), return_index=True)
+    series = np.split(data[:, 2], starts[1:])
+    by_index = dict(zip(indices.tolist(), series))
+    return {
+        variable_key(key_value or '', name, units, frequency): by_index.get(index, np.empty(0))
+        for index, key_value, name, units, frequency in dictionary
+    }
+
+
+def load_csv(csv_path: str) -> Dict[str, np.ndarray]:
+    with open(csv_path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        # ReadVarsESO headers look like "Key:Variable Name [units](Frequency)"
+        keys = []
+        for column in header[1:]:
+            column = column.strip()
+            head, _, frequency = column.rpartition('(')
+            name, _, units = head.rpartition('[')
+            key_value, _, name = name.strip().rpartition(':')
+            keys.append(variable_key(key_value, name, units.rstrip('] '), frequency.rstrip(')')))
+        chunks = []
+        # a block of rows at a time as a 2-D array of byte strings, which NumPy converts to floats in one step
+        for rows in iter(lambda: list(itertools.islice(reader, CSV_CHUNK_ROWS)), []):
+            cells = np.array([row[1:] for row in rows], dtype=bytes).reshape(len(rows), -1)
+            if cells.shape[1] != len(keys):
+                raise EPTestingException('Rows of %s do not all have %i values' % (csv_path, len(keys)))
+            # variables reported at different frequencies share the table, with blank cells in between
+            cells[np.char.strip(cells) == b''] = b'nan'
+            chunks.append(cells.astype(np.float64))
+    values = np.vstack(chunks) if chunks else np.empty((0, len(keys)))
+    return {key: column[~np.isnan(column)] for key, column in zip(keys, values.T)}
+
+
+def load_eso(eso_path: str) -> Dict[str, np.ndarray]:
+    with EsoReader(eso_path) as reader:
+        return {key: reader.series(key) for key in reader.keys()}
+
+
+def load_outputs(path: str) -> Dict[str, np.ndarray]:
+    """Loads every reported time series of an output file (or of a run directory) as float64 arrays, by variable"""
+    if os.path.isdir(path):
+        candidates = [os.path.join(path, f) for f in OUTPUT_FILES if os.path.exists(os.path.join(path, f))]
+        if not candidates:
+            raise EPTestingException('Could not find any of %s in %s' % (', '.join(OUTPUT_FILES), path))
+        path = candidates[0]
+    extension = os.path.splitext(path)[1].lower()
+    loaders = {'.sql': load_sql, '.eso': load_eso, '.mtr': load_eso, '.csv': load_csv}
+    if extension not in loaders:
+        raise EPTestingException('Do not know how to read outputs from ' + path)
+    try:
+        return loaders[extension](path)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        raise EPTestingException('Could not read outputs from %s; error: %s' % (path, str(e)))
+
+
+class OutputComparison:
+    """Compares two sets of time series, every variable at once, with absolute and relative tolerances
+
+    A value fails when |this - last| > atol + rtol * |last|.  Variables of the same length are stacked into one 2-D
+    array so the check is a handful of NumPy operations regardless of the number of variables, and each variable is
+    scored by its largest difference in units of its tolerance, which ranks the worst offenders."""
+
+    def __init__(self, this_outputs: Dict[str, np.ndarray], last_outputs: Dict[str, np.ndarray],
+                 atol: float = 1e-3, rtol: float = 1e-2):
+        self.atol = atol
+        self.rtol = rtol
+        self.missing = sorted(set(last_outputs) - set(this_outputs))
+        self.added = sorted(set(this_outputs) - set(last_outputs))
+        self.length_mismatch = []
+        self.offenders = []
+        self.compared = 0
+        common = sorted(set(this_outputs) & set(last_outputs))
+        by_length = {}
+        for key in common:
+            this_values, last_values = this_outputs[key], last_outputs[key]
+            if this_values.shape != last_values.shape:
+                self.length_mismatch.append(key)
+            else:
+                by_length.setdefault(this_values.shape[0], []).append(key)
+        for keys in by_length.values():
+            self._compare_group(keys, np.vstack([this_outputs[k] for k in keys]),
+                                np.vstack([last_outputs[k] for k in keys]))
+        self.offenders.sort(key=lambda o: o['score'], reverse=True)
+
+    def _compare_group(self, keys: List[str], this_values: np.ndarray, last_values: np.ndarray) -> None:
+        self.compared += len(keys)
+        if this_values.shape[1] == 0:
+            return
+        difference = np.abs(this_values - last_values)
+        tolerance = self.atol + self.rtol * np.abs(last_values)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = difference / tolerance
+        # with a zero tolerance, only exact matches pass
+        score[(tolerance == 0) & (difference == 0)] = 0.0
+        # nan on one side only is a failure, nan on both sides is a match
+        this_nan, last_nan = np.isnan(this_values), np.isnan(last_values)
+        score[this_nan != last_nan] = np.inf
+        score[this_nan & last_nan] = 0.0
+        worst = np.argmax(score, axis=1)
+        rows = np.arange(len(keys))
+        worst_score = score[rows, worst]
+        failing_counts = np.count_nonzero(score > 1.0, axis=1)
+        for row in np.nonzero(worst_score > 1.0)[0]:
+            column = worst[row]
+            self.offenders.append({
+                'variable': keys[row], 'index': int(column), 'this': float(this_values[row, column]),
+                'last': float(last_values[row, column]), 'abs_diff': float(difference[row, column]),
+                'score': float(worst_score[row]), 'failing_values': int(failing_counts[row]),
+            })
+
+    def passed(self) -> bool:
+        return not (self.offenders or self.missing or self.length_mismatch)
+
+    def report(self, max_offenders: int = 10) -> str:
+        lines = ['Compared %i variables (atol=%g, rtol=%g): %i differ, %i missing, %i new, %i changed length' % (
+            self.compared, self.atol, self.rtol, len(self.offenders), len(self.missing), len(self.added),
+            len(self.length_mismatch)
+        )]
+        for offender in self.offenders[:max_offenders]:
+            lines.append('  %s at #%i: %.6g vs %.6g (|diff| %.3g, %.1fx tolerance, %i values out)' % (
+                offender['variable'], offender['index'], offender['this'], offender['last'], offender['abs_diff'],
+                offender['score'], offender['failing_values']
+            ))
+        for key in self.missing[:max_offenders]:
+            lines.append('  missing: ' + key)
+        for key in self.length_mismatch[:max_offenders]:
+            lines.append('  changed length: ' + key)
+        return '\n'.join(lines)
@@ -1,5 +1,4 @@
 import os
-import shutil
 from tempfile import mkdtemp
 
 
@@ -31,34 +30,110 @@ CONFIGURATIONS = {
 }
 
 
+def default_cache_dir() -> str:
+    return os.environ.get('EP_TESTING_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'ep_testing'))
+
+
+def default_history_db_path() -> str:
+    return os.environ.get('EP_TESTING_HISTORY_DB', os.path.join(default_cache_dir(), 'history.sqlite'))
+
+
 class TestConfiguration:
 
-    def __init__(self, run_config_key):
+    def __init__(self, run_config_key, tag_this_version: str = None):
 
         # invalid keys are protected in the command's finalize_options method
         this_config = CONFIGURATIONS[run_config_key]
+        self.run_config_key = run_config_key
         self.os_version = this_config['os_version']
         self.os = this_config['os']
         self.asset_pattern = this_config['asset_pattern']
         self.bitness = this_config['bitness']
 
         self.this_version = '9.5'
-        self.tag_this_version = 'FileSystem_Move_v3'
+        self.tag_this_version = tag_this_version if tag_this_version else 'FileSystem_Move_v3'
         self.last_version = '9.4'
         self.tag_last_version = 'v9.4.0'
 
-        # If this is turned on, it expects to find an asset already downloaded at the specified location
-        self.skip_download = False
-        self.skipped_download_file = '/tmp/ep.tar.gz'
+        # Downloaded installers and their extracted trees are kept in a persistent cache, so repeated runs against
+        # the same asset skip both the download and the extraction.  The location and size cap can be overridden
+        # through the environment.
+        self.use_cache = True
+        self.cache_dir = default_cache_dir()
+        self.cache_max_size = int(float(os.environ.get('EP_TESTING_CACHE_MAX_GB', '10')) * 1024 ** 3)
 
         # But if we are on Travis, we override it to always download a new asset
-        if os.environ.get('TRAVIS'):
-            self.skip_download = False
+        if os.environ.get('TRAVIS') or os.environ.get('EP_TESTING_NO_CACHE'):
+            self.use_cache = False
+
+        # The C/C++ API test programs are built in directories keyed by their sources, the install path and the
+        # toolchain, so unchanged builds are reused across runs; ccache is used for fresh builds when it is available
+        self.build_cache_dir = os.path.join(self.cache_dir, 'cmake_builds') if self.use_cache else None
+        self.compiler_cache = True
+
+        # passes are remembered against the digest of the install contents, the test and its kwargs, so an unchanged
+        # test on an unchanged install is reported as a cached pass (`--force` runs everything anyway)
+        self.result_cache_max_entries = 5000
+
+        # tar.gz installers are unpacked while they download instead of being written to disk first; zip installers
+        # always fall back to download-then-extract
+        self.stream_extract = True
+        # only index the downloaded installer and extract, on demand, the members that the scheduled tests declare
+        # they need, instead of the whole tree; mostly for small CI disks and quick smoke runs
+        self.lazy_extract = bool(os.environ.get('EP_TESTING_LAZY_EXTRACT'))
+        # every install gets a manifest of its files; `setup.py diff` compares this release's against the last one's
+        # and flags an API library that grew by more than this fraction
+        self.manifest_library_growth = 0.25
+        # non-streamed downloads are split into byte ranges fetched on this many connections, and resume if cut off
+        self.download_connections = 4
+
+        # simulation performance benchmark of this release against the last release, see `setup.py benchmark`
+        self.benchmark_files = ['1ZoneUncontrolled.idf', '5ZoneAirCooled.idf', 'HospitalLowEnergy.idf']
+        self.benchmark_repetitions = 5
+        self.benchmark_threshold = 0.05  # relative slowdown of the median wall time that counts as a regression
+        self.benchmark_alpha = 0.05
+
+        # calls of each pyenergyplus functional routine timed by the Python API throughput test, a benchmark that is
+        # only part of the run, and writes its report, when asked for
+        self.benchmark_api = bool(os.environ.get('EP_TESTING_BENCHMARK_API'))
+        self.api_benchmark_calls = 5000
+
+        # every Documentation PDF must mention this on its front page; only checked when asked for, it needs pdftotext
+        self.check_documentation = bool(os.environ.get('EP_TESTING_CHECK_DOCUMENTATION'))
+        self.documentation_version_string = self.this_version
+
+        # reported time series of this release compared against the last release, see `setup.py compare`; a value
+        # differs when |this - last| > atol + rtol * |last|
+        self.compare_files = ['1ZoneUncontrolled.idf', '5ZoneAirCooled.idf', 'PlantLoadProfile.idf']
+        self.compare_atol = 1e-3
+        self.compare_rtol = 1e-2
+
+        # prior release test files that are taken through the whole transition chain and simulated, fetched once per
+        # tag_last_version into a local content-addressed mirror (a throwaway one when the cache is disabled)
+        self.transition_files = [
+            '1ZoneUncontrolled.idf', '1ZoneEvapCooler.idf', '5ZoneAirCooled.idf', 'PlantLoadProfile.idf',
+            'AirflowNetwork_Simple_House.idf',
+        ]
+
+        # last recorded duration of each ExampleFiles run in `setup.py sweep`, used to start the longest runs first
+        self.sweep_history_path = os.path.join(self.cache_dir, 'sweep_durations.json')
+
+        # the tests to run, their kwargs, the platforms they apply to and the order they depend on, see plan.TestPlan
+        self.test_plan_path = os.environ.get(
+            'EP_TESTING_PLAN', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_plan.json')
+        )
+
+        # every test must finish within this many seconds, child processes still running after that are killed
+        self.test_timeout = float(os.environ.get('EP_TESTING_TIMEOUT', '1800'))
+
+        # chosen child processes can be run under an external sampling profiler through the EP_TESTING_PROFILE and
+        # EP_TESTING_PROFILER environment variables, see process.profiler_wrapper; the profiles land next to the logs
+
+        # every result of every run goes into this SQLite database, see `setup.py history` for the queries
+        self.history_db_path = default_history_db_path()
+
+        # machine readable per-phase timing records are written here at the end of a run
+        self.report_dir = os.environ.get('EP_TESTING_REPORT_DIR', os.getcwd())
 
         self.download_dir = mkdtemp()
-        if self.skip_download:
-            target_file_name = 'ep.tar.gz'
-            if self.os == OS.Windows:
-                target_file_name = 'ep.zip'
-            file_path = os.path.join(self.download_dir, target_file_name)
-            shutil.copy(self.skipped_download_file, file_path)
+        self.idf_mirror_dir = os.path.join(self.cache_dir if self.use_cache else self.download_dir, 'idf_mirror')
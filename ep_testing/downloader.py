@@ -1,92 +1,229 @@
 from distutils import log
-from typing import List, Union
+import hashlib
+from typing import Tuple, Union
 import os
-import requests
 import shutil
 from subprocess import check_call, CalledProcessError
-import urllib.request
+import tarfile
+import threading
+import urllib.parse
 
+from ep_testing.archive import ArchiveIndex, register_lazy_install, SelectiveExtractor
+from ep_testing.cache import InstallerCache, MetadataCache
 from ep_testing.exceptions import EPTestingException
 from ep_testing.config import TestConfiguration, OS
+from ep_testing.http_client import HttpClient, shared_client
+from ep_testing.instrumentation import Instrumentation
+from ep_testing.manifest import build_manifest, load_manifest, manifest_from_index, missing_required_files
+from ep_testing.manifest import write_manifest
+from ep_testing.range_download import RangeDownloader
+
+
+class HashingReader:
+    """Read-only file-like wrapper that hashes and counts the bytes passing through it"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.hasher = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.hasher.update(data)
+        self.bytes_read += len(data)
+        return data
+
+    def drain(self) -> None:
+        while self.read(Downloader.Chunk_size):
+            pass
+
+    def hexdigest(self) -> str:
+        return self.hasher.hexdigest()
 
 
 class Downloader:
+    Chunk_size = 1024 * 1024
     Release_url = 'https://api.github.com/repos/jmarrec/EnergyPlus/releases'
     User_url = 'https://api.github.com/user'
+    # releases already resolved in this process, keyed by tag, so several configurations resolve each tag only once
+    _resolved_releases = {}
+    _resolved_releases_lock = threading.Lock()
 
-    def __init__(self, config: TestConfiguration, announce: callable = None):
+    def __init__(self, config: TestConfiguration, announce: callable = None, client: HttpClient = None):
         self.release_tag = config.tag_this_version
-        self.download_dir = config.download_dir
         self.announce = announce  # hijacking this instance method is mildly dangerous, like 1/5 danger stars
+        self.instrumentation = Instrumentation('Downloader(%s@%s)' % (config.asset_pattern, config.tag_this_version))
+        self.client = client if client else shared_client()
+        if self.client.announce is None:
+            self.client.announce = announce
         github_token = os.environ.get('GITHUB_TOKEN', None)
         if github_token is None:
             raise EPTestingException('GITHUB_TOKEN not found in environment, cannot continue')
         self.auth_header = {'Authorization': 'token %s' % github_token}
-        user_response = requests.get(self.User_url, headers=self.auth_header)
+        # rate limiting is waited out inside the client, so a 403 that makes it back here is a real permission problem
+        user_response = self.client.get(self.User_url, headers=self.auth_header)
         if user_response.status_code == 403:
-            if 'rate limit' in user_response.json()['message']:
-                raise EPTestingException('Rate limit somehow exceeded, weird!')
             raise EPTestingException('Permission issue when calling Github API')
         elif user_response.status_code != 200:
             raise EPTestingException('Invalid call to Github API -- check GITHUB_TOKEN validity')
         self._my_print('Executing download operations as Github user: ' + user_response.json()['login'])
-        extract_dir_name = 'ep_package'
-        self.extract_path = os.path.join(config.download_dir, extract_dir_name)
         # need to adapt this to the new filename structure when we get there
         self.asset_pattern = config.asset_pattern
-        if config.os == OS.Linux:
-            target_file_name = 'ep.tar.gz'
-            # tar -xzf ep.tar.gz -C ep_package
-            self.extract_command = ['tar', '-xzf', target_file_name, '-C', self.extract_path]
-        elif config.os == OS.Mac:
-            target_file_name = 'ep.tar.gz'
-            # tar -xzf ep.tar.gz -C ep_package
-            self.extract_command = ['tar', '-xzf', target_file_name, '-C', self.extract_path]
-        elif config.os == OS.Windows:
-            target_file_name = 'ep.zip'
-            # 7z x ep.zip -oep_package
-            self.extract_command = ['7z.exe', 'x', target_file_name, '-o' + self.extract_path]
-        releases = self._get_all_packages()
-        matching_release = self._find_matching_release(releases)
-        asset = self._find_matching_asset_for_release(matching_release)
+        self.os = config.os
+        self.stream_extract = config.stream_extract
+        self.lazy_extract = config.lazy_extract
+        self.extractor = None
+        self.download_connections = config.download_connections
+        self.asset_sha256 = None
+        if config.os == OS.Windows:
+            self.target_file_name = 'ep.zip'
+        else:
+            self.target_file_name = 'ep.tar.gz'
+        self._set_working_directory(config.download_dir)
+        self.metadata_cache = MetadataCache(config.cache_dir) if config.use_cache else None
+        with self.instrumentation.phase('release lookup'):
+            matching_release = self._find_matching_release()
+            asset = self._find_matching_asset_for_release(matching_release)
         if asset is None:
             raise EPTestingException('Could not find asset to download, has CI finished it yet?')
-        self.download_path = os.path.join(config.download_dir, target_file_name)
-        if config.skip_download:
-            if not os.path.exists(self.download_path):
-                raise EPTestingException('Download skipped, but package not available at ' + self.download_path)
+        self.asset = asset
+        if config.use_cache:
+            cache = InstallerCache(config.cache_dir, config.cache_max_size)
+            self._extracted_install_path = self._cached_download_and_extract(cache, asset)
         else:
-            self._download_asset(asset)
-        self._extracted_install_path = self._extract_asset()
+            self._extracted_install_path = self._download_and_extract(asset)
+        if self.lazy_extract:
+            self.extractor = SelectiveExtractor(self.download_path, os.path.dirname(self._extracted_install_path))
+            register_lazy_install(self.extractor)
+            if not config.lazy_extract:
+                # a lazily extracted cache entry, but this run wants the whole install
+                with self.instrumentation.phase('extract'):
+                    self.extractor.ensure([''])
+        with self.instrumentation.phase('manifest'):
+            self.manifest = self._manifest()
+        missing = missing_required_files(self.manifest, self.os)
+        if missing:
+            raise EPTestingException('Extracted EnergyPlus package is missing %s, problem.' % ', '.join(missing))
+
+    def _set_working_directory(self, directory: str) -> None:
+        self.download_dir = directory
+        self.download_path = os.path.join(directory, self.target_file_name)
+        self.extract_path = os.path.join(directory, 'ep_package')
+        if self.os == OS.Windows:
+            # 7z x ep.zip -oep_package
+            self.extract_command = ['7z.exe', 'x', self.target_file_name, '-o' + self.extract_path]
+        else:
+            # tar -xzf ep.tar.gz -C ep_package
+            self.extract_command = ['tar', '-xzf', self.target_file_name, '-C', self.extract_path]
 
-    def _get_all_packages(self) -> List[dict]:
-        """Get all releases from this url"""
+    def manifest_path(self) -> str:
+        # beside the archive, which for a cached install means inside its cache entry
+        return os.path.join(self.download_dir, 'manifest.json')
+
+    def _manifest(self) -> dict:
+        """The manifest of the install, reused from an earlier run when it is there and has the hashes it should"""
+        if os.path.exists(self.manifest_path()):
+            manifest = load_manifest(self.manifest_path())
+            if manifest.get('hashed') or self.lazy_extract:
+                return manifest
+        if self.lazy_extract:
+            manifest = manifest_from_index(self.extractor.index)
+        else:
+            manifest = build_manifest(self._extracted_install_path)
+        write_manifest(self.manifest_path(), manifest)
+        self._my_print('Install manifest with %i files written to %s' % (len(manifest['files']), self.manifest_path()))
+        return manifest
+
+    def _cached_download_and_extract(self, cache: InstallerCache, asset: dict) -> str:
+        key = cache.key(self.release_tag, asset)
+        with self.instrumentation.phase('cache lookup'):
+            entry = cache.lookup(key)
+        if entry is None:
+            with cache.building(key):
+                # another downloader missing the same asset may have built the entry while this one waited
+                entry = cache.lookup(key)
+                if entry is None:
+                    return self._build_cache_entry(cache, key, asset)
+        self._my_print('Found asset "%s" in installer cache, skipping download and extraction' % asset['name'])
+        self.lazy_extract = entry.get('lazy_extract', False)
+        self._set_working_directory(cache.entry_dir(key))
+        return cache.install_path(key, entry)
+
+    def _build_cache_entry(self, cache: InstallerCache, key: str, asset: dict) -> str:
+        self._set_working_directory(cache.staging_dir(key))
+        install_path = self._download_and_extract(asset)
+        entry = cache.commit(key, self.download_dir, {
+            'release_tag': self.release_tag,
+            'asset_id': asset['id'],
+            'asset_name': asset['name'],
+            'asset_size': asset['size'],
+            'asset_sha256': self.asset_sha256,
+            'install_subpath': os.path.relpath(install_path, self.download_dir),
+            'lazy_extract': self.lazy_extract,
+        })
+        self._set_working_directory(cache.entry_dir(key))
+        self._my_print('Stored asset "%s" in installer cache (%i MB on disk)' % (
+            asset['name'], entry['size_on_disk'] // (1024 * 1024)
+        ))
+        return cache.install_path(key, entry)
+
+    def _get_json(self, url: str) -> Tuple[object, dict]:
+        """GET a Github API url, revalidating any cached copy with If-None-Match; returns the body and link header
+
+        A 404 returns None for the body so callers can fall back to another lookup"""
+        headers = dict(self.auth_header)
+        cached = self.metadata_cache.load(url) if self.metadata_cache else None
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
         try:
-            releases = []
-            next_page_url = self.Release_url
-            while next_page_url:
-                response = requests.get(next_page_url, headers=self.auth_header)
-                these_releases = response.json()
-                self._my_print('Got release response, number on this query = %i' % len(these_releases), log.DEBUG)
-                releases.extend(these_releases)
-                raw_next_page_url = response.headers.get('link', None)
-                if raw_next_page_url is None:
-                    break
-                if 'rel="next"' not in raw_next_page_url:
-                    break
-                next_page_url = self._sanitize_next_page_url(raw_next_page_url)
-            self._my_print('Got total release list: Total number of releases = %i' % len(releases), log.DEBUG)
+            response = self.client.get(url, headers=headers)
         except Exception as e:
-            raise EPTestingException('Could not download list of releases' + str(e))
-        return releases
+            raise EPTestingException('Could not query Github API at %s; error: %s' % (url, str(e)))
+        if response.status_code == 304:
+            self._my_print('Github response for %s not modified, using cached copy' % url, log.DEBUG)
+            return cached['body'], cached['headers']
+        if response.status_code == 404:
+            return None, {}
+        if response.status_code != 200:
+            raise EPTestingException('Github API call to %s failed with status %i' % (url, response.status_code))
+        body = response.json()
+        kept_headers = {'link': response.headers.get('link', None)}
+        etag = response.headers.get('ETag', None)
+        if self.metadata_cache and etag:
+            self.metadata_cache.store(url, etag, body, kept_headers)
+        return body, kept_headers
+
+    def _find_matching_release(self) -> dict:
+        with self._resolved_releases_lock:
+            if self.release_tag not in self._resolved_releases:
+                self._resolved_releases[self.release_tag] = self._resolve_release()
+            return self._resolved_releases[self.release_tag]
 
-    def _find_matching_release(self, releases: List[dict]) -> dict:
+    def _resolve_release(self) -> dict:
+        release, _ = self._get_json(self.Release_url + '/tags/' + urllib.parse.quote(self.release_tag, safe=''))
+        if release is not None:
+            self._my_print('Found release with tag_name = ' + self.release_tag)
+            return release
+        # draft releases are not reachable by tag, so fall back to walking the release list, stopping at the match
+        self._my_print('Release tag lookup missed, searching the release list instead', log.DEBUG)
         full_list_of_release_names = []
-        for release in releases:
-            full_list_of_release_names.append(release['tag_name'])
-            if release['tag_name'] == self.release_tag:
-                self._my_print('Found release with tag_name = ' + self.release_tag)
-                return release
+        next_page_url = self.Release_url
+        while next_page_url:
+            these_releases, headers = self._get_json(next_page_url)
+            if these_releases is None:
+                break
+            self._my_print('Got release response, number on this query = %i' % len(these_releases), log.DEBUG)
+            for release in these_releases:
+                full_list_of_release_names.append(release['tag_name'])
+                if release['tag_name'] == self.release_tag:
+                    self._my_print('Found release with tag_name = ' + self.release_tag)
+                    return release
+            raw_next_page_url = headers.get('link', None)
+            if raw_next_page_url is None:
+                break
+            if 'rel="next"' not in raw_next_page_url:
+                break
+            next_page_url = self._sanitize_next_page_url(raw_next_page_url)
         raise EPTestingException('Did not find matching tag, searching for %s, full list = [%s\n]' % (
             self.release_tag,
             ['\n%s' % x for x in full_list_of_release_names]
@@ -107,9 +244,11 @@ class Downloader:
         return None
 
     def _find_matching_asset_for_release(self, release: dict) -> dict:
-        asset_url = release['assets_url']
-        # making an assumption that I don't need to paginate these -- we won't have > 30 assets per release
-        assets = requests.get(asset_url, headers=self.auth_header).json()
+        # the release payload already embeds its assets, only go back to the API if it somehow does not
+        assets = release.get('assets', None)
+        if assets is None:
+            # making an assumption that I don't need to paginate these -- we won't have > 30 assets per release
+            assets, _ = self._get_json(release['assets_url'])
         full_list_of_asset_names = []
         for asset in assets:
             full_list_of_asset_names.append(asset['name'])
@@ -117,34 +256,103 @@ class Downloader:
                 self._my_print('Found asset with name "%s": "%s"' % (self.asset_pattern, asset['name']))
                 return asset
 
+    def _download_and_extract(self, asset: dict) -> str:
+        """Downloads and extracts the asset, returns the path to the E+ install subdirectory
+
+        With lazy extraction only the archive index is built here, and the subdirectory starts out empty"""
+        if self.lazy_extract:
+            with self.instrumentation.phase('download'):
+                self._download_asset(asset)
+            with self.instrumentation.phase('index'):
+                return self._index_asset()
+        if self.stream_extract and self.target_file_name.endswith('.tar.gz'):
+            with self.instrumentation.phase('download and extract'):
+                self._stream_extract_asset(asset)
+            return self._find_extracted_install()
+        # zip archives keep their directory at the end of the file, so they have to land on disk before extracting
+        with self.instrumentation.phase('download'):
+            self._download_asset(asset)
+        with self.instrumentation.phase('extract'):
+            return self._extract_asset()
+
     def _download_asset(self, asset: dict) -> None:
+        downloader = RangeDownloader(
+            asset['browser_download_url'], self.download_path, expected_size=asset['size'],
+            expected_sha256=self._expected_sha256(asset), connections=self.download_connections,
+            announce=self._my_print, client=self.client
+        )
+        self.asset_sha256 = downloader.download()
+        self._my_print('Asset downloaded to ' + self.download_path)
+
+    def _stream_extract_asset(self, asset: dict) -> None:
+        """Unpacks the tar.gz while it downloads, hashing the bytes in the same pass; nothing but the tree hits disk"""
+        url = asset['browser_download_url']
+        self._reset_extract_path()
         try:
-            _, headers = urllib.request.urlretrieve(asset['browser_download_url'], self.download_path)
-            self._my_print('Asset downloaded to ' + self.download_path)
+            with self.client.get(url, stream=True) as response:
+                response.raise_for_status()
+                reader = HashingReader(response.raw)
+                with tarfile.open(fileobj=reader, mode='r|gz') as tar:
+                    if hasattr(tarfile, 'data_filter'):
+                        tar.extractall(self.extract_path, filter='tar')
+                    else:
+                        tar.extractall(self.extract_path)
+                # the end-of-archive padding is not consumed by tarfile, but it is part of the digest
+                reader.drain()
+            self._my_print('Asset streamed and extracted to %s (%i MB)' % (
+                self.extract_path, reader.bytes_read // (1024 * 1024)
+            ))
         except Exception as e:
-            raise EPTestingException(
-                'Could not download asset from %s; error: %s' % (asset['browser_download_url'], str(e))
-            )
+            raise EPTestingException('Could not stream and extract asset from %s; error: %s' % (url, str(e)))
+        self._verify_digest(asset, reader.hexdigest())
 
-    def _extract_asset(self) -> str:
-        """Attempts to extract the downloaded package, returns the path to the E+ install subdirectory"""
-        saved_working_directory = os.getcwd()
-        os.chdir(self.download_dir)
+    @staticmethod
+    def _expected_sha256(asset: dict) -> Union[str, None]:
+        digest = asset.get('digest')
+        if digest and digest.startswith('sha256:'):
+            return digest[len('sha256:'):]
+        return None
+
+    def _verify_digest(self, asset: dict, sha256: str) -> None:
+        self.asset_sha256 = sha256
+        expected = self._expected_sha256(asset)
+        if expected and expected != sha256:
+            raise EPTestingException('Asset digest mismatch for %s: expected sha256:%s, got sha256:%s' % (
+                asset['name'], expected, sha256
+            ))
+
+    def _reset_extract_path(self) -> None:
         if os.path.exists(self.extract_path):
             shutil.rmtree(self.extract_path)
         try:
             os.makedirs(self.extract_path)
         except Exception as e:
             raise EPTestingException('Could not create extraction path at %s; error: %s' % (self.extract_path, str(e)))
+
+    def _index_asset(self) -> str:
+        self._reset_extract_path()
+        index = ArchiveIndex(self.download_path)
+        self._my_print('Indexed %i archive members, extracting on demand only' % len(index.members))
+        install_path = os.path.join(self.extract_path, index.root)
+        os.makedirs(install_path)
+        return install_path
+
+    def _extract_asset(self) -> str:
+        """Attempts to extract the downloaded package, returns the path to the E+ install subdirectory"""
+        self._reset_extract_path()
         try:
-            check_call(self.extract_command)
+            check_call(self.extract_command, cwd=self.download_dir)
         except CalledProcessError as e:
             raise EPTestingException("Extraction failed with this error: " + str(e))
+        return self._find_extracted_install()
+
+    def _find_extracted_install(self) -> str:
         # should result in a single new directory inside the extract path, like: /extract/path/EnergyPlus-V1-abc-Linux
         all_sub_folders = [f.path for f in os.scandir(self.extract_path) if f.is_dir()]
         if len(all_sub_folders) > 1:
             raise EPTestingException('Extracted EnergyPlus package has more than one directory, problem.')
-        os.chdir(saved_working_directory)
+        if len(all_sub_folders) < 1:
+            raise EPTestingException('Extracted EnergyPlus package has no directory, problem.')
         return all_sub_folders[0]
 
     def _my_print(self, message: str, level: object = log.INFO) -> None:
@@ -155,3 +363,6 @@ class Downloader:
 
     def extracted_install_path(self) -> str:
         return self._extracted_install_path
+
+    def asset_metadata(self) -> dict:
+        return {'asset_name': self.asset['name'], 'asset_size': self.asset['size'], 'asset_sha256': self.asset_sha256}
@@ -0,0 +1,169 @@
+import mmap
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ep_testing.exceptions import EPTestingException
+
+
+END_OF_DICTIONARY = b'End of Data Dictionary'
+
+
+def variable_key(key_value: str, name: str, units: str, frequency: str) -> str:
+    """One naming scheme for a reported variable across the ESO, CSV and SQL output formats"""
+    key = '%s:%s' % (key_value, name) if key_value else name
+    return '%s [%s] (%s)' % (key, units, frequency)
+
+
+class EsoVariable:
+
+    def __init__(self, code: int, key_value: str, name: str, units: str, frequency: str):
+        self.code = code
+        self.key_value = key_value
+        self.name = name
+        self.units = units
+        self.frequency = frequency
+
+    def key(self) -> str:
+        return variable_key(self.key_value, self.name, self.units, self.frequency)
+
+
+class EsoReader:
+    """Reads single variables out of an EnergyPlus .eso (or .mtr) file without loading the rest of it
+
+    The file is memory-mapped.  Opening it parses the data dictionary and makes one pass over the data section, a chunk
+    at a time with NumPy, recording the offset and report code of every line; the offsets are then grouped by code, so
+    the index costs 12 bytes per line whatever the line holds.  `series` gathers the lines of one code and converts the
+    value fields in a single vectorized step."""
+
+    Chunk_size = 64 * 1024 * 1024
+    # widest report code and widest value field the vectorized parsers look at
+    Code_width = 10
+    Value_width = 32
+
+    def __init__(self, eso_path: str):
+        self.eso_path = eso_path
+        try:
+            self._file = open(eso_path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise EPTestingException('Could not open ESO file %s; error: %s' % (eso_path, str(e)))
+        self._buffer = np.frombuffer(self._mmap, dtype=np.uint8)
+        self.variables: Dict[str, EsoVariable] = {}
+        data_start = self._read_dictionary()
+        self._build_index(data_start)
+
+    def close(self) -> None:
+        # the array view has to go before the map can be closed
+        self._buffer = None
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @staticmethod
+    def _is_time_code(rest: str) -> bool:
+        """Whether a dictionary line describes an environment or time stamp record rather than a variable
+
+        These come first, with as many codes as the EnergyPlus version has reporting frequencies (1 to 5 up to 8.x,
+        1 to 6 with "6,1,Calendar Year of Simulation[] ! When Annual Report Variables Requested" from 9.0), and
+        carry either no comment at all or a "When ..." one, where a variable always states its frequency."""
+        _, bang, comment = rest.partition('!')
+        return not bang or comment.strip().lower().startswith('when')
+
+    def _read_dictionary(self) -> int:
+        end = self._mmap.find(END_OF_DICTIONARY)
+        if end < 0:
+            raise EPTestingException('No data dictionary found in ' + self.eso_path)
+        in_header = True
+        for line in self._mmap[:end].decode('utf-8', errors='replace').splitlines():
+            code, _, rest = line.partition(',')
+            if not code.isdigit():
+                continue
+            if in_header and self._is_time_code(rest):
+                continue
+            # everything after the first variable is a variable too
+            in_header = False
+            # a variable such as "8,1,Environment,Site Outdoor Air Drybulb Temperature [C] !Hourly"
+            fields, _, frequency = rest.partition('!')
+            fields = fields.split(',', 1)[1]
+            # meters have no key value, "13,1,Electricity:Facility [J] !Hourly"
+            key_value, _, description = fields.rpartition(',') if ',' in fields else ('', '', fields)
+            name, _, units = description.strip().rpartition('[')
+            variable = EsoVariable(int(code), key_value, name.strip(), units.rstrip(']'), frequency.split()[0])
+            self.variables[variable.key()] = variable
+        line_end = self._mmap.find(b'\n', end)
+        return len(self._mmap) if line_end < 0 else line_end + 1
+
+    def _build_index(self, data_start: int) -> None:
+        offsets = []
+        codes = []
+        start = data_start
+        while start < len(self._buffer):
+            end = min(start + self.Chunk_size, len(self._buffer))
+            newlines = np.flatnonzero(self._buffer[start:end] == ord('\n')) + start
+            if end < len(self._buffer) and len(newlines):
+                # the partial last line is picked up by the next chunk
+                end = int(newlines[-1]) + 1
+            line_starts = np.concatenate(([start], newlines[newlines + 1 < end] + 1)).astype(np.int64)
+            line_codes = self._parse_codes(line_starts)
+            keep = line_codes > 0
+            offsets.append(line_starts[keep])
+            codes.append(line_codes[keep])
+            start = end
+        offsets = np.concatenate(offsets) if offsets else np.empty(0, dtype=np.int64)
+        codes = np.concatenate(codes) if codes else np.empty(0, dtype=np.int32)
+        order = np.argsort(codes, kind='stable')
+        self._offsets = offsets[order]
+        self._codes = codes[order]
+
+    def _window(self, starts: np.ndarray, width: int) -> np.ndarray:
+        positions = np.minimum(starts[:, None] + np.arange(width), len(self._buffer) - 1)
+        return self._buffer[positions]
+
+    def _parse_codes(self, line_starts: np.ndarray) -> np.ndarray:
+        """The leading integer of each line, or 0 for lines that do not start with one followed by a comma"""
+        window = self._window(line_starts, self.Code_width).astype(np.int64) - ord('0')
+        is_digit = (window >= 0) & (window <= 9)
+        digit_count = np.where(is_digit.all(axis=1), self.Code_width, np.argmin(is_digit, axis=1))
+        codes = np.zeros(len(line_starts), dtype=np.int64)
+        for position in range(self.Code_width):
+            codes = np.where(position < digit_count, codes * 10 + window[:, position], codes)
+        terminator = window[np.arange(len(line_starts)), np.minimum(digit_count, self.Code_width - 1)] + ord('0')
+        valid = (digit_count > 0) & (digit_count < self.Code_width) & (terminator == ord(','))
+        return np.where(valid, codes, 0).astype(np.int32)
+
+    def keys(self) -> List[str]:
+        return list(self.variables)
+
+    def find(self, name: str, key_value: Optional[str] = None, frequency: Optional[str] = None) -> List[str]:
+        """Keys of the variables with this name, optionally narrowed down by key value and frequency, ignoring case"""
+        return [
+            key for key, v in self.variables.items()
+            if v.name.lower() == name.lower()
+            and (key_value is None or v.key_value.lower() == key_value.lower())
+            and (frequency is None or v.frequency.lower() == frequency.lower())
+        ]
+
+    def series(self, key: str) -> np.ndarray:
+        """All reported values of one variable, in file order, as a float64 array"""
+        if key not in self.variables:
+            raise EPTestingException('Variable %s is not in %s' % (key, self.eso_path))
+        code = self.variables[key].code
+        # searching with the index's own dtype, or NumPy converts the whole index for every lookup
+        first, last = np.searchsorted(self._codes, np.array([code, code + 1], dtype=self._codes.dtype))
+        value_starts = self._offsets[first:last] + len(str(code)) + 1
+        if len(value_starts) == 0:
+            return np.empty(0)
+        window = self._window(value_starts, self.Value_width)
+        # blank out everything from the end of the first field: meters with min/max carry more fields after it
+        terminator = (window == ord(',')) | (window == ord('\n')) | (window == ord('\r'))
+        window = np.where(np.cumsum(terminator, axis=1) > 0, ord(' '), window).astype(np.uint8)
+        try:
+            return np.ascontiguousarray(window).view('S%i' % self.Value_width).ravel().astype(np.float64)
+        except ValueError as e:
+            raise EPTestingException('Could not parse values of %s in %s; error: %s' % (key, self.eso_path, str(e)))
@@ -0,0 +1,253 @@
+from contextlib import closing
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, TextIO
+
+from ep_testing.exceptions import EPTestingException
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    release_tag TEXT NOT NULL,
+    run_config TEXT NOT NULL,
+    asset_name TEXT,
+    asset_size INTEGER,
+    asset_sha256 TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    test_class TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    label TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    cached INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS phases (
+    result_id INTEGER NOT NULL REFERENCES results(id) ON DELETE CASCADE,
+    phase TEXT NOT NULL,
+    wall_time REAL,
+    cpu_time REAL,
+    child_cpu_time REAL,
+    peak_rss_kb INTEGER
+);
+CREATE TABLE IF NOT EXISTS child_usage (
+    result_id INTEGER NOT NULL REFERENCES results(id) ON DELETE CASCADE,
+    command TEXT NOT NULL,
+    returncode INTEGER,
+    timed_out INTEGER,
+    duration REAL,
+    user_time REAL,
+    system_time REAL,
+    max_rss_kb INTEGER,
+    minor_faults INTEGER,
+    major_faults INTEGER,
+    voluntary_switches INTEGER,
+    involuntary_switches INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_by_config_tag ON runs(run_config, release_tag, started);
+CREATE INDEX IF NOT EXISTS results_by_test ON results(test_class, kwargs, run_id);
+CREATE INDEX IF NOT EXISTS results_by_run ON results(run_id);
+CREATE INDEX IF NOT EXISTS phases_by_result ON phases(result_id);
+CREATE INDEX IF NOT EXISTS child_usage_by_result ON child_usage(result_id);
+"""
+
+CHILD_USAGE_COLUMNS = [
+    'command', 'returncode', 'timed_out', 'duration', 'user_time', 'system_time', 'max_rss_kb', 'minor_faults',
+    'major_faults', 'voluntary_switches', 'involuntary_switches',
+]
+
+
+def task_identity(task) -> tuple:
+    """The test class and its identity kwargs as canonical json, which together identify one test across runs
+
+    Locations that change from run to run are left out (see BaseTest.identity_kwargs), or every run would start a new
+    history for the same test."""
+    test = task.test
+    return (
+        '%s.%s' % (test.__class__.__module__, test.__class__.__name__),
+        json.dumps(test.identity_kwargs(task.kwargs), sort_keys=True, default=str),
+    )
+
+
+def test_identity(result) -> tuple:
+    return task_identity(result.task)
+
+
+class ResultsStore:
+    """Every test result of every run, in a local SQLite database, for duration trends across release tags
+
+    A run is one configuration of one release tag, with the installer asset it tested; each of its results keeps the
+    test class and kwargs, the outcome, the phase timings and the resource usage of every child process.  Cached passes
+    are stored too, but left out of the duration queries since they did not actually run."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            with closing(self._connect()) as connection, connection:
+                connection.executescript(SCHEMA)
+        except (OSError, sqlite3.Error) as e:
+            raise EPTestingException('Could not open results store at %s; error: %s' % (db_path, str(e)))
+
+    def _connect(self) -> sqlite3.Connection:
+        # the connection's own context manager only commits or rolls back, callers close it with contextlib.closing
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute('PRAGMA foreign_keys = ON')
+        return connection
+
+    def record_run(self, release_tag: str, run_config: str, asset: Optional[dict], results: list) -> int:
+        """Stores one run and all of its results in a single transaction, returns the run id"""
+        asset = asset if asset else {}
+        with self._lock, closing(self._connect()) as connection, connection:
+            run_id = connection.execute(
+                'INSERT INTO runs (started, release_tag, run_config, asset_name, asset_size, asset_sha256) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (time.time(), release_tag, run_config, asset.get('asset_name'), asset.get('asset_size'),
+                 asset.get('asset_sha256'))
+            ).lastrowid
+            for result in results:
+                test_class, kwargs = test_identity(result)
+                result_id = connection.execute(
+                    'INSERT INTO results (run_id, test_class, kwargs, label, passed, cached, duration, error) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (run_id, test_class, kwargs, result.task.label(), int(result.passed), int(result.cached),
+                     result.duration, str(result.error) if result.error else None)
+                ).lastrowid
+                connection.executemany(
+                    'INSERT INTO phases (result_id, phase, wall_time, cpu_time, child_cpu_time, peak_rss_kb) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    [(result_id, p['phase'], p['wall_time'], p['cpu_time'], p['child_cpu_time'], p['peak_rss_kb'])
+                     for p in result.phases]
+                )
+                connection.executemany(
+                    'INSERT INTO child_usage (result_id, %s) VALUES (?, %s)' % (
+                        ', '.join(CHILD_USAGE_COLUMNS), ', '.join('?' * len(CHILD_USAGE_COLUMNS))
+                    ),
+                    [(result_id,) + tuple(c.get(column) for column in CHILD_USAGE_COLUMNS) for c in result.child_usage]
+                )
+        return run_id
+
+    def trends(self, run_config: str = None, test_filter: str = None) -> List[dict]:
+        """Mean duration and peak child RSS of every test on every release tag, tags in the order they were first run
+
+        Only passes that really ran count; the filter is a substring of the test label."""
+        conditions = ['r.passed = 1', 'r.cached = 0']
+        parameters = []
+        if run_config:
+            conditions.append('u.run_config = ?')
+            parameters.append(run_config)
+        if test_filter:
+            conditions.append('r.label LIKE ?')
+            parameters.append('%' + test_filter + '%')
+        query = '''
+            SELECT r.test_class, r.kwargs, MIN(r.label), u.release_tag, MIN(u.started) AS first_started,
+                   COUNT(*), AVG(r.duration), MIN(r.duration), MAX(r.duration),
+                   MAX((SELECT MAX(c.max_rss_kb) FROM child_usage c WHERE c.result_id = r.id))
+            FROM results r JOIN runs u ON u.id = r.run_id
+            WHERE %s
+            GROUP BY r.test_class, r.kwargs, u.release_tag
+            ORDER BY r.test_class, r.kwargs, first_started
+        ''' % ' AND '.join(conditions)
+        with closing(self._connect()) as connection, connection:
+            rows = connection.execute(query, parameters).fetchall()
+        return [{
+            'test_class': row[0], 'kwargs': row[1], 'label': row[2], 'release_tag': row[3], 'first_run': row[4],
+            'runs': row[5], 'mean_duration': row[6], 'min_duration': row[7], 'max_duration': row[8],
+            'max_child_rss_kb': row[9],
+        } for row in rows]
+
+    def estimate_durations(self, tasks: list, run_config: str) -> int:
+        """Sets the estimate of every task that really ran on an earlier run of the configuration to its mean duration
+        over the last few runs, for the scheduler's ordering; returns how many were set"""
+        query = '''
+            SELECT r.test_class, r.kwargs, AVG(r.duration)
+            FROM results r JOIN runs u ON u.id = r.run_id
+            WHERE r.passed = 1 AND r.cached = 0 AND u.run_config = ?
+              AND u.id IN (SELECT id FROM runs WHERE run_config = ? ORDER BY started DESC LIMIT 5)
+            GROUP BY r.test_class, r.kwargs
+        '''
+        with closing(self._connect()) as connection, connection:
+            durations = {(row[0], row[1]): row[2] for row in connection.execute(query, (run_config, run_config))}
+        count = 0
+        for task in tasks:
+            duration = durations.get(task_identity(task))
+            if duration is not None:
+                task.estimate = duration
+                count += 1
+        return count
+
+    def slowest_growing(self, run_config: str = None, limit: int = 10) -> List[dict]:
+        """Tests ranked by how much their mean duration grew from the first release tag they ran on to the latest"""
+        by_test = {}
+        for trend in self.trends(run_config):
+            by_test.setdefault((trend['test_class'], trend['kwargs']), []).append(trend)
+        growing = []
+        for tags in by_test.values():
+            if len(tags) < 2 or not tags[0]['mean_duration']:
+                continue
+            growing.append({
+                'label': tags[-1]['label'], 'first_tag': tags[0]['release_tag'], 'last_tag': tags[-1]['release_tag'],
+                'first_duration': tags[0]['mean_duration'], 'last_duration': tags[-1]['mean_duration'],
+                'growth': tags[-1]['mean_duration'] / tags[0]['mean_duration'] - 1.0,
+            })
+        growing.sort(key=lambda g: -g['growth'])
+        return growing[:limit]
+
+    def export_csv(self, output: TextIO, run_config: str = None) -> int:
+        """Writes one row per stored result, with its run, to the open file; returns the number of rows"""
+        query = '''
+            SELECT u.id, u.started, u.release_tag, u.run_config, u.asset_name, u.asset_sha256, r.test_class, r.kwargs,
+                   r.label, r.passed, r.cached, r.duration, r.error,
+                   (SELECT SUM(c.user_time + c.system_time) FROM child_usage c WHERE c.result_id = r.id),
+                   (SELECT MAX(c.max_rss_kb) FROM child_usage c WHERE c.result_id = r.id)
+            FROM results r JOIN runs u ON u.id = r.run_id
+        '''
+        parameters = []
+        if run_config:
+            query += ' WHERE u.run_config = ?'
+            parameters.append(run_config)
+        query += ' ORDER BY u.started, r.id'
+        writer = csv.writer(output)
+        writer.writerow([
+            'run_id', 'started', 'release_tag', 'run_config', 'asset_name', 'asset_sha256', 'test_class', 'kwargs',
+            'label', 'passed', 'cached', 'duration', 'error', 'child_cpu_time', 'child_max_rss_kb',
+        ])
+        count = 0
+        with closing(self._connect()) as connection, connection:
+            for row in connection.execute(query, parameters):
+                writer.writerow(row)
+                count += 1
+        return count
+
+
+def format_trends(trends: List[dict]) -> str:
+    width = max([len(t['label']) for t in trends] + [len('Test')])
+    tag_width = max([len(t['release_tag']) for t in trends] + [len('Tag')])
+    lines = ['%-*s  %-*s  %5s  %9s  %9s' % (width, 'Test', tag_width, 'Tag', 'Runs', 'Mean [s]', 'Child RSS')]
+    for t in trends:
+        rss = '%6i MB' % (t['max_child_rss_kb'] // 1024) if t['max_child_rss_kb'] is not None else '%9s' % '-'
+        lines.append('%-*s  %-*s  %5i  %9.2f  %s' % (
+            width, t['label'], tag_width, t['release_tag'], t['runs'], t['mean_duration'], rss
+        ))
+    return '\n'.join(lines)
+
+
+def format_growth(growing: List[dict]) -> str:
+    width = max([len(g['label']) for g in growing] + [len('Test')])
+    lines = ['%-*s  %-24s  %9s  %9s  %7s' % (width, 'Test', 'Tags', 'First [s]', 'Last [s]', 'Growth')]
+    for g in growing:
+        lines.append('%-*s  %-24s  %9.2f  %9.2f  %+6.0f%%' % (
+            width, g['label'], '%s -> %s' % (g['first_tag'], g['last_tag']), g['first_duration'],
+            g['last_duration'], 100 * g['growth']
+        ))
+    return '\n'.join(lines)
@@ -0,0 +1,159 @@
+from concurrent.futures import ThreadPoolExecutor
+from distutils import log
+import threading
+import time
+from typing import Callable, List
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ep_testing.exceptions import EPTestingException
+
+
+class HttpClient:
+    """The single HTTP layer for Github API calls, asset downloads and test file fetches
+
+    All requests go through one pooled session, so connections (and their TLS handshakes) are reused across calls and
+    threads.  Transient failures are retried with exponential backoff.  Github rate limiting is recognised from the 403
+    "rate limit" body or an exhausted X-RateLimit-Remaining: the client sleeps until X-RateLimit-Reset (or Retry-After)
+    when that is reasonably close, instead of failing the whole run.  Every request is recorded in a timing log."""
+
+    Retry_statuses = (500, 502, 503, 504)
+    Chunk_size = 1024 * 1024
+
+    def __init__(self, pool_size: int = 16, max_retries: int = 5, timeout: float = 60,
+                 max_rate_limit_wait: float = 900, announce: callable = None):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.announce = announce
+        self.timings = []
+        self._lock = threading.Lock()
+
+    def get(self, url: str, headers: dict = None, stream: bool = False) -> requests.Response:
+        """GET with retry and rate-limit backoff; the caller owns (and should close) streamed responses"""
+        last_error = None
+        for attempt in range(self.max_retries):
+            start = time.time()
+            try:
+                response = self.session.get(url, headers=headers, stream=stream, timeout=self.timeout)
+            except requests.RequestException as e:
+                self._record(url, None, time.time() - start, attempt)
+                last_error = e
+                self._backoff(attempt, 'connection error on %s (%s)' % (self._loggable(url), str(e)))
+                continue
+            self._record(url, response.status_code, time.time() - start, attempt)
+            wait = self._rate_limit_wait(response)
+            if wait is not None:
+                response.close()
+                if wait > self.max_rate_limit_wait:
+                    raise EPTestingException('Github rate limit exceeded, and it does not reset for %i s' % wait)
+                self._my_print('Github rate limit hit, waiting %i s for it to reset' % wait, log.WARN)
+                time.sleep(wait)
+                continue
+            if response.status_code in self.Retry_statuses:
+                response.close()
+                last_error = 'HTTP %i' % response.status_code
+                self._backoff(attempt, 'HTTP %i on %s' % (response.status_code, self._loggable(url)))
+                continue
+            return response
+        raise EPTestingException('Request to %s failed after %i attempts; error: %s' % (
+            self._loggable(url), self.max_retries, str(last_error)
+        ))
+
+    def download_to_file(self, url: str, path: str, headers: dict = None) -> None:
+        with self.get(url, headers=headers, stream=True) as response:
+            if response.status_code != 200:
+                raise EPTestingException('Could not download %s; HTTP %i' % (self._loggable(url), response.status_code))
+            with open(path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.Chunk_size):
+                    f.write(chunk)
+
+    def fetch_many(self, urls: List[str], fetch: Callable[[str], object] = None, headers: dict = None) -> list:
+        """Runs fetch (by default a GET returning the body bytes) over all urls concurrently, results in url order"""
+        if fetch is None:
+            def fetch(url):
+                response = self.get(url, headers=headers)
+                if response.status_code != 200:
+                    raise EPTestingException('Could not fetch %s; HTTP %i' % (
+                        self._loggable(url), response.status_code
+                    ))
+                return response.content
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            return list(executor.map(fetch, urls))
+
+    @staticmethod
+    def _rate_limit_wait(response: requests.Response):
+        """Returns how long to wait before retrying if this response is a rate limit rejection, otherwise None"""
+        if response.status_code not in (403, 429):
+            return None
+        retry_after = response.headers.get('Retry-After', None)
+        if retry_after is not None and retry_after.isdigit():
+            return int(retry_after)
+        limited = response.headers.get('X-RateLimit-Remaining', None) == '0'
+        if not limited:
+            try:
+                limited = 'rate limit' in response.json().get('message', '')
+            except (ValueError, AttributeError):
+                limited = False
+        if not limited:
+            return None
+        reset = response.headers.get('X-RateLimit-Reset', None)
+        if reset is None or not reset.isdigit():
+            return 60
+        return max(int(reset) - int(time.time()), 0) + 1
+
+    def _backoff(self, attempt: int, reason: str) -> None:
+        if attempt + 1 >= self.max_retries:
+            return
+        delay = 2 ** attempt
+        self._my_print('Retrying in %i s after %s' % (delay, reason), log.WARN)
+        time.sleep(delay)
+
+    @staticmethod
+    def _loggable(url: str) -> str:
+        # signed download urls carry credentials in the query string, keep those out of logs
+        parts = urlsplit(url)
+        return '%s://%s%s' % (parts.scheme, parts.netloc, parts.path)
+
+    def _record(self, url: str, status, elapsed: float, attempt: int) -> None:
+        with self._lock:
+            self.timings.append({
+                'url': self._loggable(url), 'status': status, 'elapsed': elapsed, 'attempt': attempt,
+                'time': time.time(),
+            })
+
+    def timing_summary(self) -> str:
+        with self._lock:
+            timings = list(self.timings)
+        lines = ['HTTP requests: %i, total time to first byte: %.2f s' % (
+            len(timings), sum(t['elapsed'] for t in timings)
+        )]
+        for t in timings:
+            lines.append('  %6.3f s  %s  %s' % (t['elapsed'], t['status'] if t['status'] else 'ERR', t['url']))
+        return '\n'.join(lines)
+
+    def _my_print(self, message: str, level: object = log.INFO) -> None:
+        if self.announce:
+            self.announce(message, level)
+        else:
+            print(message)
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def shared_client() -> HttpClient:
+    """The process-wide client, so every caller shares one connection pool"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient()
+        return _shared_client
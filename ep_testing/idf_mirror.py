@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+from typing import List
+
+from ep_testing.cache import exclusive_lock, unique_temp_path
+from ep_testing.exceptions import EPTestingException
+from ep_testing.http_client import shared_client
+
+
+class IdfMirror:
+    """Local content-addressed mirror of the test files of a prior EnergyPlus release
+
+    File contents are stored once under objects/, named by their sha256, and a small json manifest per release tag maps
+    each test file name to its digest.  Populating the mirror only fetches the files the manifest does not know about
+    yet, so once a tag has been mirrored, repeat runs make no network calls at all.  Objects are never modified in
+    place; tests copy them into their own directory before transitioning them."""
+
+    Raw_url = 'https://raw.githubusercontent.com/NREL/EnergyPlus/%s/testfiles/%s'
+
+    def __init__(self, mirror_dir: str, tag: str):
+        self.mirror_dir = mirror_dir
+        self.tag = tag
+        self.objects_dir = os.path.join(mirror_dir, 'objects')
+        try:
+            os.makedirs(self.objects_dir, exist_ok=True)
+        except Exception as e:
+            raise EPTestingException('Could not create IDF mirror at %s; error: %s' % (self.mirror_dir, str(e)))
+        self.manifest_path = os.path.join(mirror_dir, 'manifest_%s.json' % tag)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def missing(self, test_files: List[str]) -> List[str]:
+        manifest = self._read_manifest()
+        return [f for f in test_files if f not in manifest or not os.path.exists(self._object_path(manifest[f]))]
+
+    def populate(self, test_files: List[str]) -> int:
+        """Fetches whatever is not mirrored yet concurrently, returns the number of files downloaded"""
+        # runs sharing the mirror wait for each other rather than fetching the same files and losing manifest entries
+        with exclusive_lock(self.manifest_path + '.lock'):
+            missing = self.missing(test_files)
+            if not missing:
+                return 0
+            urls = [self.Raw_url % (self.tag, f) for f in missing]
+            try:
+                bodies = shared_client().fetch_many(urls)
+            except Exception as e:
+                raise EPTestingException('Could not mirror test files from %s; error: %s' % (self.tag, str(e)))
+            manifest = self._read_manifest()
+            for test_file, body in zip(missing, bodies):
+                manifest[test_file] = self._store(body)
+            self._write_manifest(manifest)
+            return len(missing)
+
+    def path(self, test_file: str) -> str:
+        manifest = self._read_manifest()
+        if test_file not in manifest:
+            raise EPTestingException('File %s from %s is not in the IDF mirror at %s' % (
+                test_file, self.tag, self.mirror_dir
+            ))
+        return self._object_path(manifest[test_file])
+
+    def _store(self, body: bytes) -> str:
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            temp_path = unique_temp_path(object_path)
+            with open(temp_path, 'wb') as f:
+                f.write(body)
+            os.replace(temp_path, object_path)
+        return digest
+
+    def _read_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def _write_manifest(self, manifest: dict) -> None:
+        temp_path = unique_temp_path(self.manifest_path)
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
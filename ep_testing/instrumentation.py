@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+from typing import List
+
+from ep_testing.process import rss_kb
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+def _cpu_time() -> float:
+    # thread time where available, since the tests run on worker threads and process time would mix them together
+    if hasattr(time, 'thread_time'):
+        return time.thread_time()
+    return time.process_time()
+
+
+class Instrumentation:
+    """Collects wall clock time, CPU time and peak RSS for the named phases of a test or of the download
+
+    Child CPU time comes from the RUSAGE_CHILDREN delta across the phase, and peak RSS is the high-water mark of this
+    process and its waited-for children at the end of the phase; both are approximate when other tests are running
+    children concurrently, and are None where the resource module is not available."""
+
+    def __init__(self, context: str = ''):
+        self.context = context
+        self.records = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start_wall = time.time()
+        start_cpu = _cpu_time()
+        start_children = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+        try:
+            yield
+        finally:
+            record = {
+                'context': self.context,
+                'phase': name,
+                'start': start_wall,
+                'wall_time': time.time() - start_wall,
+                'cpu_time': _cpu_time() - start_cpu,
+                'child_cpu_time': None,
+                'peak_rss_kb': None,
+            }
+            if resource:
+                children = resource.getrusage(resource.RUSAGE_CHILDREN)
+                record['child_cpu_time'] = (children.ru_utime - start_children.ru_utime) + (
+                    children.ru_stime - start_children.ru_stime
+                )
+                record['peak_rss_kb'] = max(rss_kb(resource.getrusage(resource.RUSAGE_SELF)), rss_kb(children))
+            with self._lock:
+                self.records.append(record)
+
+
+def summary_table(records: List[dict]) -> str:
+    width = max([len(r['context']) for r in records] + [len('Context')])
+    phase_width = max([len(r['phase']) for r in records] + [len('Phase')])
+    lines = ['%-*s  %-*s  %9s  %9s  %9s  %10s' % (
+        width, 'Context', phase_width, 'Phase', 'Wall [s]', 'CPU [s]', 'Child [s]', 'Peak RSS'
+    )]
+    for r in records:
+        child = '%9.2f' % r['child_cpu_time'] if r['child_cpu_time'] is not None else '%9s' % '-'
+        rss = '%7i MB' % (r['peak_rss_kb'] // 1024) if r['peak_rss_kb'] is not None else '%10s' % '-'
+        lines.append('%-*s  %-*s  %9.2f  %9.2f  %s  %s' % (
+            width, r['context'], phase_width, r['phase'], r['wall_time'], r['cpu_time'], child, rss
+        ))
+    return '\n'.join(lines)
+
+
+def write_phase_report(report_dir: str, records: List[dict]) -> str:
+    """Writes the records as json lines, prints the human readable table, and returns the report path"""
+    os.makedirs(report_dir, exist_ok=True)
+    report_path = os.path.join(report_dir, 'ep_testing_timings.jsonl')
+    with open(report_path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    if records:
+        print(summary_table(records))
+    print('Phase timings written to ' + report_path)
+    return report_path
+
+
+def write_child_usage_report(report_dir: str, results) -> str:
+    """Writes one json line per child process of every test result, and returns the report path"""
+    os.makedirs(report_dir, exist_ok=True)
+    report_path = os.path.join(report_dir, 'ep_testing_children.jsonl')
+    with open(report_path, 'w') as f:
+        for result in results:
+            for record in result.child_usage:
+                f.write(json.dumps(dict(record, test=result.task.label())) + '\n')
+    print('Child process usage written to ' + report_path)
+    return report_path
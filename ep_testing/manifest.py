@@ -0,0 +1,165 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import mmap
+import os
+import re
+import stat
+from typing import List
+
+from ep_testing.cache import unique_temp_path
+from ep_testing.config import OS
+from ep_testing.exceptions import EPTestingException
+
+
+VERSION_NUMBER = re.compile(r'\d+\.\d+\.\d+')
+
+
+def versionless(path: str) -> str:
+    """The path with release numbers blanked out, so libenergyplusapi.so.9.4.0 and .so.9.5.0 compare as one file"""
+    return VERSION_NUMBER.sub('X.Y.Z', path)
+
+
+def required_files(this_os: int) -> List[str]:
+    """Install-relative files that every installer for this OS must contain"""
+    if this_os == OS.Windows:
+        return ['energyplus.exe', 'energyplusapi.dll', 'ExpandObjects.exe', 'Energy+.idd']
+    if this_os == OS.Mac:
+        return ['energyplus', 'libenergyplusapi.dylib', 'ExpandObjects', 'Energy+.idd']
+    return ['energyplus', 'libenergyplusapi.so', 'ExpandObjects', 'Energy+.idd']
+
+
+def mapped_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        # an empty file cannot be mapped, but it hashes to the digest of nothing anyway
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                # hashlib lets go of the GIL while it hashes a large buffer, so the pool really hashes in parallel
+                hasher.update(mapped)
+    return hasher.hexdigest()
+
+
+def build_manifest(install_root: str, jobs: int = None) -> dict:
+    """Path, size, mode, symlink target and content hash of everything in an install tree
+
+    Paths are install-relative with '/' separators, symlinks are recorded but never followed, and the regular files
+    are hashed on a thread pool through memory maps."""
+    files = {}
+    to_hash = []
+    for root, dirs, names in os.walk(install_root):
+        # symlinked directories show up in dirs, os.walk does not descend into them but they still need an entry
+        for name in dirs + names:
+            path = os.path.join(root, name)
+            info = os.lstat(path)
+            if stat.S_ISDIR(info.st_mode):
+                continue
+            relative = os.path.relpath(path, install_root).replace(os.sep, '/')
+            entry = {'size': info.st_size, 'mode': stat.S_IMODE(info.st_mode), 'link': None, 'sha256': None}
+            if stat.S_ISLNK(info.st_mode):
+                entry['size'] = 0
+                entry['link'] = os.readlink(path)
+            else:
+                to_hash.append((relative, path))
+            files[relative] = entry
+    with ThreadPoolExecutor(max_workers=jobs if jobs else os.cpu_count() or 1) as executor:
+        for (relative, _), digest in zip(to_hash, executor.map(lambda item: mapped_sha256(item[1]), to_hash)):
+            files[relative]['sha256'] = digest
+    return {'root': os.path.basename(os.path.normpath(install_root)), 'hashed': True, 'files': files}
+
+
+def manifest_from_index(index) -> dict:
+    """The same manifest built from an archive index, for installs that are extracted lazily; there are no hashes"""
+    files = {}
+    for member in index.members:
+        if member['type'] == 'dir':
+            continue
+        files[index.relative_name(member)] = {
+            'size': member['size'], 'mode': member.get('mode'), 'link': member['link'], 'sha256': None,
+        }
+    return {'root': index.root, 'hashed': False, 'files': files}
+
+
+def write_manifest(path: str, manifest: dict) -> None:
+    temp_path = unique_temp_path(path)
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def load_manifest(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise EPTestingException('Could not read install manifest %s; error: %s' % (path, str(e)))
+
+
+def missing_required_files(manifest: dict, this_os: int) -> List[str]:
+    return [f for f in required_files(this_os) if f not in manifest['files']]
+
+
+class ManifestDiff:
+    """What changed from the last release's install to this one, and which of those changes look like packaging bugs
+
+    The problems are: an executable of the last release that is gone, an API library that grew by more than the
+    allowed fraction, and a top level file or directory that was not there before.  Files are matched by their
+    versionless path for the first two, since the real binaries carry the release number in their names."""
+
+    def __init__(self, last: dict, this: dict, library_growth: float = 0.25):
+        self.library_growth = library_growth
+        last_files = last['files']
+        this_files = this['files']
+        self.added = sorted(set(this_files) - set(last_files))
+        self.removed = sorted(set(last_files) - set(this_files))
+        self.changed = sorted(
+            f for f in set(this_files) & set(last_files) if self._differs(last_files[f], this_files[f])
+        )
+        self.size_change = sum(e['size'] for e in this_files.values()) - sum(e['size'] for e in last_files.values())
+        this_versionless = {versionless(f): f for f in this_files}
+        self.missing_executables = [
+            f for f in self.removed if last_files[f]['mode'] is not None and last_files[f]['mode'] & 0o111
+            and not last_files[f]['link'] and versionless(f) not in this_versionless
+        ]
+        last_top_level = set(versionless(f.split('/')[0]) for f in last_files)
+        self.new_top_level = sorted(
+            set(f.split('/')[0] for f in this_files if versionless(f.split('/')[0]) not in last_top_level)
+        )
+        self.library_growths = []
+        for f in sorted(last_files):
+            this_f = this_versionless.get(versionless(f))
+            if this_f is None or 'energyplusapi' not in os.path.basename(f):
+                continue
+            if last_files[f]['link'] or this_files[this_f]['link'] or not last_files[f]['size']:
+                continue
+            growth = this_files[this_f]['size'] / last_files[f]['size'] - 1.0
+            if growth > library_growth:
+                self.library_growths.append((this_f, last_files[f]['size'], this_files[this_f]['size'], growth))
+
+    @staticmethod
+    def _differs(last_entry: dict, this_entry: dict) -> bool:
+        if last_entry['sha256'] and this_entry['sha256']:
+            return last_entry['sha256'] != this_entry['sha256']
+        return last_entry['size'] != this_entry['size'] or last_entry['link'] != this_entry['link']
+
+    def problems(self) -> List[str]:
+        problems = ['Executable missing: ' + f for f in self.missing_executables]
+        problems.extend('%s grew from %i to %i bytes (%+.0f%%)' % (f, last, this, 100 * growth)
+                        for f, last, this, growth in self.library_growths)
+        problems.extend('New top level entry: ' + f for f in self.new_top_level)
+        return problems
+
+    def report(self, max_listed: int = 20) -> str:
+        lines = ['%i added, %i removed, %i changed, total size %+.1f MB' % (
+            len(self.added), len(self.removed), len(self.changed), self.size_change / (1024 * 1024)
+        )]
+        for title, paths in (('Added', self.added), ('Removed', self.removed)):
+            if paths:
+                lines.append('%s:' % title)
+                lines.extend('  ' + p for p in paths[:max_listed])
+                if len(paths) > max_listed:
+                    lines.append('  ... and %i more' % (len(paths) - max_listed))
+        problems = self.problems()
+        lines.append('%i problems%s' % (len(problems), ':' if problems else ''))
+        lines.extend('  ' + p for p in problems)
+        return '\n'.join(lines)
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from ep_testing.cache import ResultCache
+from ep_testing.config import TestConfiguration
+from ep_testing.downloader import Downloader
+from ep_testing.exceptions import EPTestingException
+from ep_testing.history import ResultsStore
+from ep_testing.instrumentation import write_child_usage_report, write_phase_report
+from ep_testing.scheduler import format_summary, Scheduler, TestResult
+from ep_testing.tester import Tester
+
+
+class Matrix:
+    """Runs the Tester suites for several run configurations (and optionally several release tags) in one process
+
+    Every unique (release tag, asset) pair is resolved and downloaded exactly once, even when several run configurations
+    share an asset, and then the test tasks of all combinations go into a single scheduler so they run concurrently
+    and end up in one consolidated report."""
+
+    def __init__(self, run_config_keys: List[str], tags: List[str] = None, verbose: bool = True, jobs: int = None,
+                 announce: callable = None, force: bool = False):
+        self.run_config_keys = run_config_keys
+        self.tags = tags if tags else [None]
+        self.verbose = verbose
+        self.jobs = jobs
+        self.announce = announce
+        self.force = force
+        self.download_phases = []
+        # asset metadata by (release tag, asset pattern), for the results store
+        self.assets = {}
+
+    def configurations(self) -> List[TestConfiguration]:
+        return [TestConfiguration(key, tag) for tag in self.tags for key in self.run_config_keys]
+
+    def download_all(self, configs: List[TestConfiguration]) -> dict:
+        """Downloads each unique asset once, returns the extracted install path for each (tag, asset pattern)"""
+        unique = OrderedDict()
+        for config in configs:
+            unique.setdefault((config.tag_this_version, config.asset_pattern), config)
+        with ThreadPoolExecutor(max_workers=len(unique)) as executor:
+            futures = OrderedDict(
+                (group, executor.submit(Downloader, config, self.announce)) for group, config in unique.items()
+            )
+            downloaders = OrderedDict((group, future.result()) for group, future in futures.items())
+        for group, downloader in downloaders.items():
+            self.download_phases.extend(downloader.instrumentation.records)
+            self.assets[group] = downloader.asset_metadata()
+        return OrderedDict((group, d.extracted_install_path()) for group, d in downloaders.items())
+
+    def run(self) -> List[TestResult]:
+        configs = self.configurations()
+        install_paths = self.download_all(configs)
+        tasks = []
+        store = ResultsStore(configs[0].history_db_path)
+        for config in configs:
+            install_path = install_paths[(config.tag_this_version, config.asset_pattern)]
+            tester = Tester(config, install_path, self.verbose, self.jobs)
+            config_tasks = tester.tasks()
+            tester.prepare(config_tasks)
+            store.estimate_durations(config_tasks, config.run_config_key)
+            for task in config_tasks:
+                task.install_path = install_path
+                task.group = '%s@%s' % (config.run_config_key, config.tag_this_version)
+                tasks.append(task)
+        result_cache = None
+        if configs[0].use_cache:
+            result_cache = ResultCache(configs[0].cache_dir, configs[0].result_cache_max_entries)
+        results = Scheduler(None, self.verbose, self.jobs, timeout=configs[0].test_timeout,
+                            result_cache=result_cache, force=self.force).run(tasks)
+        if result_cache:
+            result_cache.save_file_digests()
+        print(format_summary(results))
+        write_phase_report(configs[0].report_dir, self.download_phases + [p for r in results for p in r.phases])
+        write_child_usage_report(configs[0].report_dir, results)
+        for config in configs:
+            group = '%s@%s' % (config.run_config_key, config.tag_this_version)
+            store.record_run(config.tag_this_version, config.run_config_key,
+                             self.assets[(config.tag_this_version, config.asset_pattern)],
+                             [r for r in results if r.task.group == group])
+        failures = [r for r in results if not r.passed]
+        if failures:
+            raise EPTestingException('%i of %i tests failed: %s' % (
+                len(failures), len(results), ', '.join(r.task.label() for r in failures)
+            ))
+        return results
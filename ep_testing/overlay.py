@@ -0,0 +1,92 @@
+import os
+import shutil
+from typing import Dict
+
+from ep_testing.exceptions import EPTestingException
+
+try:
+    from _winapi import CreateJunction
+except ImportError:  # not windows
+    CreateJunction = None
+
+
+class InstallOverlay:
+    """A private view of an install that a test can write into without touching the shared tree
+
+    The view starts out as a directory of links to the top level entries of the install, which takes a few dozen
+    links whatever the size of the install.  Before writing somewhere, a test makes that directory writable: every
+    directory on the way down is turned into a real directory of links to its own contents, so new files land in the
+    view while everything else still points at the install.  Files to be modified in place are copied first, see
+    `writable_file`.  Links are symlinks where allowed, and hard links (files) or junctions (directories) on Windows
+    without symlink privilege; only a directory that cannot be linked at all is copied."""
+
+    def __init__(self, install_root: str, overlay_root: str):
+        self.install_root = install_root
+        self.root = overlay_root
+        # how each entry of the view was made, by path in the view; anything not in here is a real directory or file
+        self._links: Dict[str, str] = {}
+        try:
+            os.makedirs(self.root)
+            self._link_contents(self.install_root, self.root)
+        except OSError as e:
+            raise EPTestingException('Could not create install overlay at %s; error: %s' % (self.root, str(e)))
+
+    def path(self, relative_path: str) -> str:
+        return os.path.join(self.root, relative_path)
+
+    def writable(self, relative_dir: str) -> str:
+        """Turns the directory, and every directory above it, into real directories of the view; returns its path"""
+        current = self.root
+        source = self.install_root
+        for part in [p for p in relative_dir.replace('\\', '/').split('/') if p]:
+            current = os.path.join(current, part)
+            source = os.path.join(source, part)
+            kind = self._links.pop(current, None)
+            if kind is None:
+                if not os.path.isdir(current):
+                    os.makedirs(current)
+                continue
+            if kind == 'copy':
+                # already a private copy
+                continue
+            if kind == 'junction':
+                os.rmdir(current)
+            else:
+                os.unlink(current)
+            os.makedirs(current)
+            self._link_contents(source, current)
+        return current
+
+    def writable_file(self, relative_path: str) -> str:
+        """Replaces the link to a file by a copy of it, so it can be modified in place; returns its path"""
+        directory, name = os.path.split(relative_path.replace('\\', '/'))
+        target = os.path.join(self.writable(directory), name)
+        if self._links.pop(target, None) in ('symlink', 'hardlink'):
+            os.unlink(target)
+            shutil.copy2(os.path.join(self.install_root, relative_path), target)
+        return target
+
+    def _link_contents(self, source_dir: str, target_dir: str) -> None:
+        for entry in os.scandir(source_dir):
+            target = os.path.join(target_dir, entry.name)
+            is_dir = entry.is_dir()
+            try:
+                os.symlink(entry.path, target, target_is_directory=is_dir)
+                self._links[target] = 'symlink'
+                continue
+            except OSError:
+                # no symlink privilege, typically on Windows
+                pass
+            if not is_dir:
+                try:
+                    os.link(entry.path, target)
+                    self._links[target] = 'hardlink'
+                except OSError:
+                    shutil.copy2(entry.path, target)
+                    self._links[target] = 'copy'
+            elif CreateJunction is not None:
+                CreateJunction(entry.path, target)
+                self._links[target] = 'junction'
+            else:
+                shutil.copytree(entry.path, target)
+                self._links[target] = 'copy'
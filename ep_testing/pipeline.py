@@ -0,0 +1,73 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+from typing import Callable, Dict, List
+
+from ep_testing.exceptions import EPTestingException
+from ep_testing.instrumentation import Instrumentation
+
+
+class Pipeline:
+    """Runs named stages on a thread pool, each one as soon as the stages it depends on have finished
+
+    A stage is a callable that receives the results of its dependencies, in the order they were listed, and it is only
+    handed to the pool once all of them are done, so a waiting stage never holds a worker.  When a dependency fails,
+    the stages after it are not run and fail with the same error.  Dependencies must be added before the stages that
+    need them, which keeps the graph acyclic by construction."""
+
+    def __init__(self, jobs: int = 4):
+        self.instrumentation = Instrumentation('Pipeline')
+        self._executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='ep_testing_pipeline')
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, function: Callable, depends_on: List[str] = None) -> Future:
+        depends_on = depends_on if depends_on else []
+        for dependency in depends_on:
+            if dependency not in self._futures:
+                raise EPTestingException('Pipeline stage %s depends on unknown stage %s' % (name, dependency))
+        if name in self._futures:
+            raise EPTestingException('Pipeline stage %s added twice' % name)
+        future = Future()
+        self._futures[name] = future
+        dependencies = [self._futures[d] for d in depends_on]
+        remaining = [len(dependencies)]
+
+        def run_stage():
+            with self.instrumentation.phase(name):
+                return function(*[d.result() for d in dependencies])
+
+        def start():
+            failed = [d for d in dependencies if d.exception() is not None]
+            if failed:
+                future.set_exception(failed[0].exception())
+                return
+            inner = self._executor.submit(run_stage)
+            inner.add_done_callback(lambda f: future.set_exception(f.exception()) if f.exception() is not None
+                                    else future.set_result(f.result()))
+
+        def dependency_done(_):
+            with self._lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                start()
+
+        if not dependencies:
+            start()
+        for dependency in dependencies:
+            dependency.add_done_callback(dependency_done)
+        return future
+
+    def result(self, name: str):
+        return self._futures[name].result()
+
+    def wait(self) -> None:
+        """Waits for every stage, then raises the error of the first failed stage in the order they were added"""
+        try:
+            for future in list(self._futures.values()):
+                future.exception()
+        finally:
+            self._executor.shutdown(wait=True)
+        for future in self._futures.values():
+            if future.exception() is not None:
+                raise future.exception()
@@ -0,0 +1,152 @@
+import importlib
+import json
+import re
+import shutil
+from typing import Dict, List
+
+from ep_testing.config import OS, TestConfiguration
+from ep_testing.exceptions import EPTestingException
+from ep_testing.scheduler import TestTask, WORKDIR_REFERENCE
+
+
+# ${name} anywhere in a plan string; a string that is nothing but a reference takes the variable's own type
+VARIABLE_REFERENCE = re.compile(r'\$\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+OS_NAMES = {OS.Windows: 'Windows', OS.Linux: 'Linux', OS.Mac: 'Mac'}
+
+
+def plan_variables(config: TestConfiguration) -> dict:
+    """What a plan can refer to as ${name}: every configuration attribute, plus a few derived from them"""
+    variables = dict(vars(config))
+    variables['os_name'] = OS_NAMES[config.os]
+    variables['same_version'] = config.last_version == config.this_version
+    variables['cache_dir_if_enabled'] = config.cache_dir if config.use_cache else None
+    return variables
+
+
+def substitute(value, variables: dict):
+    if isinstance(value, str):
+        whole = VARIABLE_REFERENCE.fullmatch(value)
+        if whole:
+            return _lookup(whole.group(1), variables)
+        return VARIABLE_REFERENCE.sub(lambda m: str(_lookup(m.group(1), variables)), value)
+    if isinstance(value, list):
+        return [substitute(v, variables) for v in value]
+    if isinstance(value, dict):
+        return {k: substitute(v, variables) for k, v in value.items()}
+    return value
+
+
+def _lookup(name: str, variables: dict):
+    if name not in variables:
+        raise EPTestingException('Test plan refers to unknown variable ${%s}' % name)
+    return variables[name]
+
+
+def holds(predicate: dict, variables: dict) -> bool:
+    """Whether every entry of the predicate holds: a variable equal to the value or one of a list of values, 'tool'
+    for executables that must be on the PATH, and 'not' for a nested predicate that must not hold"""
+    for key, expected in predicate.items():
+        if key == 'not':
+            if holds(expected, variables):
+                return False
+        elif key == 'tool':
+            if not all(shutil.which(tool) for tool in (expected if isinstance(expected, list) else [expected])):
+                return False
+        elif _lookup(key, variables) not in (expected if isinstance(expected, list) else [expected]):
+            return False
+    return True
+
+
+class TestPlan:
+    """The tests of a run, their kwargs, the platforms they apply to and their dependencies, read from a json file
+
+    Each node names a test class of ep_testing.tests as 'module.Class' and gives its kwargs, in which ${name} refers to
+    a configuration attribute (see `plan_variables`) or to a variable of the plan's own 'variables' section.  A node
+    can also have:
+      'for_each': {name: list or ${variable}}, one test per item, with the item available as ${name}; the id should
+        then contain it too, such as "transition_${test_file}"
+      'depends_on': ids of nodes that must pass first; the id of a 'for_each' node as written stands for all of them
+      'skip_if': [{'when': predicate, 'note': text}], leaves the node out where a predicate holds, see `holds`
+      'estimate': expected duration in seconds, until the results store knows better
+      'timeout': overrides the configured per-test timeout
+    Kwargs strings can also contain ${workdir:<id>}, the sandbox directory of a node the test reads outputs from,
+    which makes that node a prerequisite as well.  Plan-wide 'notes' are printed where their 'when' holds."""
+
+    def __init__(self, plan_path: str):
+        self.plan_path = plan_path
+        try:
+            with open(plan_path) as f:
+                self.plan = json.load(f)
+        except (OSError, ValueError) as e:
+            raise EPTestingException('Could not read test plan %s; error: %s' % (plan_path, str(e)))
+        if not isinstance(self.plan.get('nodes'), list):
+            raise EPTestingException('Test plan %s has no list of nodes, problem.' % plan_path)
+
+    def _test_class(self, node: dict):
+        module_name, _, class_name = node['test'].rpartition('.')
+        try:
+            return getattr(importlib.import_module('ep_testing.tests.' + module_name), class_name)
+        except (ImportError, AttributeError, ValueError):
+            raise EPTestingException('Test plan node %s names unknown test %s' % (node.get('id'), node['test']))
+
+    def tasks(self, config: TestConfiguration) -> List[TestTask]:
+        config_variables = plan_variables(config)
+        clashes = set(self.plan.get('variables', {})) & set(config_variables)
+        if clashes:
+            raise EPTestingException('Test plan variables shadow configuration attributes: %s' % ', '.join(clashes))
+        variables = dict(self.plan.get('variables', {}), **config_variables)
+        for note in self.plan.get('notes', []):
+            if holds(note['when'], variables):
+                print(note['text'])
+
+        tasks = []
+        # ids of every test made from a node, by the id as written, which is what dependencies refer to
+        expanded: Dict[str, List[str]] = {}
+        for node in self.plan['nodes']:
+            skipped = [s for s in node.get('skip_if', []) if holds(s['when'], variables)]
+            if skipped:
+                if skipped[0].get('note'):
+                    print(skipped[0]['note'])
+                expanded[node['id']] = []
+                continue
+            test_class = self._test_class(node)
+            ids = expanded.setdefault(node['id'], [])
+            for item_variables in self._items(node, variables):
+                node_variables = dict(variables, **item_variables)
+                task_id = substitute(node['id'], node_variables)
+                if task_id != node['id']:
+                    expanded[task_id] = []
+                kwargs = substitute(node.get('kwargs', {}), node_variables)
+                dependencies = substitute(node.get('depends_on', []), node_variables)
+                for referenced in WORKDIR_REFERENCE.findall(json.dumps(kwargs, default=str)):
+                    if referenced not in dependencies:
+                        dependencies.append(referenced)
+                unknown = [d for d in dependencies if d not in expanded]
+                if unknown:
+                    raise EPTestingException('Test plan node %s depends on %s, which must come before it' % (
+                        task_id, ', '.join(unknown)
+                    ))
+                if any(not expanded[d] for d in dependencies):
+                    # a prerequisite that is left out on this platform takes its dependents with it
+                    continue
+                ids.append(task_id)
+                if task_id != node['id']:
+                    expanded[task_id].append(task_id)
+                tasks.append(TestTask(
+                    test_class(), kwargs, name=task_id, depends_on=[i for d in dependencies for i in expanded[d]],
+                    estimate=node.get('estimate'), timeout=node.get('timeout'),
+                ))
+        return tasks
+
+    @staticmethod
+    def _items(node: dict, variables: dict) -> List[dict]:
+        if 'for_each' not in node:
+            return [{}]
+        if len(node['for_each']) != 1:
+            raise EPTestingException('Test plan node %s must loop over exactly one variable' % node['id'])
+        (name, values), = node['for_each'].items()
+        values = substitute(values, variables)
+        if not isinstance(values, list):
+            raise EPTestingException('Test plan node %s loops over %s, which is not a list' % (node['id'], values))
+        return [{name: value} for value in values]
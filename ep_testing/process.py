@@ -0,0 +1,391 @@
+import asyncio
+from collections import deque
+from fnmatch import fnmatch
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import List, Optional, TextIO
+
+from ep_testing.exceptions import EPTestingException
+
+
+class ProcessResult:
+
+    def __init__(self, command_line: List[str], log_path: Optional[str]):
+        self.command_line = command_line
+        self.log_path = log_path
+        self.returncode = None
+        self.timed_out = False
+        self.duration = 0.0
+        self.tail = deque()
+        # the complete output, only collected when asked for
+        self.output = None
+        # resource usage of the child itself, from wait4, where the platform has it; see usage_record
+        self.usage = None
+
+    def tail_text(self) -> str:
+        return ''.join(self.tail)
+
+    def check(self, message: str, output: TextIO = None) -> None:
+        """Raises with the message if the child failed or timed out, after printing its last lines to output"""
+        if self.returncode == 0 and not self.timed_out:
+            return
+        if output is not None:
+            print('Last lines of output from %s:' % os.path.basename(self.command_line[0]), file=output)
+            print(self.tail_text(), end='', file=output)
+            if self.log_path:
+                print('Full output in ' + self.log_path, file=output)
+        if self.timed_out:
+            raise EPTestingException('%s (timed out after %.0fs)' % (message, self.duration))
+        raise EPTestingException('%s (exit code %s)' % (message, self.returncode))
+
+
+def rss_kb(usage) -> int:
+    """The peak RSS of a struct rusage in kilobytes, ru_maxrss is in kilobytes on Linux but in bytes on Mac"""
+    if sys.platform == 'darwin':
+        return usage.ru_maxrss // 1024
+    return usage.ru_maxrss
+
+
+def usage_record(usage) -> dict:
+    """The interesting parts of a struct rusage, with the peak RSS in kilobytes on every platform"""
+    return {
+        'user_time': usage.ru_utime,
+        'system_time': usage.ru_stime,
+        'max_rss_kb': rss_kb(usage),
+        'minor_faults': usage.ru_minflt,
+        'major_faults': usage.ru_majflt,
+        'voluntary_switches': usage.ru_nvcsw,
+        'involuntary_switches': usage.ru_nivcsw,
+    }
+
+
+def profiler_wrapper(command_line: List[str], output_base: str) -> List[str]:
+    """The command line wrapped in the external sampling profiler, when the executable is one chosen for profiling
+
+    EP_TESTING_PROFILE holds comma separated executable name patterns, like `energyplus*`, and EP_TESTING_PROFILER the
+    profiler command with an {output} placeholder for its output file, by default `perf record -g -o {output} --`."""
+    patterns = [p.strip() for p in os.environ.get('EP_TESTING_PROFILE', '').split(',') if p.strip()]
+    executable = os.path.basename(command_line[0])
+    if not any(fnmatch(executable, p) for p in patterns):
+        return command_line
+    profiler = os.environ.get('EP_TESTING_PROFILER', 'perf record -g -o {output} --')
+    return [arg.replace('{output}', output_base + '.profile') for arg in shlex.split(profiler)] + command_line
+
+
+def _retrieve_outcome(future: asyncio.Future) -> None:
+    # a gather cancelled by a timeout still ends with an exception on Python 3.6, which asyncio reports into the log
+    # as never retrieved unless somebody looks at it
+    if not future.cancelled():
+        future.exception()
+
+
+class ProcessRunner:
+    """Runs child processes from a single asyncio event loop living on a background thread
+
+    Any thread can hand a command to the loop and block on the result, and many children run concurrently without a
+    thread each.  Output (stdout and stderr merged) is read line by line as it is produced: every line goes to the log
+    file, and only the last few are kept in memory for error reports, so a chatty simulation costs no memory.  A
+    timeout kills the child's whole process group, which takes care of anything it spawned itself.
+
+    Where os.wait4 exists, children are started with Popen and reaped by the runner itself with wait4, which is the
+    only way to get the resource usage of one particular child; elsewhere (Windows) they go through asyncio's
+    subprocess support and the usage is left empty."""
+
+    # longest pause between two checks whether a child has exited
+    Reap_interval = 0.05
+
+    Tail_lines = 200
+    Line_limit = 16 * 1024 * 1024
+
+    def __init__(self):
+        if sys.platform == 'win32':
+            # subprocesses need the proactor loop on Windows, which only became the default in Python 3.8
+            self.loop = asyncio.ProactorEventLoop()
+        else:
+            # children are reaped by the runner itself, see _reap, so no asyncio child watcher is involved
+            self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='ep_testing_processes', daemon=True)
+        self._thread.start()
+
+    def run(self, command_line: List[str], cwd: str = None, env: dict = None, timeout: float = None,
+            log_path: str = None, capture: bool = False) -> ProcessResult:
+        """Runs one child to completion and returns its result, it is up to the caller to check the return code
+
+        With capture, the whole output is also kept in result.output; only meant for children with short output."""
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(command_line, cwd, env, timeout, log_path, capture), self.loop
+        )
+        return future.result()
+
+    def start(self, command_line: List[str], cwd: str = None, env: dict = None,
+              log_path: str = None) -> 'InteractiveProcess':
+        """Starts a long running child to exchange lines with, see InteractiveProcess"""
+        return InteractiveProcess(self, command_line, cwd, env, log_path)
+
+    def run_many(self, commands: List[dict], max_concurrent: int = None) -> List[ProcessResult]:
+        """Runs several children concurrently, each given as a dict of `run` keyword arguments, results in order"""
+        async def run_all():
+            semaphore = asyncio.Semaphore(max_concurrent if max_concurrent else len(commands) or 1)
+
+            async def run_one(c):
+                async with semaphore:
+                    return await self._run(c['command_line'], c.get('cwd'), c.get('env'), c.get('timeout'),
+                                           c.get('log_path'), c.get('capture', False))
+            return await asyncio.gather(*[run_one(c) for c in commands])
+        return asyncio.run_coroutine_threadsafe(run_all(), self.loop).result()
+
+    async def _run(self, command_line: List[str], cwd: Optional[str], env: Optional[dict], timeout: Optional[float],
+                   log_path: Optional[str], capture: bool = False) -> ProcessResult:
+        result = ProcessResult(command_line, log_path)
+        result.tail = deque(maxlen=self.Tail_lines)
+        if capture:
+            result.output = []
+        start = time.time()
+        log = open(log_path, 'w', encoding='utf-8', errors='replace') if log_path else None
+        try:
+            if hasattr(os, 'wait4'):
+                await self._run_reaped(command_line, cwd, env, timeout, result, log)
+            else:
+                await self._run_asyncio(command_line, cwd, env, timeout, result, log)
+        finally:
+            if log:
+                log.close()
+        result.duration = time.time() - start
+        if capture:
+            result.output = ''.join(result.output)
+        return result
+
+    async def _run_reaped(self, command_line: List[str], cwd: Optional[str], env: Optional[dict],
+                          timeout: Optional[float], result: ProcessResult, log: Optional[TextIO]) -> None:
+        try:
+            process = subprocess.Popen(
+                command_line, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=cwd,
+                env=env, start_new_session=True
+            )
+        except OSError as e:
+            raise EPTestingException('Could not start %s; error: %s' % (command_line[0], str(e)))
+        stream = asyncio.StreamReader(limit=self.Line_limit)
+        transport, _ = await self.loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stream), process.stdout)
+        # the output closing is the first sign of the child exiting, so it wakes the reaper up from its backoff and
+        # the measured duration does not depend on the polling interval
+        output_closed = asyncio.Event()
+        running = asyncio.gather(
+            self._pump(stream, result, log, output_closed), self._reap(process, result, output_closed)
+        )
+        running.add_done_callback(_retrieve_outcome)
+        try:
+            await asyncio.wait_for(running, timeout)
+        except asyncio.TimeoutError:
+            result.timed_out = True
+            if process.returncode is None:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await self._reap(process, result)
+        finally:
+            transport.close()
+
+    async def _reap(self, process: subprocess.Popen, result: ProcessResult,
+                    output_closed: asyncio.Event = None) -> None:
+        """Waits for the child with wait4, polling so no thread is tied up per child, and records its usage"""
+        delay = 0.001
+        while True:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            if output_closed is None:
+                await asyncio.sleep(delay)
+            else:
+                try:
+                    await asyncio.wait_for(output_closed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                if output_closed.is_set():
+                    output_closed.clear()
+                    delay = 0.0005
+            delay = min(delay * 2, self.Reap_interval)
+        # the child is reaped here, so tell Popen about it instead of letting it wait again
+        process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        result.returncode = process.returncode
+        result.usage = usage_record(usage)
+
+    async def _run_asyncio(self, command_line: List[str], cwd: Optional[str], env: Optional[dict],
+                           timeout: Optional[float], result: ProcessResult, log: Optional[TextIO]) -> None:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command_line, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=cwd,
+                env=env, limit=self.Line_limit, creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
+            )
+        except OSError as e:
+            raise EPTestingException('Could not start %s; error: %s' % (command_line[0], str(e)))
+        running = asyncio.gather(self._pump(process.stdout, result, log), process.wait())
+        running.add_done_callback(_retrieve_outcome)
+        try:
+            await asyncio.wait_for(running, timeout)
+        except asyncio.TimeoutError:
+            result.timed_out = True
+            self._kill_tree(process)
+            await process.wait()
+        result.returncode = process.returncode
+
+    @staticmethod
+    async def _pump(stream: asyncio.StreamReader, result: ProcessResult, log: Optional[TextIO],
+                    closed: asyncio.Event = None) -> None:
+        while True:
+            line = await stream.readline()
+            if not line:
+                if closed is not None:
+                    closed.set()
+                return
+            text = line.decode('utf-8', errors='replace')
+            result.tail.append(text)
+            if result.output is not None:
+                result.output.append(text)
+            if log:
+                log.write(text)
+
+    @staticmethod
+    def _kill_tree(process) -> None:
+        if process.returncode is not None:
+            return
+        # /T takes the whole tree down, there are no process groups to signal on Windows
+        subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+
+
+class InteractiveProcess:
+    """A long running child that takes requests on its stdin and answers one line per request on its stdout
+
+    It is started on a runner's event loop like any other child, in its own process group, with stderr going to a log
+    file.  Every read has a deadline, so a child that hangs never blocks the caller for good; `kill` takes it down
+    with everything it spawned, and `close` reaps it and leaves its resource usage in `result`, the same as for the
+    children of ProcessRunner.run."""
+
+    def __init__(self, runner: 'ProcessRunner', command_line: List[str], cwd: str = None, env: dict = None,
+                 log_path: str = None):
+        self.runner = runner
+        self.result = ProcessResult(command_line, log_path)
+        self._start_time = time.time()
+        self._log = open(log_path, 'w', encoding='utf-8', errors='replace') if log_path else None
+        self._popen = None
+        self._process = None
+        self._transport = None
+        self._stdout = None
+        self._call(self._start(command_line, cwd, env))
+
+    def _call(self, coroutine, timeout: float = None):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.runner.loop).result(timeout)
+
+    async def _start(self, command_line: List[str], cwd: Optional[str], env: Optional[dict]) -> None:
+        stderr = self._log if self._log else subprocess.DEVNULL
+        try:
+            if hasattr(os, 'wait4'):
+                self._popen = subprocess.Popen(
+                    command_line, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr, cwd=cwd, env=env,
+                    start_new_session=True
+                )
+                self._stdout = asyncio.StreamReader(limit=ProcessRunner.Line_limit)
+                self._transport, _ = await self.runner.loop.connect_read_pipe(
+                    lambda: asyncio.StreamReaderProtocol(self._stdout), self._popen.stdout
+                )
+            else:
+                self._process = await asyncio.create_subprocess_exec(
+                    *command_line, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr, cwd=cwd, env=env,
+                    limit=ProcessRunner.Line_limit, creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
+                )
+                self._stdout = self._process.stdout
+        except OSError as e:
+            raise EPTestingException('Could not start %s; error: %s' % (command_line[0], str(e)))
+
+    def running(self) -> bool:
+        # polling the child would reap it behind wait4's back, its output closing is what tells it is gone
+        return self.result.returncode is None and not self._stdout.at_eof()
+
+    def write_line(self, text: str, timeout: float = None) -> None:
+        data = (text + '\n').encode('utf-8')
+        try:
+            if self._popen is not None:
+                self._popen.stdin.write(data)
+                self._popen.stdin.flush()
+            else:
+                self._call(self._write(data), timeout)
+        except (OSError, ValueError, ConnectionError) as e:
+            raise EPTestingException('Could not write to %s; error: %s' % (self.result.command_line[0], str(e)))
+
+    async def _write(self, data: bytes) -> None:
+        self._process.stdin.write(data)
+        await self._process.stdin.drain()
+
+    def read_line(self, timeout: float = None) -> Optional[str]:
+        """The next line of output, '' once the child closed its output, or None if nothing came within the timeout"""
+        async def read():
+            try:
+                return await asyncio.wait_for(self._stdout.readline(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        line = self._call(read())
+        return None if line is None else line.decode('utf-8', errors='replace')
+
+    def kill(self) -> None:
+        if self._popen is not None:
+            if self._popen.returncode is None:
+                try:
+                    os.killpg(self._popen.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        else:
+            ProcessRunner._kill_tree(self._process)
+
+    def close(self, timeout: float = 30) -> ProcessResult:
+        """Closes the child's input, waits for it to exit, killing it after the timeout, and reaps it"""
+        try:
+            if self._popen is not None:
+                self._popen.stdin.close()
+            else:
+                self._call(self._close_input())
+        except (OSError, ConnectionError):
+            pass
+        self._call(self._wait(timeout))
+        self.result.duration = time.time() - self._start_time
+        if self._log:
+            self._log.close()
+        return self.result
+
+    async def _close_input(self) -> None:
+        self._process.stdin.close()
+
+    async def _wait(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._reap(), timeout)
+        except asyncio.TimeoutError:
+            self.result.timed_out = True
+            self.kill()
+            await self._reap()
+        if self._transport is not None:
+            self._transport.close()
+
+    async def _reap(self) -> None:
+        if self._popen is not None:
+            await self.runner._reap(self._popen, self.result)
+        else:
+            await self._process.wait()
+            self.result.returncode = self._process.returncode
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def shared_runner() -> ProcessRunner:
+    """The process-wide runner, created on first use"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = ProcessRunner()
+        return _runner
@@ -0,0 +1,229 @@
+from concurrent.futures import ThreadPoolExecutor
+from distutils import log
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import requests
+
+from ep_testing.cache import unique_temp_path
+from ep_testing.exceptions import EPTestingException
+from ep_testing.http_client import HttpClient, shared_client
+
+
+class RangeDownloader:
+    """Downloads a single large file over several connections at once using HTTP range requests
+
+    The file is split into fixed size parts that are fetched concurrently into a preallocated `.part` file.  Finished
+    parts are recorded in a small json state file beside it, so an interrupted download picks up where it left off on
+    the next attempt instead of starting over.  Each part is retried with backoff on its own.  Servers that do not
+    honor ranges fall back to a plain single-connection download.  Once all parts are in, the size and (optionally)
+    the sha256 are verified before the file is moved to its final name."""
+
+    Chunk_size = 1024 * 1024
+
+    def __init__(self, url: str, target_path: str, expected_size: int = None, expected_sha256: str = None,
+                 connections: int = 4, part_size: int = 8 * 1024 * 1024, retries: int = 5,
+                 announce: callable = None, headers: dict = None, client: HttpClient = None):
+        self.url = url
+        self.target_path = target_path
+        self.partial_path = target_path + '.part'
+        self.state_path = target_path + '.part.json'
+        self.expected_size = expected_size
+        self.expected_sha256 = expected_sha256
+        self.connections = max(1, connections)
+        self.part_size = part_size
+        self.retries = retries
+        self.announce = announce
+        self.headers = headers if headers else {}
+        self.client = client if client else shared_client()
+        self._lock = threading.Lock()
+        self._completed = set()
+        self._bytes_done = 0
+        self._bytes_this_session = 0
+        self._start_time = 0.0
+        self._last_report = 0.0
+
+    def download(self) -> str:
+        """Runs the download to completion, returns the sha256 of the downloaded file"""
+        size, ranges_supported = self._probe()
+        if self.expected_size is not None and size is not None and size != self.expected_size:
+            raise EPTestingException('Server reports %i bytes for %s but %i were expected' % (
+                size, self.url, self.expected_size
+            ))
+        self._start_time = self._last_report = time.time()
+        if size is None or not ranges_supported or size <= self.part_size:
+            self._my_print('Downloading %s on a single connection' % self.url, log.DEBUG)
+            self._single_download()
+        else:
+            self._ranged_download(size)
+        sha256 = self._verify()
+        os.replace(self.partial_path, self.target_path)
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        elapsed = max(time.time() - self._start_time, 1e-6)
+        self._my_print('Downloaded %s (%.1f MB in %.1f s, %.1f MB/s)' % (
+            os.path.basename(self.target_path), self._bytes_this_session / 1024 ** 2, elapsed,
+            self._bytes_this_session / 1024 ** 2 / elapsed
+        ))
+        return sha256
+
+    def _probe(self) -> Tuple[Optional[int], bool]:
+        """Asks for the first byte only, the Content-Range header of a 206 carries the full size"""
+        headers = dict(self.headers)
+        headers['Range'] = 'bytes=0-0'
+        try:
+            with self.client.get(self.url, headers=headers, stream=True) as response:
+                response.raise_for_status()
+                if response.status_code == 206 and '/' in response.headers.get('Content-Range', ''):
+                    total = response.headers['Content-Range'].split('/')[-1]
+                    return (int(total) if total != '*' else None), True
+                length = response.headers.get('Content-Length')
+                return (int(length) if length else None), False
+        except (requests.RequestException, EPTestingException) as e:
+            raise EPTestingException('Could not reach %s; error: %s' % (self.url, str(e)))
+
+    def _parts(self, size: int) -> List[Tuple[int, int, int]]:
+        parts = []
+        for index, start in enumerate(range(0, size, self.part_size)):
+            parts.append((index, start, min(start + self.part_size, size) - 1))
+        return parts
+
+    def _load_state(self, size: int) -> None:
+        self._completed = set()
+        if os.path.exists(self.state_path) and os.path.exists(self.partial_path):
+            try:
+                with open(self.state_path) as f:
+                    state = json.load(f)
+                if state['size'] == size and state['part_size'] == self.part_size and state['url'] == self.url:
+                    self._completed = set(state['completed'])
+            except (ValueError, KeyError):
+                pass
+        if not self._completed or os.path.getsize(self.partial_path) != size:
+            self._completed = set()
+            with open(self.partial_path, 'wb') as f:
+                f.truncate(size)
+
+    def _save_state(self, size: int) -> None:
+        temp_path = unique_temp_path(self.state_path)
+        with open(temp_path, 'w') as f:
+            json.dump({
+                'url': self.url, 'size': size, 'part_size': self.part_size, 'completed': sorted(self._completed)
+            }, f)
+        os.replace(temp_path, self.state_path)
+
+    def _ranged_download(self, size: int) -> None:
+        self._load_state(size)
+        parts = self._parts(size)
+        pending = [p for p in parts if p[0] not in self._completed]
+        self._bytes_done = sum(p[2] - p[1] + 1 for p in parts if p[0] in self._completed)
+        if self._completed:
+            self._my_print('Resuming download of %s, %i of %i parts already present' % (
+                os.path.basename(self.target_path), len(self._completed), len(parts)
+            ))
+        self._my_print('Downloading %i parts on %i connections' % (len(pending), self.connections), log.DEBUG)
+        with ThreadPoolExecutor(max_workers=self.connections) as executor:
+            # list() forces every part to finish and re-raises the first failure
+            list(executor.map(lambda p: self._fetch_part(size, *p), pending))
+
+    def _fetch_part(self, size: int, index: int, start: int, end: int) -> None:
+        headers = dict(self.headers)
+        headers['Range'] = 'bytes=%i-%i' % (start, end)
+        last_error = None
+        for attempt in range(self.retries):
+            written = 0
+            try:
+                with self.client.get(self.url, headers=headers, stream=True) as response:
+                    if response.status_code != 206:
+                        raise EPTestingException('Expected a partial response, got HTTP %i' % response.status_code)
+                    with open(self.partial_path, 'r+b') as f:
+                        f.seek(start)
+                        for chunk in response.iter_content(chunk_size=self.Chunk_size):
+                            f.write(chunk)
+                            written += len(chunk)
+                            self._progress(len(chunk), size)
+                if written != end - start + 1:
+                    raise EPTestingException('Short read, got %i of %i bytes' % (written, end - start + 1))
+                with self._lock:
+                    self._completed.add(index)
+                    self._save_state(size)
+                return
+            except (requests.RequestException, EPTestingException) as e:
+                last_error = e
+                self._progress(-written, size)
+                delay = 2 ** attempt
+                self._my_print('Part %i failed (%s), retrying in %i s' % (index, str(e), delay), log.WARN)
+                time.sleep(delay)
+        raise EPTestingException('Could not download bytes %i-%i of %s after %i attempts; error: %s' % (
+            start, end, self.url, self.retries, str(last_error)
+        ))
+
+    def _single_download(self) -> None:
+        last_error = None
+        for attempt in range(self.retries):
+            written = 0
+            try:
+                with self.client.get(self.url, headers=self.headers, stream=True) as response:
+                    response.raise_for_status()
+                    with open(self.partial_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=self.Chunk_size):
+                            f.write(chunk)
+                            written += len(chunk)
+                            self._progress(len(chunk), self.expected_size)
+                return
+            except (requests.RequestException, EPTestingException) as e:
+                last_error = e
+                self._progress(-written, self.expected_size)
+                delay = 2 ** attempt
+                self._my_print('Download failed (%s), retrying in %i s' % (str(e), delay), log.WARN)
+                time.sleep(delay)
+        raise EPTestingException('Could not download %s after %i attempts; error: %s' % (
+            self.url, self.retries, str(last_error)
+        ))
+
+    def _progress(self, num_bytes: int, size: Optional[int]) -> None:
+        with self._lock:
+            self._bytes_done += num_bytes
+            self._bytes_this_session += num_bytes
+            now = time.time()
+            if now - self._last_report < 5.0:
+                return
+            self._last_report = now
+            rate = self._bytes_this_session / 1024 ** 2 / max(now - self._start_time, 1e-6)
+            if size:
+                message = 'Downloaded %.1f of %.1f MB (%.0f%%) at %.1f MB/s' % (
+                    self._bytes_done / 1024 ** 2, size / 1024 ** 2, 100.0 * self._bytes_done / size, rate
+                )
+            else:
+                message = 'Downloaded %.1f MB at %.1f MB/s' % (self._bytes_done / 1024 ** 2, rate)
+        self._my_print(message)
+
+    def _verify(self) -> str:
+        actual_size = os.path.getsize(self.partial_path)
+        if self.expected_size is not None and actual_size != self.expected_size:
+            raise EPTestingException('Downloaded size %i does not match expected size %i for %s' % (
+                actual_size, self.expected_size, self.url
+            ))
+        hasher = hashlib.sha256()
+        with open(self.partial_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.Chunk_size), b''):
+                hasher.update(chunk)
+        sha256 = hasher.hexdigest()
+        if self.expected_sha256 and sha256 != self.expected_sha256:
+            # a corrupt file must not be resumed, throw the state away so the next attempt starts clean
+            os.remove(self.partial_path)
+            if os.path.exists(self.state_path):
+                os.remove(self.state_path)
+            raise EPTestingException('Digest mismatch for %s: expected %s, got %s' % (
+                self.url, self.expected_sha256, sha256
+            ))
+        return sha256
+
+    def _my_print(self, message: str, level: object = log.INFO) -> None:
+        if self.announce:
+            self.announce(message, level)
+        else:
+            print(message)
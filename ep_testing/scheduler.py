@@ -0,0 +1,332 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import heapq
+import io
+import json
+import os
+import re
+from tempfile import mkdtemp
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+from ep_testing.archive import ensure_install_paths
+from ep_testing.cache import ResultCache
+from ep_testing.exceptions import EPTestingException
+from ep_testing.overlay import InstallOverlay
+from ep_testing.tests.base import BaseTest
+
+
+# a kwargs string such as '${workdir:expand}/expanded.idf' is resolved to the sandbox of the task named 'expand'
+WORKDIR_REFERENCE = re.compile(r'\$\{workdir:([^}]+)\}')
+
+
+def default_job_count() -> int:
+    return os.cpu_count() or 1
+
+
+class TestTask:
+    """A single scheduled test: the test instance plus the kwargs it is run with
+
+    The install path defaults to the scheduler's, but can be set per task so that one scheduler can drive tests
+    against several installs at once; the group names the configuration a task belongs to in consolidated reports.
+    Tasks of the same group can name each other as prerequisites, see `Scheduler.run`."""
+
+    def __init__(self, test: BaseTest, kwargs: dict, install_path: str = None, group: str = '',
+                 timeout: float = None, name: str = None, depends_on: List[str] = None, estimate: float = None):
+        self.test = test
+        self.kwargs = kwargs
+        self.install_path = install_path
+        self.group = group
+        # overrides the scheduler's per-test timeout for this task
+        self.timeout = timeout
+        self.name = name
+        # names of the tasks that must pass before this one starts
+        self.depends_on = depends_on if depends_on else []
+        # expected duration in seconds, only used to decide what to start first
+        self.estimate = estimate
+
+    def prerequisites(self) -> List[str]:
+        """The declared dependencies plus every task whose sandbox the kwargs refer to"""
+        referenced = WORKDIR_REFERENCE.findall(json.dumps(self.kwargs, default=str))
+        return list(dict.fromkeys(self.depends_on + referenced))
+
+    def label(self) -> str:
+        if 'test_file' in self.kwargs:
+            label = '%s(%s)' % (self.test.__class__.__name__, self.kwargs['test_file'])
+        else:
+            label = self.test.__class__.__name__
+        if self.group:
+            return '%s: %s' % (self.group, label)
+        return label
+
+
+class TestResult:
+
+    def __init__(self, task: TestTask, working_dir: str):
+        self.task = task
+        self.working_dir = working_dir
+        self.passed = False
+        # passed on an earlier run with identical inputs, and was not run again
+        self.cached = False
+        # not run at all because a prerequisite did not pass
+        self.skipped = False
+        self.output = ''
+        self.error = None
+        self.error_details = ''
+        self.duration = 0.0
+        self.phases = []
+        # resource usage of every child process the test ran, see BaseTest.run_processes
+        self.child_usage = []
+
+    def child_cpu_time(self) -> Optional[float]:
+        times = [c['user_time'] + c['system_time'] for c in self.child_usage if 'user_time' in c]
+        return sum(times) if times else None
+
+    def child_max_rss_kb(self) -> Optional[int]:
+        peaks = [c['max_rss_kb'] for c in self.child_usage if 'max_rss_kb' in c]
+        return max(peaks) if peaks else None
+
+
+class Scheduler:
+    """Runs a list of tests on a bounded pool of workers, each test inside its own sandbox directory
+
+    The tests themselves spend nearly all of their time waiting on child processes (EnergyPlus, CMake, compilers),
+    so a thread pool is enough to keep the cores busy.  Each test writes into a private output buffer, and the
+    buffers are printed in the order the tests were submitted, so the report reads the same as a serial run.
+
+    The tasks form a dependency graph: a task only starts once its prerequisites passed, and when one does not pass,
+    everything downstream of it is reported as skipped instead of being run.  Among the tasks that are ready, the one
+    heading the longest chain of estimated durations goes first, so the run takes about as long as its critical
+    path."""
+
+    def __init__(self, install_path: str, verbose: bool, jobs: int = None, sandbox_root: str = None,
+                 timeout: float = None, result_cache: ResultCache = None, force: bool = False):
+        self.install_path = install_path
+        self.verbose = verbose
+        self.jobs = jobs if jobs else default_job_count()
+        self.timeout = timeout
+        # with a result cache, tests that already passed against identical inputs are skipped unless forced
+        self.result_cache = result_cache
+        self.force = force
+        self.sandbox_root = sandbox_root if sandbox_root else mkdtemp()
+        # per run: task index by (group, name), sandbox of each started task, and the tasks that always really run
+        self._by_name: Dict[Tuple[str, str], int] = {}
+        self._working_dirs: Dict[int, str] = {}
+        self._uncached = set()
+
+    def run(self, tasks: List[TestTask]) -> List[TestResult]:
+        self._by_name = {}
+        for index, task in enumerate(tasks):
+            if task.name is not None:
+                if (task.group, task.name) in self._by_name:
+                    raise EPTestingException('Two tests are named %s, problem.' % task.name)
+                self._by_name[(task.group, task.name)] = index
+        prerequisites = []
+        for task in tasks:
+            unknown = [n for n in task.prerequisites() if (task.group, n) not in self._by_name]
+            if unknown:
+                raise EPTestingException('%s depends on unknown tests: %s' % (task.label(), ', '.join(unknown)))
+            prerequisites.append([self._by_name[(task.group, n)] for n in task.prerequisites()])
+        dependents = [[] for _ in tasks]
+        for index, indices in enumerate(prerequisites):
+            for prerequisite in indices:
+                dependents[prerequisite].append(index)
+        priorities = critical_path_lengths(tasks, dependents)
+        # a task reading another one's sandbox depends on more than its own inputs, and a cached pass leaves no
+        # sandbox to read, so neither side of such a pair is ever served from the result cache
+        self._uncached = set()
+        for index, task in enumerate(tasks):
+            referenced = WORKDIR_REFERENCE.findall(json.dumps(task.kwargs, default=str))
+            if referenced:
+                self._uncached.add(index)
+                self._uncached.update(self._by_name[(task.group, n)] for n in referenced)
+        self._working_dirs = {}
+
+        print('Running %i tests on %i workers, sandbox root: %s' % (len(tasks), self.jobs, self.sandbox_root))
+        results: List[Optional[TestResult]] = [None] * len(tasks)
+        waiting_on = [len(indices) for indices in prerequisites]
+        ready = [(-priorities[i], i) for i in range(len(tasks)) if not waiting_on[i]]
+        heapq.heapify(ready)
+        # every scheduling decision is made on this thread, as the futures complete; completion callbacks would run
+        # on whichever thread finished the task, or right away on this one if it finished before they were attached
+        running: Dict[Future, int] = {}
+        reported = 0
+
+        def skip(index: int, reason: str) -> None:
+            if results[index] is not None:
+                return
+            result = TestResult(tasks[index], '')
+            result.skipped = True
+            result.error = EPTestingException(reason)
+            result.output = '* Test "%s" not run, %s [SKIPPED]\n' % (tasks[index].label(), reason)
+            results[index] = result
+            for dependent in dependents[index]:
+                skip(dependent, 'prerequisite %s was skipped' % tasks[index].label())
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while True:
+                # the pool itself would start tasks first come first served
+                while ready and len(running) < self.jobs:
+                    _, index = heapq.heappop(ready)
+                    running[executor.submit(self._run_task, index, tasks[index])] = index
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = TestResult(tasks[index], self._working_dirs.get(index, ''))
+                        result.error = e
+                        result.error_details = traceback.format_exc()
+                    results[index] = result
+                    for dependent in dependents[index]:
+                        if not result.passed:
+                            skip(dependent, 'prerequisite %s did not pass' % tasks[index].label())
+                            continue
+                        waiting_on[dependent] -= 1
+                        if not waiting_on[dependent] and results[dependent] is None:
+                            heapq.heappush(ready, (-priorities[dependent], dependent))
+                while reported < len(tasks) and results[reported] is not None:
+                    self._report(results[reported])
+                    reported += 1
+        return results
+
+    def _sandbox_for(self, index: int, task: TestTask) -> str:
+        working_dir = os.path.join(self.sandbox_root, '%03i_%s' % (index, task.test.__class__.__name__))
+        os.makedirs(working_dir)
+        self._working_dirs[index] = working_dir
+        return working_dir
+
+    def _resolve_working_dirs(self, task: TestTask, value):
+        """The kwargs value with every ${workdir:<name>} replaced by the sandbox of that task"""
+        if isinstance(value, str):
+            return WORKDIR_REFERENCE.sub(
+                lambda m: self._working_dirs[self._by_name[(task.group, m.group(1))]].replace('\\', '/'), value
+            )
+        if isinstance(value, list):
+            return [self._resolve_working_dirs(task, v) for v in value]
+        if isinstance(value, dict):
+            return {k: self._resolve_working_dirs(task, v) for k, v in value.items()}
+        return value
+
+    def _run_task(self, index: int, task: TestTask) -> TestResult:
+        result = TestResult(task, self._sandbox_for(index, task))
+        buffer = io.StringIO()
+        task.test.working_dir = result.working_dir
+        task.test.output = buffer
+        task.test.verbose = self.verbose
+        task.test.result_cache = self.result_cache
+        task.test.instrumentation.context = task.label()
+        install_path = task.install_path if task.install_path else self.install_path
+        start = time.time()
+        timeout = task.timeout if task.timeout else self.timeout
+        task.test.deadline = start + timeout if timeout else None
+        # the cache key is taken on the kwargs as written, so it does not change with the sandbox location
+        kwargs = self._resolve_working_dirs(task, task.kwargs)
+        try:
+            # on a lazily extracted install the members the test needs are only unpacked now, before anything hashes
+            # or runs them
+            ensure_install_paths(install_path, task.test.input_paths(kwargs))
+        except Exception as e:
+            result.error = e
+            result.error_details = traceback.format_exc()
+            result.output = buffer.getvalue()
+            return result
+        cache_key = None
+        try:
+            if self.result_cache and task.test.cacheable and index not in self._uncached:
+                cache_key = self.result_cache.key(task.test, task.kwargs, install_path)
+                cached = None if self.force else self.result_cache.lookup(cache_key)
+                if cached is not None:
+                    result.passed = result.cached = True
+                    result.output = '* Test "%s" passed on an earlier run with identical inputs [CACHED PASS]\n' % (
+                        task.label()
+                    )
+                    return result
+        except Exception as e:
+            # a broken cache should never stop the test itself from running
+            print('Result cache lookup failed for %s: %s' % (task.label(), str(e)), file=buffer)
+            cache_key = None
+        try:
+            with task.test.phase('total'):
+                if task.test.mutates_install:
+                    # tests writing into the install each get their own view of it, so they can still run concurrently
+                    with task.test.phase('overlay'):
+                        overlay = InstallOverlay(install_path, os.path.join(result.working_dir, 'install'))
+                        for writable_path in task.test.writable_paths(kwargs):
+                            overlay.writable(writable_path)
+                    task.test.run(overlay.root, self.verbose, kwargs)
+                else:
+                    task.test.run(install_path, self.verbose, kwargs)
+            result.passed = True
+            if cache_key is not None:
+                self.result_cache.store(cache_key, task.label(), time.time() - start)
+        except Exception as e:
+            result.error = e
+            result.error_details = traceback.format_exc()
+        result.duration = time.time() - start
+        result.output = buffer.getvalue()
+        result.phases = task.test.instrumentation.records
+        result.child_usage = task.test.child_usage
+        return result
+
+    def _report(self, result: TestResult) -> None:
+        print(result.output, end='')
+        if result.passed or result.skipped:
+            return
+        # most tests print partial lines as they go, so make sure the failure starts on its own line
+        if result.output and not result.output.endswith('\n'):
+            print()
+        print(' [FAILED] %s: %s' % (result.task.label(), str(result.error)))
+        if self.verbose:
+            print(result.error_details)
+
+
+def format_summary(results: List[TestResult]) -> str:
+    """A plain text table of every result, in the order the tests were scheduled, with the cost of their children"""
+    rows = []
+    for r in results:
+        child_cpu = r.child_cpu_time()
+        child_rss = r.child_max_rss_kb()
+        rows.append((
+            r.task.label(), 'CACHED' if r.cached else 'PASS' if r.passed else 'SKIP' if r.skipped else 'FAIL',
+            '%.1fs' % r.duration,
+            '%.1fs' % child_cpu if child_cpu is not None else '-',
+            '%i MB' % (child_rss // 1024) if child_rss is not None else '-',
+        ))
+    width = max([len(row[0]) for row in rows] + [len('Test')])
+    lines = ['%-*s  %-6s  %8s  %9s  %9s' % (width, 'Test', 'Result', 'Duration', 'Child CPU', 'Child RSS')]
+    lines.extend('%-*s  %-6s  %8s  %9s  %9s' % ((width,) + row) for row in rows)
+    passed = sum(1 for r in results if r.passed)
+    cached = sum(1 for r in results if r.cached)
+    skipped = sum(1 for r in results if r.skipped)
+    notes = ['%i cached' % cached] if cached else []
+    if skipped:
+        notes.append('%i skipped' % skipped)
+    lines.append('%i of %i tests passed' % (passed, len(results)) + (' (%s)' % ', '.join(notes) if notes else ''))
+    return '\n'.join(lines)
+
+
+def critical_path_lengths(tasks: List[TestTask], dependents: List[List[int]]) -> List[float]:
+    """Estimated duration of each task plus that of the longest chain of tasks waiting on it; a task without an
+    estimate counts for one second"""
+    remaining = [0] * len(tasks)
+    for indices in dependents:
+        for dependent in indices:
+            remaining[dependent] += 1
+    order = [i for i in range(len(tasks)) if not remaining[i]]
+    for index in order:
+        for dependent in dependents[index]:
+            remaining[dependent] -= 1
+            if not remaining[dependent]:
+                order.append(dependent)
+    if len(order) < len(tasks):
+        cycle = [tasks[i].label() for i in range(len(tasks)) if remaining[i]]
+        raise EPTestingException('Test dependencies form a cycle between: %s' % ', '.join(cycle))
+    lengths = [0.0] * len(tasks)
+    for index in reversed(order):
+        estimate = tasks[index].estimate if tasks[index].estimate is not None else 1.0
+        lengths[index] = estimate + max([lengths[d] for d in dependents[index]], default=0.0)
+    return lengths
@@ -0,0 +1,188 @@
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from ep_testing.archive import ensure_install_paths
+from ep_testing.cache import unique_temp_path
+from ep_testing.exceptions import EPTestingException
+from ep_testing.scheduler import format_summary, Scheduler, TestResult, TestTask
+from ep_testing.tests.energyplus import TestPlainDDRunEPlusFile
+
+
+# ExampleFiles that cannot run from a plain `energyplus` call, by the first object type giving them away: the
+# ParametricPreprocessor is not run by the energyplus command line at all, and ExternalInterface files (BCVTB, FMU
+# import and export) co-simulate with an external program that is not part of the install
+EXCLUDED_OBJECTS = {
+    'parametric:': 'needs the ParametricPreprocessor',
+    'externalinterface': 'co-simulates with an external program (ExternalInterface)',
+}
+# files with these objects run fine, but only once ExpandObjects (and the Slab / Basement preprocessors it calls for
+# ground heat transfer) expanded them, which is what `energyplus -x` does
+EXPANDED_OBJECTS = ('hvactemplate:', 'groundheattransfer:')
+
+# an object type at the start of a line, so commented out objects do not count
+OBJECT_TYPE = re.compile(
+    r'^[ \t]*(%s)' % '|'.join(re.escape(o) for o in list(EXCLUDED_OBJECTS) + list(EXPANDED_OBJECTS)),
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+def idf_requirements(idf_path: str) -> Tuple[bool, Optional[str]]:
+    """Whether the file needs ExpandObjects, and why it cannot be simulated by the sweep at all, if it cannot"""
+    with open(idf_path, encoding='utf-8', errors='replace') as f:
+        found = set(m.lower() for m in OBJECT_TYPE.findall(f.read()))
+    for object_type, reason in EXCLUDED_OBJECTS.items():
+        if object_type in found:
+            return False, reason
+    return any(o in found for o in EXPANDED_OBJECTS), None
+
+
+def discover_idfs(install_root: str) -> List[str]:
+    ensure_install_paths(install_root, ['ExampleFiles'])
+    example_dir = os.path.join(install_root, 'ExampleFiles')
+    if not os.path.isdir(example_dir):
+        raise EPTestingException('Could not find ExampleFiles directory at ' + example_dir)
+    return sorted(f.name for f in os.scandir(example_dir) if f.is_file() and f.name.lower().endswith('.idf'))
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """Parses a 1-based `i/N` shard specification into a (0-based index, count) pair"""
+    try:
+        index, count = (int(x) for x in shard.split('/'))
+    except ValueError:
+        raise EPTestingException('Shard must look like i/N, got "%s"' % shard)
+    if count < 1 or not 1 <= index <= count:
+        raise EPTestingException('Shard index must be between 1 and N, got "%s"' % shard)
+    return index - 1, count
+
+
+def select_shard(files: List[str], index: int, count: int) -> List[str]:
+    """Round robin over the sorted names, so every node computes the same split from the same installer"""
+    return sorted(files)[index::count]
+
+
+class DurationHistory:
+    """The last recorded run time of each file, used to start the longest simulations first"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.durations = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.durations = json.load(f)
+            except ValueError:
+                self.durations = {}
+
+    def order(self, files: List[str]) -> List[str]:
+        # files never seen before go first, they might be long and there is nothing to lose by starting them early
+        return sorted(files, key=lambda f: (f in self.durations, -self.durations.get(f, 0.0), f))
+
+    def update(self, results: List[TestResult]) -> None:
+        for result in results:
+            if result.passed:
+                self.durations[result.task.kwargs['test_file']] = result.duration
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = unique_temp_path(self.path)
+        with open(temp_path, 'w') as f:
+            json.dump(self.durations, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+class Sweep:
+    """Runs every IDF in the install's ExampleFiles (or one shard of them) through EnergyPlus
+
+    The runs go through the regular scheduler, longest recorded duration first so the pool does not end on a long
+    tail, and each shard writes its own json report that `merge_reports` combines into one.  Files needing
+    ExpandObjects are run with `-x`, and files that cannot run on their own (see EXCLUDED_OBJECTS) are reported as
+    excluded instead of failing."""
+
+    def __init__(self, install_root: str, verbose: bool, jobs: int = None, shard: Tuple[int, int] = (0, 1),
+                 history_path: str = None, timeout: float = None):
+        self.install_root = install_root
+        self.timeout = timeout
+        self.verbose = verbose
+        self.jobs = jobs
+        self.shard = shard
+        self.history = DurationHistory(history_path) if history_path else None
+        # files of this shard left out, with the reason
+        self.excluded: Dict[str, str] = {}
+        self._needs_expansion = set()
+
+    def files(self) -> List[str]:
+        files = []
+        self.excluded = {}
+        for f in select_shard(discover_idfs(self.install_root), *self.shard):
+            needs_expansion, reason = idf_requirements(os.path.join(self.install_root, 'ExampleFiles', f))
+            if reason:
+                self.excluded[f] = reason
+                continue
+            if needs_expansion:
+                self._needs_expansion.add(f)
+            files.append(f)
+        if self.history:
+            files = self.history.order(files)
+        return files
+
+    def run(self) -> List[TestResult]:
+        files = self.files()
+        print('Sweeping %i ExampleFiles (shard %i/%i), %i excluded' % (
+            len(files), self.shard[0] + 1, self.shard[1], len(self.excluded)
+        ))
+        for f, reason in sorted(self.excluded.items()):
+            print('  excluded %s: %s' % (f, reason))
+        tasks = [
+            TestTask(TestPlainDDRunEPlusFile(), dict(
+                {'test_file': f}, **({'eplus_args': ['-D', '-x']} if f in self._needs_expansion else {})
+            )) for f in files
+        ]
+        results = Scheduler(self.install_root, self.verbose, self.jobs, timeout=self.timeout).run(tasks)
+        print(format_summary(results))
+        if self.history:
+            self.history.update(results)
+        return results
+
+    def write_report(self, report_dir: str, results: List[TestResult]) -> str:
+        os.makedirs(report_dir, exist_ok=True)
+        report_path = os.path.join(report_dir, 'ep_testing_sweep_%i_of_%i.json' % (self.shard[0] + 1, self.shard[1]))
+        with open(report_path, 'w') as f:
+            json.dump({
+                'install_root': self.install_root,
+                'shard': [self.shard[0] + 1, self.shard[1]],
+                'results': [
+                    {
+                        'test_file': r.task.kwargs['test_file'], 'passed': r.passed, 'duration': r.duration,
+                        'error': str(r.error) if r.error else None,
+                    } for r in results
+                ],
+                'excluded': self.excluded,
+            }, f, indent=2)
+        return report_path
+
+
+def merge_reports(report_paths: List[str]) -> dict:
+    """Combines shard reports into one, sorted by file name, and complains about missing or overlapping shards"""
+    merged = {}
+    excluded = {}
+    shards = set()
+    count = None
+    for path in report_paths:
+        with open(path) as f:
+            report = json.load(f)
+        shards.add(report['shard'][0])
+        count = report['shard'][1]
+        for result in report['results']:
+            if result['test_file'] in merged:
+                raise EPTestingException('File %s appears in more than one shard report' % result['test_file'])
+            merged[result['test_file']] = result
+        excluded.update(report.get('excluded', {}))
+    missing = sorted(set(range(1, count + 1)) - shards) if count else []
+    results = [merged[name] for name in sorted(merged)]
+    return {
+        'missing_shards': missing,
+        'total': len(results),
+        'passed': sum(1 for r in results if r['passed']),
+        'results': results,
+        'excluded': dict(sorted(excluded.items())),
+    }
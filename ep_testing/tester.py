@@ -1,64 +1,67 @@
-import os
-from tempfile import mkdtemp
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 
-from ep_testing.config import TestConfiguration, OS
-from ep_testing.tests.api import TestPythonAPIAccess, TestCAPIAccess, TestCppAPIDelayedAccess
-from ep_testing.tests.energyplus import TestPlainDDRunEPlusFile
-from ep_testing.tests.expand_objects import TestExpandObjectsAndRun
-from ep_testing.tests.transition import TransitionOldFile
+from ep_testing.cache import ResultCache
+from ep_testing.config import TestConfiguration
+from ep_testing.exceptions import EPTestingException
+from ep_testing.history import ResultsStore
+from ep_testing.idf_mirror import IdfMirror
+from ep_testing.instrumentation import write_child_usage_report, write_phase_report
+from ep_testing.plan import TestPlan
+from ep_testing.scheduler import default_job_count, format_summary, Scheduler, TestTask
 
 
 class Tester:
 
-    def __init__(self, config: TestConfiguration, install_path: str, verbose: bool):
+    def __init__(self, config: TestConfiguration, install_path: str, verbose: bool, jobs: int = None,
+                 prior_phases: List[dict] = None, force: bool = False, asset: dict = None):
         self.install_path = install_path
         self.config = config
         self.verbose = verbose
+        self.jobs = jobs
+        self.force = force
+        # phase records from before the tests, such as the download, so they end up in the same report
+        self.prior_phases = prior_phases if prior_phases else []
+        # what was tested, recorded with the results in the results store
+        self.asset = asset
 
-    def run(self):
-        saved_path = os.getcwd()
-        temp_dir = mkdtemp()
-        print('Creating sandbox dir and changing to it: ' + temp_dir)
-        os.chdir(temp_dir)
-        TestPlainDDRunEPlusFile().run(
-            self.install_path, self.verbose, {'test_file': '1ZoneUncontrolled.idf'}
-        )
-        TestPlainDDRunEPlusFile().run(
-            self.install_path, self.verbose, {'test_file': 'PythonPluginCustomOutputVariable.idf'}
-        )
-        TestExpandObjectsAndRun().run(
-            self.install_path, self.verbose, {'test_file': 'HVACTemplate-5ZoneFanCoil.idf'}
-        )
-        allow_failure = False
-        if self.config.last_version == self.config.this_version:
-            print("Last version in the same as this version, allowing "
-                  "Transition test to fail.")
-            allow_failure = True
-        TransitionOldFile().run(
-            self.install_path, self.verbose,
-            {
-                'last_version': self.config.tag_last_version,
-                'allow_failure': allow_failure
-            }
-        )
-        if self.config.os == OS.Windows:
-            print("Windows Symlink runs are not testable on Travis, I think the user needs symlink privilege.")
-        else:
-            TestPlainDDRunEPlusFile().run(
-                self.install_path, self.verbose, {'test_file': '1ZoneUncontrolled.idf', 'binary_sym_link': True}
-            )
-        TestCAPIAccess().run(
-            self.install_path, self.verbose, {'os': self.config.os, 'bitness': self.config.bitness}
-        )
-        TestCppAPIDelayedAccess().run(
-            self.install_path, self.verbose, {'os': self.config.os, 'bitness': self.config.bitness}
+    def tasks(self) -> List[TestTask]:
+        return TestPlan(self.config.test_plan_path).tasks(self.config)
+
+    def prepare(self, tasks: List[TestTask]) -> None:
+        """Everything the tasks can do before the install exists: the prior release test files are mirrored in one
+        batch, then every test's own prepare runs, concurrently"""
+        mirror = IdfMirror(self.config.idf_mirror_dir, self.config.tag_last_version)
+        downloaded = mirror.populate(self.config.transition_files)
+        if downloaded:
+            print('Mirrored %i test files from %s' % (downloaded, self.config.tag_last_version))
+        with ThreadPoolExecutor(max_workers=self.jobs if self.jobs else default_job_count()) as executor:
+            # list() so the first failure is raised here
+            list(executor.map(lambda task: task.test.prepare(task.kwargs), tasks))
+
+    def run(self, tasks: List[TestTask] = None):
+        """Runs the given tasks, already prepared, or else prepares and runs the full list from tasks()"""
+        if tasks is None:
+            tasks = self.tasks()
+            self.prepare(tasks)
+        result_cache = None
+        if self.config.use_cache:
+            result_cache = ResultCache(self.config.cache_dir, self.config.result_cache_max_entries)
+        store = ResultsStore(self.config.history_db_path)
+        store.estimate_durations(tasks, self.config.run_config_key)
+        scheduler = Scheduler(self.install_path, self.verbose, self.jobs, timeout=self.config.test_timeout,
+                              result_cache=result_cache, force=self.force)
+        results = scheduler.run(tasks)
+        if result_cache:
+            result_cache.save_file_digests()
+        print(format_summary(results))
+        write_phase_report(self.config.report_dir, self.prior_phases + [p for r in results for p in r.phases])
+        write_child_usage_report(self.config.report_dir, results)
+        store.record_run(
+            self.config.tag_this_version, self.config.run_config_key, self.asset, results
         )
-        if self.config.bitness == 'x32':
-            print("Travis does not have a 32-bit Python package readily available, so not testing Python API")
-        elif self.config.os == OS.Mac and self.config.os_version == '10.14':
-            print("E+ technically supports 10.15, but most things work on 10.14. Not Python API though, skipping that.")
-        else:
-            TestPythonAPIAccess().run(
-                self.install_path, self.verbose, {'os': self.config.os}
-            )
-        os.chdir(saved_path)
+        failures = [r for r in results if not r.passed]
+        if failures:
+            raise EPTestingException('%i of %i tests failed: %s' % (
+                len(failures), len(results), ', '.join(r.task.label() for r in failures)
+            ))
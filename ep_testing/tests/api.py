@@ -1,12 +1,22 @@
+import atexit
+from functools import lru_cache
+import hashlib
+import json
 import os
 import platform
-from subprocess import check_call, CalledProcessError, STDOUT
-from tempfile import mkdtemp, mkstemp
-from typing import List
+import shutil
+from tempfile import mkdtemp
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
 from ep_testing.config import OS
 from ep_testing.exceptions import EPTestingException
-from ep_testing.tests.base import BaseTest
+from ep_testing.process import profiler_wrapper, ProcessResult, shared_runner
+from ep_testing.tests.base import BaseTest, example_file_paths, RUNTIME_PATHS
+
+
+BUILD_STAMP_FILE = 'ep_testing_build.json'
 
 
 def api_resource_dir() -> str:
@@ -16,12 +26,136 @@ def api_resource_dir() -> str:
     return templates_dir
 
 
-def my_check_call(verbose: bool, command_line: List[str], **kwargs) -> None:
-    if verbose:
-        check_call(command_line, **kwargs)
-    else:
-        with open(os.devnull, 'w') as dev_null:
-            check_call(command_line, stdout=dev_null, stderr=STDOUT, **kwargs)
+def python_interpreter() -> str:
+    if platform.system() == 'Linux':
+        return 'python3'
+    elif platform.system() == 'Darwin':
+        return '/usr/local/bin/python3'
+    else:  # windows
+        return 'C:\\Python36\\Python.exe'
+
+
+class PythonApiWorker:
+    """A python process that imports pyenergyplus once and then runs any number of API scripts sent over a pipe
+
+    Each script runs in a new EnergyPlus state inside the worker, see api_templates/python_worker.py for the protocol.
+    Scripts are run one at a time; the worker's own stderr, including anything EnergyPlus prints, goes to a log file.
+    The worker is a child of the shared process runner, so it gets the same process group cleanup, usage record and
+    profiler wrapping as any other child.  A script that does not answer within its timeout gets the worker killed,
+    and the next test starts a new one."""
+
+    Start_timeout = 300
+
+    def __init__(self, install_root: str, this_os: int):
+        self.install_root = install_root
+        self.work_dir = mkdtemp(prefix='ep_python_worker_')
+        self.log_path = os.path.join(self.work_dir, 'worker.log')
+        script_path = os.path.join(self.work_dir, 'python_worker.py')
+        escaped_root = install_root if platform.system() in ['Linux', 'Darwin'] else install_root.replace('\\', '\\\\')
+        with open(os.path.join(api_resource_dir(), 'python_worker.py')) as f:
+            template = f.read()
+        with open(script_path, 'w') as f:
+            f.write(template.replace('{EPLUS_INSTALL_NO_SLASH}', escaped_root))
+        my_env = os.environ.copy()
+        if this_os == OS.Windows:  # my local comp didn't have cmake in path except in interact shells
+            my_env["PATH"] = install_root + ";" + my_env["PATH"]
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.command_line = [python_interpreter(), script_path]
+        self.wrapped_command_line = profiler_wrapper(self.command_line, os.path.join(self.work_dir, 'python_worker'))
+        self.process = shared_runner().start(self.wrapped_command_line, self.work_dir, my_env, self.log_path)
+        self.import_time = self._read_reply(self.Start_timeout, 'import pyenergyplus')['import_time']
+
+    def alive(self) -> bool:
+        return self.process.running()
+
+    def usage_record(self, result: ProcessResult) -> dict:
+        """The child usage record of the reaped worker, in the same shape as BaseTest.run_processes makes them"""
+        record = {
+            'command': os.path.basename(self.command_line[0]), 'returncode': result.returncode,
+            'timed_out': result.timed_out, 'duration': result.duration,
+            'profiled': self.wrapped_command_line is not self.command_line,
+        }
+        record.update(result.usage if result.usage else {})
+        return record
+
+    def _read_reply(self, timeout: Optional[float], name: str) -> dict:
+        line = self.process.read_line(timeout)
+        if line is None:
+            self.process.result.timed_out = True
+            self.process.kill()
+            self.process.close()
+            raise EPTestingException('Python API worker did not answer %s within %.0fs, killed it, see %s' % (
+                name, timeout, self.log_path
+            ))
+        if not line:
+            self.process.close()
+            raise EPTestingException('Python API worker exited unexpectedly, see %s' % self.log_path)
+        return json.loads(line)
+
+    def run_script(self, source: str, name: str = '<api script>', args: dict = None, timeout: float = None) -> dict:
+        """Runs the script in a fresh state and returns the reply: ok, error, result, output and duration
+
+        Raises if the worker does not answer within the timeout, after killing and reaping it; its usage is then in
+        `self.process.result`."""
+        with self._lock:
+            self._next_id += 1
+            request = {'id': self._next_id, 'name': name, 'script': source, 'args': args if args else {}}
+            self.process.write_line(json.dumps(request), timeout)
+            return self._read_reply(timeout, name)
+
+    def close(self) -> ProcessResult:
+        return self.process.close(timeout=30)
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def shared_python_worker(install_root: str, this_os: int) -> PythonApiWorker:
+    """One worker per install for the whole run, shared by every Python API test and closed at exit"""
+    with _workers_lock:
+        worker = _workers.get(install_root)
+        if worker is None or not worker.alive():
+            worker = _workers[install_root] = PythonApiWorker(install_root, this_os)
+        return worker
+
+
+@atexit.register
+def _close_python_workers() -> None:
+    for worker in _workers.values():
+        if worker.alive():
+            worker.close()
+
+
+def run_worker_script(test: BaseTest, worker: PythonApiWorker, template_name: str, args: dict = None) -> dict:
+    """Runs an API script in the shared worker within the test's remaining time, and records what it cost
+
+    The worker outlives the test, so the record of a script is its share as the worker reports it; a worker killed
+    for missing the deadline is reaped on the spot and its full usage goes to the test that was waiting on it."""
+    timeout = None
+    if test.deadline is not None:
+        timeout = test.deadline - time.time()
+        if timeout <= 0:
+            raise EPTestingException('Test ran out of time before running %s' % template_name)
+    try:
+        reply = worker.run_script(api_script(template_name), template_name, args, timeout)
+    except EPTestingException:
+        if not worker.alive():
+            test.child_usage.append(worker.usage_record(worker.process.result))
+        raise
+    record = {
+        'command': '%s (worker): %s' % (os.path.basename(worker.command_line[0]), template_name),
+        'returncode': 0 if reply['ok'] else 1, 'timed_out': False, 'duration': reply['duration'],
+    }
+    record.update(reply.get('usage') or {})
+    test.child_usage.append(record)
+    return reply
+
+
+def api_script(template_name: str) -> str:
+    with open(os.path.join(api_resource_dir(), template_name)) as f:
+        return f.read()
 
 
 class TestPythonAPIAccess(BaseTest):
@@ -33,65 +167,177 @@ class TestPythonAPIAccess(BaseTest):
     def name(self):
         return 'Test running an API script against pyenergyplus'
 
-    @staticmethod
-    def _api_script_content(install_root: str) -> str:
-        if platform.system() in ['Linux', 'Darwin']:
-            pass
-        else:  # windows
-            install_root = install_root.replace('\\', '\\\\')
-        template_file = os.path.join(api_resource_dir(), 'python_link.py')
-        template = open(template_file).read()
-        return template % install_root
+    def input_paths(self, kwargs: dict) -> List[str]:
+        return RUNTIME_PATHS
 
     def run(self, install_root: str, verbose: bool, kwargs: dict):
         self.verbose = verbose
-        print('* Running test class "%s"... ' % self.__class__.__name__, end='')
+        self._print('* Running test class "%s"... ' % self.__class__.__name__, end='')
         if 'os' not in kwargs:
             raise EPTestingException('Bad call to %s -- must pass os in kwargs' % self.__class__.__name__)
         self.os = kwargs['os']
-        handle, python_file_path = mkstemp(suffix='.py')
-        with os.fdopen(handle, 'w') as f:
-            f.write(self._api_script_content(install_root))
-        print(' [FILE WRITTEN] ', end='')
-        try:
-            if platform.system() == 'Linux':
-                py = 'python3'
-            elif platform.system() == 'Darwin':
-                py = '/usr/local/bin/python3'
-            else:  # windows
-                py = 'C:\\Python36\\Python.exe'
-            my_env = os.environ.copy()
-            if self.os == OS.Windows:  # my local comp didn't have cmake in path except in interact shells
-                my_env["PATH"] = install_root + ";" + my_env["PATH"]
-            my_check_call(self.verbose, [py, python_file_path], env=my_env)
-            print(' [DONE]!')
-        except CalledProcessError:
-            raise EPTestingException('Python API Wrapper Script failed!')
-
-
-def make_build_dir_and_build(cmake_build_dir: str, verbose: bool, this_os: int, bitness: str):
+        with self.phase('worker start'):
+            worker = shared_python_worker(install_root, self.os)
+        self._print(' [WORKER READY, imported in %.1fs] ' % worker.import_time, end='')
+        for template_name in kwargs.get('scripts', ['python_link.py']):
+            with self.phase('execute'):
+                reply = run_worker_script(self, worker, template_name)
+            if self.verbose or not reply['ok']:
+                self._print(reply['output'], end='')
+            if not reply['ok']:
+                self._print(reply['error'])
+                raise EPTestingException('Python API Wrapper Script failed!')
+        self._print(' [DONE]!')
+
+
+class TestPythonAPIThroughput(BaseTest):
+
+    cacheable = False
+
+    def __init__(self):
+        super().__init__()
+        self.os = None
+        self.metrics = {}
+
+    def name(self):
+        return 'Measure call rate and latency of pyenergyplus functional routines and runtime callbacks'
+
+    def input_paths(self, kwargs: dict) -> List[str]:
+        return RUNTIME_PATHS + example_file_paths(kwargs.get('test_file', '1ZoneUncontrolled.idf'))
+
+    def run(self, install_root: str, verbose: bool, kwargs: dict):
+        self.verbose = verbose
+        self._print('* Running test class "%s"... ' % self.__class__.__name__, end='')
+        if 'os' not in kwargs:
+            raise EPTestingException('Bad call to %s -- must pass os in kwargs' % self.__class__.__name__)
+        self.os = kwargs['os']
+        with self.phase('worker start'):
+            worker = shared_python_worker(install_root, self.os)
+        output_dir = os.path.join(self.working_dir, 'simulation')
+        args = {
+            'calls': kwargs.get('calls', 5000),
+            'calls_per_callback': kwargs.get('calls_per_callback', 10),
+            'idf_path': os.path.join(install_root, 'ExampleFiles', kwargs.get('test_file', '1ZoneUncontrolled.idf')),
+            'output_dir': output_dir,
+        }
+        with self.phase('execute'):
+            reply = run_worker_script(self, worker, 'python_api_benchmark.py', args)
+        if not reply['ok']:
+            self._print(reply['output'], end='')
+            self._print(reply['error'])
+            raise EPTestingException('Python API benchmark script failed!')
+        self.metrics = reply['result']
+        self.metrics['worker_import_time'] = worker.import_time
+        self._print(' [MEASURED] [DONE]!')
+        self._print(self.summary_table())
+        if 'report_dir' in kwargs:
+            os.makedirs(kwargs['report_dir'], exist_ok=True)
+            with open(os.path.join(kwargs['report_dir'], 'ep_testing_api_throughput.json'), 'w') as f:
+                json.dump({'install_root': install_root, 'args': args, 'metrics': self.metrics}, f, indent=2)
+
+    def summary_table(self) -> str:
+        routines = [k for k, v in self.metrics.items() if isinstance(v, dict)]
+        width = max([len(r) for r in routines] + [len('Routine')])
+        lines = ['%-*s  %8s  %10s  %9s  %9s  %9s  %9s' % (
+            width, 'Routine', 'Calls', 'Calls/s', 'p50 [us]', 'p90 [us]', 'p99 [us]', 'Max [us]'
+        )]
+        for routine in routines:
+            m = self.metrics[routine]
+            lines.append('%-*s  %8i  %10.0f  %9.2f  %9.2f  %9.2f  %9.2f' % (
+                width, routine, m['calls'], m['calls_per_second'] or 0.0, m['p50_us'], m['p90_us'], m['p99_us'],
+                m['max_us']
+            ))
+        return '\n'.join(lines)
+
+
+def make_build_dir_and_build(test: BaseTest, cmake_build_dir: str, compiler_cache: bool = False) -> Tuple[float, float]:
+    """Configures and builds the CMake project one level up from cmake_build_dir, returns configure and build times"""
+    os.makedirs(cmake_build_dir)
+    my_env = os.environ.copy()
+    if test.os == OS.Mac:  # my local comp didn't have cmake in path except in interact shells
+        my_env["PATH"] = "/usr/local/bin:" + my_env["PATH"]
+    command_line = ['cmake', '..']
+    if test.os == OS.Windows:
+        if test.bitness == 'x64':
+            command_line.extend(['-G', 'Visual Studio 15 Win64'])
+        elif test.bitness == 'x32':
+            command_line.extend(['-G', 'Visual Studio 15'])  # defaults to 32
+        else:
+            raise EPTestingException('Bad bitness sent to make_build_dir_and_build')
+    elif compiler_cache and shutil.which('ccache'):
+        command_line.extend(['-DCMAKE_C_COMPILER_LAUNCHER=ccache', '-DCMAKE_CXX_COMPILER_LAUNCHER=ccache'])
+    with test.phase('cmake configure'):
+        result = test.run_process(command_line, cwd=cmake_build_dir, env=my_env)
+    result.check('C API Wrapper CMake configuration failed!', test.output)
+    test._print(' [CONFIGURED in %.1fs] ' % result.duration, end='')
+    command_line = ['cmake', '--build', '.']
+    if platform.system() == 'Windows':
+        command_line.extend(['--config', 'Release'])
+    with test.phase('compile'):
+        build_result = test.run_process(command_line, cwd=cmake_build_dir, env=my_env)
+    build_result.check('C API Wrapper Compilation Failed!', test.output)
+    test._print(' [COMPILED in %.1fs] ' % build_result.duration, end='')
+    return result.duration, build_result.duration
+
+
+@lru_cache(maxsize=None)
+def toolchain_fingerprint() -> str:
+    """Identifies the CMake version and the compilers it would pick up, so a toolchain change invalidates builds"""
+    parts = [platform.system(), platform.machine()]
     try:
-        os.makedirs(cmake_build_dir)
-        my_env = os.environ.copy()
-        if this_os == OS.Mac:  # my local comp didn't have cmake in path except in interact shells
-            my_env["PATH"] = "/usr/local/bin:" + my_env["PATH"]
-        command_line = ['cmake', '..']
-        if this_os == OS.Windows:
-            if bitness == 'x64':
-                command_line.extend(['-G', 'Visual Studio 15 Win64'])
-            elif bitness == 'x32':
-                command_line.extend(['-G', 'Visual Studio 15'])  # defaults to 32
-            else:
-                raise EPTestingException('Bad bitness sent to make_build_dir_and_build')
-        my_check_call(verbose, command_line, cwd=cmake_build_dir, env=my_env)
-        command_line = ['cmake', '--build', '.']
-        if platform.system() == 'Windows':
-            command_line.extend(['--config', 'Release'])
-        my_check_call(verbose, command_line, env=my_env, cwd=cmake_build_dir)
-        print(' [COMPILED] ', end='')
-    except CalledProcessError:
-        print("C API Wrapper Compilation Failed!")
-        raise
+        cmake = shared_runner().run(['cmake', '--version'], timeout=60, capture=True)
+    except EPTestingException:
+        # not installed
+        cmake = None
+    parts.append(cmake.output.strip() if cmake is not None and cmake.returncode == 0 else 'no cmake')
+    for variable, default in [('CC', 'cc'), ('CXX', 'c++')]:
+        compiler = shutil.which(os.environ.get(variable, default))
+        if compiler:
+            compiler = os.path.realpath(compiler)
+            parts.append('%s=%s@%i' % (variable, compiler, int(os.path.getmtime(compiler))))
+    return '\n'.join(parts)
+
+
+def build_api_sources(test: BaseTest, sources: Dict[str, str], install_root: str, build_cache_dir: str = None,
+                      compiler_cache: bool = False) -> str:
+    """Writes the given sources into a CMake project, builds it, and returns the CMake build directory
+
+    Without a build_cache_dir this is a plain build in the test's working directory.  With one, the project lives in a
+    directory named by a hash of the sources, the install path and the toolchain, and is reused across runs: when that
+    directory already holds a finished build, configure and build are skipped entirely.  New builds happen in a
+    scratch directory that is only renamed into place once the build succeeded."""
+    if build_cache_dir is None:
+        source_dir = test.working_dir
+    else:
+        hasher = hashlib.sha256()
+        for file_name in sorted(sources):
+            hasher.update(file_name.encode('utf-8') + b'\0' + sources[file_name].encode('utf-8') + b'\0')
+        hasher.update(install_root.encode('utf-8') + b'\0')
+        hasher.update(('%s|%s|' % (test.os, test.bitness)).encode('utf-8'))
+        hasher.update(toolchain_fingerprint().encode('utf-8'))
+        final_dir = os.path.join(build_cache_dir, hasher.hexdigest()[:24])
+        if os.path.exists(os.path.join(final_dir, 'build', BUILD_STAMP_FILE)):
+            test._print(' [BUILD CACHED] ', end='')
+            return os.path.join(final_dir, 'build')
+        os.makedirs(build_cache_dir, exist_ok=True)
+        source_dir = mkdtemp(dir=build_cache_dir, prefix='building_')
+    with test.phase('file write'):
+        for file_name, content in sources.items():
+            with open(os.path.join(source_dir, file_name), 'w') as f:
+                f.write(content)
+    test._print(' [SOURCES WRITTEN] ', end='')
+    cmake_build_dir = os.path.join(source_dir, 'build')
+    configure_time, build_time = make_build_dir_and_build(test, cmake_build_dir, compiler_cache)
+    if build_cache_dir is None:
+        return cmake_build_dir
+    with open(os.path.join(cmake_build_dir, BUILD_STAMP_FILE), 'w') as f:
+        json.dump({'configure_time': configure_time, 'build_time': build_time, 'install_root': install_root}, f)
+    try:
+        os.rename(source_dir, final_dir)
+    except OSError:
+        # a concurrent run finished the identical build first, use theirs
+        shutil.rmtree(source_dir, ignore_errors=True)
+    return os.path.join(final_dir, 'build')
 
 
 class TestCAPIAccess(BaseTest):
@@ -106,6 +352,13 @@ class TestCAPIAccess(BaseTest):
     def name(self):
         return 'Test running an API script against energyplus in C'
 
+    def prepare(self, kwargs: dict) -> None:
+        # probes cmake and the compilers once, ahead of the build
+        toolchain_fingerprint()
+
+    def input_paths(self, kwargs: dict) -> List[str]:
+        return RUNTIME_PATHS + ['include']
+
     @staticmethod
     def _api_fixup_content() -> str:
         template_file = os.path.join(api_resource_dir(), 'eager_cpp_fixup.txt')
@@ -135,39 +388,28 @@ class TestCAPIAccess(BaseTest):
 
     def run(self, install_root: str, verbose: bool, kwargs: dict):
         self.verbose = verbose
-        print('* Running test class "%s"... ' % self.__class__.__name__, end='')
+        self._print('* Running test class "%s"... ' % self.__class__.__name__, end='')
         if 'os' not in kwargs:
             raise EPTestingException('Bad call to %s -- must pass os in kwargs' % self.__class__.__name__)
         if 'bitness' not in kwargs:
             raise EPTestingException('Bad call to %s -- must pass bitness in kwargs' % self.__class__.__name__)
         self.os = kwargs['os']
         self.bitness = kwargs['bitness']
-        build_dir = mkdtemp()
-        c_file_name = self.source_file_name
-        c_file_path = os.path.join(build_dir, c_file_name)
-        with open(c_file_path, 'w') as f:
-            f.write(self._api_script_content())
-        print(' [SRC FILE WRITTEN] ', end='')
-        cmake_lists_path = os.path.join(build_dir, 'CMakeLists.txt')
-        with open(cmake_lists_path, 'w') as f:
-            f.write(self._api_cmakelists_content(install_root))
-        print(' [CMAKE FILE WRITTEN] ', end='')
-        fixup_cmake_path = os.path.join(build_dir, 'fixup.cmake')
-        with open(fixup_cmake_path, 'w') as f:
-            f.write(self._api_fixup_content())
-        print(' [FIXUP CMAKE WRITTEN] ', end='')
-        cmake_build_dir = os.path.join(build_dir, 'build')
-        make_build_dir_and_build(cmake_build_dir, self.verbose, self.os, self.bitness)
-        try:
-            new_binary_path = os.path.join(cmake_build_dir, self.target_name)
-            if self.os == OS.Windows:  # override the path/name for Windows
-                new_binary_path = os.path.join(cmake_build_dir, 'Release', self.target_name + '.exe')
-            command_line = [new_binary_path]
-            my_check_call(self.verbose, command_line, cwd=install_root)
-        except CalledProcessError:
-            print('C API Wrapper Execution failed!')
-            raise
-        print(' [DONE]!')
+        sources = {
+            self.source_file_name: self._api_script_content(),
+            'CMakeLists.txt': self._api_cmakelists_content(install_root),
+            'fixup.cmake': self._api_fixup_content(),
+        }
+        cmake_build_dir = build_api_sources(
+            self, sources, install_root, kwargs.get('build_cache_dir', None), kwargs.get('compiler_cache', False)
+        )
+        new_binary_path = os.path.join(cmake_build_dir, self.target_name)
+        if self.os == OS.Windows:  # override the path/name for Windows
+            new_binary_path = os.path.join(cmake_build_dir, 'Release', self.target_name + '.exe')
+        with self.phase('execute'):
+            result = self.run_process([new_binary_path], cwd=install_root)
+        result.check('C API Wrapper Execution failed!', self.output)
+        self._print(' [EXECUTED in %.1fs] [DONE]!' % result.duration)
 
 
 class TestCppAPIDelayedAccess(BaseTest):
@@ -182,6 +424,13 @@ class TestCppAPIDelayedAccess(BaseTest):
     def name(self):
         return 'Test running an API script against energyplus in C++ but with delayed DLL loading'
 
+    def prepare(self, kwargs: dict) -> None:
+        # probes cmake and the compilers once, ahead of the build
+        toolchain_fingerprint()
+
+    def input_paths(self, kwargs: dict) -> List[str]:
+        return RUNTIME_PATHS
+
     def _api_cmakelists_content(self) -> str:
         template_file = os.path.join(api_resource_dir(), 'delayed_cpp_cmakelists.txt')
         template = open(template_file).read()
@@ -209,28 +458,21 @@ class TestCppAPIDelayedAccess(BaseTest):
 
     def run(self, install_root: str, verbose: bool, kwargs: dict):
         self.verbose = verbose
-        print('* Running test class "%s"... ' % self.__class__.__name__, end='')
+        self._print('* Running test class "%s"... ' % self.__class__.__name__, end='')
         if 'os' not in kwargs:
             raise EPTestingException('Bad call to %s -- must pass os in kwargs' % self.__class__.__name__)
         if 'bitness' not in kwargs:
             raise EPTestingException('Bad call to %s -- must pass bitness in kwargs' % self.__class__.__name__)
         self.os = kwargs['os']
         self.bitness = kwargs['bitness']
-        build_dir = mkdtemp()
-        c_file_name = 'func.cpp'
-        c_file_path = os.path.join(build_dir, c_file_name)
-        with open(c_file_path, 'w') as f:
-            if platform.system() == 'Linux' or platform.system() == 'Darwin':
-                f.write(self._api_script_content(install_root))
-            else:
-                f.write(self._api_script_content_windows(install_root))
-        print(' [SRC FILE WRITTEN] ', end='')
-        cmake_lists_path = os.path.join(build_dir, 'CMakeLists.txt')
-        with open(cmake_lists_path, 'w') as f:
-            f.write(self._api_cmakelists_content())
-        print(' [CMAKE FILE WRITTEN] ', end='')
-        cmake_build_dir = os.path.join(build_dir, 'build')
-        make_build_dir_and_build(cmake_build_dir, self.verbose, self.os, self.bitness)
+        if platform.system() == 'Linux' or platform.system() == 'Darwin':
+            source_content = self._api_script_content(install_root)
+        else:
+            source_content = self._api_script_content_windows(install_root)
+        sources = {self.source_file_name: source_content, 'CMakeLists.txt': self._api_cmakelists_content()}
+        cmake_build_dir = build_api_sources(
+            self, sources, install_root, kwargs.get('build_cache_dir', None), kwargs.get('compiler_cache', False)
+        )
         if platform.system() == 'Windows':
             built_binary_path = os.path.join(cmake_build_dir, 'Release', 'TestCAPIAccess')
         else:
@@ -238,9 +480,7 @@ class TestCppAPIDelayedAccess(BaseTest):
         my_env = os.environ.copy()
         if self.os == OS.Windows:  # my local comp didn't have cmake in path except in interact shells
             my_env["PATH"] = install_root + ";" + my_env["PATH"]
-        try:
-            my_check_call(self.verbose, [built_binary_path], env=my_env)
-        except CalledProcessError:
-            print("Delayed C API Wrapper execution failed")
-            raise
-        print(' [DONE]!')
+        with self.phase('execute'):
+            result = self.run_process([built_binary_path], env=my_env)
+        result.check('Delayed C API Wrapper execution failed', self.output)
+        self._print(' [EXECUTED in %.1fs] [DONE]!' % result.duration)
@@ -0,0 +1,57 @@
+# run by python_worker.py, which provides `api`, a fresh `state` and `args`; reports through `result`
+import time
+
+
+def latencies(samples):
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        'calls': len(ordered), 'calls_per_second': len(ordered) / total if total > 0 else None,
+        'p50_us': 1e6 * ordered[len(ordered) // 2], 'p90_us': 1e6 * ordered[int(len(ordered) * 0.9)],
+        'p99_us': 1e6 * ordered[int(len(ordered) * 0.99)], 'max_us': 1e6 * ordered[-1],
+    }
+
+
+calls = args['calls']  # noqa: F821
+glycol = api.functional.glycol(state, u"water")  # noqa: F821
+routines = {
+    'glycol.specific_heat': glycol.specific_heat,
+    'glycol.density': glycol.density,
+    'glycol.conductivity': glycol.conductivity,
+    'glycol.viscosity': glycol.viscosity,
+}
+result = {}
+for label, routine in routines.items():
+    samples = []
+    for i in range(calls):
+        temperature = 5.0 + 40.0 * i / calls
+        start = time.perf_counter()
+        routine(state, temperature)  # noqa: F821
+        samples.append(time.perf_counter() - start)
+    result[label] = latencies(samples)
+
+# runtime callbacks: the gap between consecutive callbacks is simulation time, so time the whole callback and each
+# exchange call made from inside it instead
+callback_samples = []
+exchange_samples = []
+
+
+def on_timestep(callback_state):
+    start = time.perf_counter()
+    for _ in range(args['calls_per_callback']):  # noqa: F821
+        call_start = time.perf_counter()
+        api.exchange.current_environment_num(callback_state)  # noqa: F821
+        exchange_samples.append(time.perf_counter() - call_start)
+    callback_samples.append(time.perf_counter() - start)
+
+
+api.runtime.callback_begin_system_timestep_before_predictor(state, on_timestep)  # noqa: F821
+start = time.perf_counter()
+exit_code = api.runtime.run_energyplus(state, ['-D', '-d', args['output_dir'], args['idf_path']])  # noqa: F821
+result['simulation_wall_time'] = time.perf_counter() - start
+if exit_code != 0:
+    raise RuntimeError('EnergyPlus returned %i from run_energyplus' % exit_code)
+if not callback_samples:
+    raise RuntimeError('The timestep callback was never called')
+result['callback (whole)'] = latencies(callback_samples)
+result['exchange.current_environment_num'] = latencies(exchange_samples)
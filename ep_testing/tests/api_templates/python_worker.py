@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# Long running harness: imports pyenergyplus once, then runs API test scripts sent as json lines on stdin, each one
+# in a fresh state, answering with one json line per script.  Scripts see `api`, `state` and the request's `args`, and
+# can hand numbers back by assigning a dict to `result`.  Each reply also carries what the script cost the worker, where
+# the platform reports it.
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import traceback
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+sys.path.insert(0, '{EPLUS_INSTALL_NO_SLASH}')
+from pyenergyplus.api import EnergyPlusAPI  # noqa: E402
+
+# the protocol gets its own copy of stdout, and anything else written to file descriptor 1, including from inside the
+# EnergyPlus library, goes to stderr instead so it cannot corrupt the replies
+protocol = os.fdopen(os.dup(1), 'w')
+os.dup2(2, 1)
+sys.stdout = sys.stderr
+
+
+def usage_since(before) -> dict:
+    if resource is None:
+        return {}
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        'user_time': after.ru_utime - before.ru_utime,
+        'system_time': after.ru_stime - before.ru_stime,
+        # the high-water mark of the worker so far; ru_maxrss is in kilobytes on Linux but in bytes on Mac
+        'max_rss_kb': after.ru_maxrss // 1024 if sys.platform == 'darwin' else after.ru_maxrss,
+        'minor_faults': after.ru_minflt - before.ru_minflt,
+        'major_faults': after.ru_majflt - before.ru_majflt,
+        'voluntary_switches': after.ru_nvcsw - before.ru_nvcsw,
+        'involuntary_switches': after.ru_nivcsw - before.ru_nivcsw,
+    }
+
+
+start = time.perf_counter()
+api = EnergyPlusAPI()
+protocol.write(json.dumps({'ready': True, 'import_time': time.perf_counter() - start}) + '\n')
+protocol.flush()
+
+for line in sys.stdin:
+    if not line.strip():
+        continue
+    request = json.loads(line)
+    reply = {'id': request.get('id'), 'ok': True, 'error': None, 'result': None}
+    state = api.state_manager.new_state()
+    captured = io.StringIO()
+    namespace = {'api': api, 'state': state, 'args': request.get('args', {}), 'result': None}
+    start = time.perf_counter()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF) if resource else None
+    try:
+        with contextlib.redirect_stdout(captured):
+            exec(compile(request['script'], request.get('name', '<api script>'), 'exec'), namespace)
+        reply['result'] = namespace['result']
+    except BaseException:
+        reply['ok'] = False
+        reply['error'] = traceback.format_exc()
+    reply['duration'] = time.perf_counter() - start
+    reply['usage'] = usage_since(usage_before)
+    reply['output'] = captured.getvalue()
+    api.state_manager.delete_state(state)
+    protocol.write(json.dumps(reply) + '\n')
+    protocol.flush()
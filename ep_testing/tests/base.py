@@ -1,10 +1,125 @@
+import os
+import sys
+import time
+from typing import List
+
+from ep_testing.exceptions import EPTestingException
+from ep_testing.instrumentation import Instrumentation
+from ep_testing.process import profiler_wrapper, ProcessResult, shared_runner
+
+
+# install-relative patterns (see archive.path_matches) for what running energyplus or loading the API library takes:
+# the top level executables and libraries, the dictionaries, and the bundled Python used by plugins and pyenergyplus
+RUNTIME_PATHS = ['energyplus*', 'lib*', '*.dll', '*.lib', 'Energy+.*', 'pyenergyplus', 'python_standard_lib']
+
+
+def example_file_paths(test_file: str) -> List[str]:
+    """The ExampleFiles input file along with its companions of the same name, like the script of a plugin IDF"""
+    return [os.path.join('ExampleFiles', os.path.splitext(test_file)[0] + '.*')]
+
+
 class BaseTest:
 
+    # set by tests that write into the install tree; the scheduler hands those a private overlay of the install instead
+    # of the install itself, with the directories from writable_paths ready to be written into
+    mutates_install = False
+    # whether a pass can be remembered and reported as a cached pass when the inputs did not change; off for tests
+    # that measure rather than check
+    cacheable = True
+
     def __init__(self):
         self.verbose = False
+        # the scheduler points these at a private sandbox directory and an output buffer for each test, so that
+        # tests never need to change the process-wide working directory or write straight to the shared console
+        self.working_dir = os.getcwd()
+        self.output = sys.stdout
+        self.instrumentation = Instrumentation(self.__class__.__name__)
+        # wall clock time by which the whole test must be done, set by the scheduler; child processes still running
+        # then are killed
+        self.deadline = None
+        # the scheduler's result cache when the run has one, whose memo of install file digests tests can reuse
+        self.result_cache = None
+        # one record per child process: what ran, how long, and its resource usage where the platform reports it
+        self.child_usage = []
+        self._process_count = 0
 
     def name(self):
         raise NotImplementedError('name() must be overridden by derived classes')
 
     def run(self, install_root: str, verbose: bool, kwargs: dict):
         raise NotImplementedError('run() must be overridden by derived classes')
+
+    def prepare(self, kwargs: dict) -> None:
+        """Work that does not need the install, like fetching files or probing tools; runs while it downloads"""
+        pass
+
+    def input_paths(self, kwargs: dict) -> List[str]:
+        """Install-relative files, directories or patterns the test needs, '' being the whole install
+
+        These decide the cached result, and on a lazily extracted install they are all that gets extracted for it."""
+        return ['']
+
+    def writable_paths(self, kwargs: dict) -> List[str]:
+        """Install-relative directories a test that mutates the install writes into, see overlay.InstallOverlay"""
+        return []
+
+    def identity_kwargs(self, kwargs: dict) -> dict:
+        """The kwargs that tell this test apart from others of its class across runs, see history.task_identity
+
+        By default all but the absolute paths and the unset ones: those name per-run or per-machine locations, like a
+        temporary download directory or a cache that may be turned off, and not what is tested."""
+        return {k: v for k, v in kwargs.items() if v is not None and not (isinstance(v, str) and os.path.isabs(v))}
+
+    def phase(self, name: str):
+        """Context manager that records wall time, CPU time and peak RSS of the enclosed block under this name"""
+        return self.instrumentation.phase(name)
+
+    def _print(self, message: str, end: str = '\n') -> None:
+        print(message, end=end, file=self.output)
+
+    def run_process(self, command_line: List[str], cwd: str = None, env: dict = None,
+                    capture: bool = False) -> ProcessResult:
+        """Runs a child through the shared process runner, logging its output into the working directory
+
+        Callers check the result, typically with `result.check(message, self.output)`.  In verbose mode the last lines
+        of output are echoed into the test output; the full output is always in the log file."""
+        result = self.run_processes([{'command_line': command_line, 'cwd': cwd, 'env': env, 'capture': capture}])[0]
+        if self.verbose:
+            self._print('')
+            self._print(result.tail_text(), end='')
+            self._print('[output of %s in %s]' % (os.path.basename(command_line[0]), result.log_path))
+        return result
+
+    def run_processes(self, commands: List[dict], max_concurrent: int = None) -> List[ProcessResult]:
+        """Runs several children concurrently, each given as a dict of `run_process` keyword arguments
+
+        Every child gets the remaining time of the test as its timeout and a log file in the working directory, and
+        is wrapped in the profiler when chosen for it (see process.profiler_wrapper).  The results are in order."""
+        timeout = None
+        if self.deadline is not None:
+            timeout = self.deadline - time.time()
+            if timeout <= 0:
+                raise EPTestingException('Test ran out of time before starting %s' % ', '.join(
+                    os.path.basename(c['command_line'][0]) for c in commands
+                ))
+        runs = []
+        for command in commands:
+            self._process_count += 1
+            log_base = os.path.join(self.working_dir, '%02i_%s' % (
+                self._process_count, os.path.splitext(os.path.basename(command['command_line'][0]))[0]
+            ))
+            runs.append({
+                'command_line': profiler_wrapper(command['command_line'], log_base),
+                'cwd': command.get('cwd') if command.get('cwd') else self.working_dir, 'env': command.get('env'),
+                'timeout': timeout, 'log_path': log_base + '.log', 'capture': command.get('capture', False),
+            })
+        results = shared_runner().run_many(runs, max_concurrent)
+        for command, run, result in zip(commands, runs, results):
+            record = {
+                'command': os.path.basename(command['command_line'][0]), 'returncode': result.returncode,
+                'timed_out': result.timed_out, 'duration': result.duration,
+                'profiled': run['command_line'] is not command['command_line'],
+            }
+            record.update(result.usage if result.usage else {})
+            self.child_usage.append(record)
+        return results
@@ -0,0 +1,54 @@
+import os
+from typing import List
+
+from ep_testing.archive import ensure_install_paths
+from ep_testing.compare import load_outputs, OutputComparison
+from ep_testing.exceptions import EPTestingException
+from ep_testing.tests.base import BaseTest, example_file_paths, RUNTIME_PATHS
+
+
+class TestOutputsMatchLastRelease(BaseTest):
+
+    def name(self):
+        return 'Test running IDF on this and the last release and compare the reported time series'
+
+    def input_paths(self, kwargs: dict) -> List[str]:
+        return RUNTIME_PATHS + example_file_paths(kwargs.get('test_file', ''))
+
+    def run(self, install_root: str, verbose: bool, kwargs: dict):
+        for required in ('test_file', 'last_install'):
+            if required not in kwargs:
+                raise EPTestingException('Bad call to %s -- must pass %s in kwargs' % (
+                    self.__class__.__name__, required
+                ))
+        test_file = kwargs['test_file']
+        self._print('* Running test class "%s" on file "%s"... ' % (self.__class__.__name__, test_file), end='')
+        # the scheduler only takes care of this release's install
+        ensure_install_paths(kwargs['last_install'], self.input_paths(kwargs))
+        run_dirs = {}
+        commands = []
+        for version, install in (('this', install_root), ('last', kwargs['last_install'])):
+            run_dirs[version] = os.path.join(self.working_dir, version)
+            os.makedirs(run_dirs[version])
+            commands.append({
+                'command_line': [os.path.join(install, 'energyplus'), '-D',
+                                 os.path.join(install, 'ExampleFiles', test_file)],
+                'cwd': run_dirs[version],
+            })
+        # both releases simulate at the same time
+        with self.phase('execute'):
+            results = self.run_processes(commands)
+        for version, result in zip(('this', 'last'), results):
+            result.check('EnergyPlus (%s release) failed!' % version, self.output)
+        self._print(' [EXECUTED] ', end='')
+        with self.phase('compare'):
+            comparison = OutputComparison(
+                load_outputs(run_dirs['this']), load_outputs(run_dirs['last']),
+                kwargs.get('atol', 1e-3), kwargs.get('rtol', 1e-2)
+            )
+        if verbose or not comparison.passed():
+            self._print('')
+            self._print(comparison.report(kwargs.get('max_offenders', 10)))
+        if not comparison.passed():
+            raise EPTestingException('Outputs differ from the last release!')
+        self._print(' [MATCHED %i variables]!' % comparison.compared)
@@ -1,15 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
 import os
-from subprocess import check_call, CalledProcessError, STDOUT
+import threading
+from typing import List
 
+from ep_testing.cache import unique_temp_path
 from ep_testing.exceptions import EPTestingException
 from ep_testing.tests.base import BaseTest
 
 
+def first_page_command(pdf_path: str) -> List[str]:
+    # '-' sends the text to stdout, so nothing is written next to the PDF
+    return ['pdftotext', '-f', '1', '-l', '1', pdf_path, '-']
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class FirstPageCache:
+    """First page text of PDFs already seen, by PDF digest, so an unchanged manual is never converted twice"""
+
+    _lock = threading.Lock()
+
+    def __init__(self, cache_dir: str):
+        self.path = os.path.join(cache_dir, 'pdf_first_pages.json')
+        self.pages = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.pages = json.load(f)
+            except ValueError:
+                self.pages = {}
+
+    def save(self) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = unique_temp_path(self.path)
+            with open(temp_path, 'w') as f:
+                json.dump(self.pages, f)
+            os.replace(temp_path, self.path)
+
+
 class TestVersionInfoInDocumentation(BaseTest):
 
     def name(self):
         return 'Verify contents in a PDF'
 
+    def input_paths(self, kwargs: dict) -> List[str]:
+        if 'pdf_file' not in kwargs:
+            raise EPTestingException('Bad call to %s -- must pass pdf_file in kwargs' % self.__class__.__name__)
+        return [os.path.join('Documentation', kwargs['pdf_file'])]
+
     def run(self, install_root: str, verbose: bool, kwargs: dict):
         if 'pdf_file' not in kwargs:
             raise EPTestingException('Bad call to %s -- must pass pdf_file in kwargs' % self.__class__.__name__)
@@ -17,32 +64,74 @@ class TestVersionInfoInDocumentation(BaseTest):
             raise EPTestingException('Bad call to %s -- must pass version_string in kwargs' % self.__class__.__name__)
         pdf_file = kwargs['pdf_file']
         version_string = kwargs['version_string']
-        print('* Running test class "%s" on file "%s"... ' % (self.__class__.__name__, pdf_file), end='')
-        documentation_dir = os.path.join(install_root, 'Documentation')
-        saved_dir = os.getcwd()
-        os.chdir(documentation_dir)
-        original_pdf_path = os.path.join(documentation_dir, pdf_file)
-        target_pdf_path = os.path.join(documentation_dir, 'FirstPage_%s' % pdf_file)
-        dev_null = open(os.devnull, 'w')
-        try:
-            check_call(
-                ['pdftk', original_pdf_path, 'cat', '1', 'output', target_pdf_path], stdout=dev_null, stderr=STDOUT
+        self._print('* Running test class "%s" on file "%s"... ' % (self.__class__.__name__, pdf_file), end='')
+        original_pdf_path = os.path.join(install_root, 'Documentation', pdf_file)
+        with self.phase('pdf text convert'):
+            result = self.run_process(first_page_command(original_pdf_path), capture=True)
+        result.check('PdfToText Page 1 conversion failed!', self.output)
+        self._print(' [PAGE1_CONVERTED] ', end='')
+        if version_string in result.output:
+            self._print(' [FOUND VERSION STRING, DONE]!')
+        else:
+            raise EPTestingException(
+                'Did not find matching version string in PDF front page, page contents = \n%s' % result.output
             )
-            print(' [PAGE1_EXTRACTED] ', end='')
-        except CalledProcessError:
-            raise EPTestingException('PdfTk Page 1 extraction failed!')
-        target_txt_path = target_pdf_path + '.txt'
-        try:
-            check_call(['pdftotext', target_pdf_path, target_txt_path], stdout=dev_null, stderr=STDOUT)
-            print(' [PAGE1_CONVERTED] ', end='')
-        except CalledProcessError:
-            raise EPTestingException('PdfToText Page 1 conversion failed!')
-        with open(target_txt_path) as f:
-            contents = f.read()
-            if version_string in contents:
-                print(' [FOUND VERSION STRING, DONE]!')
+
+
+class TestVersionInfoInAllDocumentation(BaseTest):
+    """Checks the front page of every PDF in Documentation at once
+
+    With a first page cache, the PDFs whose digest is not in it are converted; the digests come from the result
+    cache's memo, which already has them from computing this test's key, and are otherwise hashed on a thread pool.
+    The conversions run concurrently through the process runner, page 1 only and straight to memory, and then every
+    front page is checked for the version string."""
+
+    def name(self):
+        return 'Verify the version in the front page of every documentation PDF'
+
+    def input_paths(self, kwargs: dict) -> List[str]:
+        return ['Documentation']
+
+    def run(self, install_root: str, verbose: bool, kwargs: dict):
+        if 'version_string' not in kwargs:
+            raise EPTestingException('Bad call to %s -- must pass version_string in kwargs' % self.__class__.__name__)
+        version_string = kwargs['version_string']
+        self._print('* Running test class "%s"... ' % self.__class__.__name__, end='')
+        documentation_dir = os.path.join(install_root, 'Documentation')
+        pdf_files = sorted(f.name for f in os.scandir(documentation_dir) if f.name.lower().endswith('.pdf'))
+        if not pdf_files:
+            raise EPTestingException('No PDF files found in ' + documentation_dir)
+        jobs = kwargs.get('jobs', os.cpu_count() or 1)
+        cache = FirstPageCache(kwargs['cache_dir']) if kwargs.get('cache_dir') else None
+        digests = {}
+        if cache:
+            digest = self.result_cache.file_digest if self.result_cache else file_sha256
+            with self.phase('pdf hash'), ThreadPoolExecutor(max_workers=jobs) as executor:
+                digests = dict(zip(pdf_files, executor.map(
+                    lambda f: digest(os.path.join(documentation_dir, f)), pdf_files
+                )))
+        pages = {}
+        to_convert = []
+        for pdf_file in pdf_files:
+            if cache and digests[pdf_file] in cache.pages:
+                pages[pdf_file] = cache.pages[digests[pdf_file]]
             else:
-                raise EPTestingException(
-                    'Did not find matching version string in PDF front page, page contents = \n%s' % contents
-                )
-        os.chdir(saved_dir)
+                to_convert.append(pdf_file)
+        if to_convert:
+            with self.phase('pdf text convert'):
+                results = self.run_processes([{
+                    'command_line': first_page_command(os.path.join(documentation_dir, pdf_file)), 'capture': True,
+                } for pdf_file in to_convert], max_concurrent=jobs)
+            for pdf_file, result in zip(to_convert, results):
+                result.check('PdfToText Page 1 conversion of %s failed!' % pdf_file, self.output)
+                pages[pdf_file] = result.output
+            if cache:
+                cache.pages.update((digests[f], pages[f]) for f in to_convert)
+                cache.save()
+        self._print(' [%i PAGES CONVERTED, %i CACHED] ' % (len(to_convert), len(pdf_files) - len(to_convert)), end='')
+        missing = [pdf_file for pdf_file in pdf_files if version_string not in pages[pdf_file]]
+        if missing:
+            for pdf_file in missing:
+                self._print('\n%s front page contents:\n%s' % (pdf_file, pages[pdf_file]), end='')
+            raise EPTestingException('Did not find matching version string in the front page of: ' + ', '.join(missing))
+        self._print(' [FOUND VERSION STRING IN %i PDFS, DONE]!' % len(pdf_files))
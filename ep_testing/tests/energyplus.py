@@ -1,8 +1,11 @@
 import os
-import subprocess
+from typing import List
 
+import numpy as np
+
+from ep_testing.eso import EsoReader
 from ep_testing.exceptions import EPTestingException
-from ep_testing.tests.base import BaseTest
+from ep_testing.tests.base import BaseTest, example_file_paths, RUNTIME_PATHS
 
 
 class TestPlainDDRunEPlusFile(BaseTest):
@@ -10,38 +13,62 @@ class TestPlainDDRunEPlusFile(BaseTest):
     def name(self):
         return 'Test running IDF and make sure it exits OK'
 
+    def input_paths(self, kwargs: dict) -> List[str]:
+        paths = list(RUNTIME_PATHS)
+        if '-x' in kwargs.get('eplus_args', []):
+            # ExpandObjects, and the ground heat transfer preprocessors it runs
+            paths += ['ExpandObjects*', 'PreProcess/GrndTempCalc']
+        if 'idf_path' in kwargs:
+            return paths
+        return paths + example_file_paths(kwargs.get('test_file', ''))
+
     def run(self, install_root: str, verbose: bool, kwargs: dict):
         if 'test_file' not in kwargs:
             raise EPTestingException('Bad call to %s -- must pass test_file in kwargs' % self.__class__.__name__)
         test_file = kwargs['test_file']
-        print('* Running test class "%s" on file "%s"... ' % (self.__class__.__name__, test_file), end='')
+        self._print('* Running test class "%s" on file "%s"... ' % (self.__class__.__name__, test_file), end='')
         eplus_binary = os.path.join(install_root, 'energyplus')
-        idf_path = os.path.join(install_root, 'ExampleFiles', test_file)
+        # an idf produced elsewhere, such as by an earlier test, instead of the one in the install's ExampleFiles
+        idf_path = kwargs.get('idf_path', os.path.join(install_root, 'ExampleFiles', test_file))
         if 'binary_sym_link' in kwargs:
-            eplus_binary_to_use = os.path.join(os.getcwd(), 'ep_symlink')
+            eplus_binary_to_use = os.path.join(self.working_dir, 'ep_symlink')
             if verbose:
-                print(f' [SYM-LINKED at {eplus_binary_to_use}]', end='')
+                self._print(f' [SYM-LINKED at {eplus_binary_to_use}]', end='')
             else:
-                print(' [SYM-LINKED]', end='')
+                self._print(' [SYM-LINKED]', end='')
             os.symlink(eplus_binary, eplus_binary_to_use)
         else:
             eplus_binary_to_use = eplus_binary
 
-        result = subprocess.run([eplus_binary_to_use, '-D', idf_path],
-                                # capture_output added in python 3.7 only...
-                                # capture_output=True,
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                check=False)
-        try:
-            # Throw if failed
-            result.check_returncode()
-            if verbose:
-                print("STDOUT: {}".format(result.stdout.decode('utf-8')))
-                print("STDERR: {}".format(result.stderr.decode('utf-8')))
-            print(' [DONE]!')
-        except subprocess.CalledProcessError:
-            # If it fails, I assume you'd be interested in the stdout&stderr
-            # to be able to diagnose
-            print("STDOUT: {}".format(result.stdout.decode('utf-8')))
-            print("STDERR: {}".format(result.stderr.decode('utf-8')))
-            raise EPTestingException('EnergyPlus failed!')
+        with self.phase('execute'):
+            # -D by default, or for instance ['-D', '-x'] for files that need ExpandObjects
+            result = self.run_process([eplus_binary_to_use] + kwargs.get('eplus_args', ['-D']) + [idf_path])
+        result.check('EnergyPlus failed!', self.output)
+        if 'expected_outputs' in kwargs:
+            with self.phase('check outputs'):
+                self._check_outputs(os.path.join(self.working_dir, 'eplusout.eso'), kwargs['expected_outputs'])
+            self._print(' [OUTPUTS OK]', end='')
+        self._print(' [DONE]!')
+
+    def _check_outputs(self, eso_path: str, expected_outputs: list) -> None:
+        """Each expectation names a variable, optionally its key value and frequency, and bounds on its values:
+        {'variable': 'Site Outdoor Air Drybulb Temperature', 'key_value': 'Environment', 'min': -50, 'max': 50}"""
+        if not os.path.exists(eso_path):
+            raise EPTestingException('EnergyPlus did not produce %s to check outputs in' % eso_path)
+        with EsoReader(eso_path) as reader:
+            for expected in expected_outputs:
+                keys = reader.find(expected['variable'], expected.get('key_value'), expected.get('frequency'))
+                if not keys:
+                    raise EPTestingException('Output variable "%s" was not reported' % expected['variable'])
+                for key in keys:
+                    values = reader.series(key)
+                    if len(values) == 0 or not np.all(np.isfinite(values)):
+                        raise EPTestingException('Output variable "%s" has no or non-finite values' % key)
+                    if 'min' in expected and values.min() < expected['min']:
+                        raise EPTestingException('Output variable "%s" went down to %g, expected at least %g' % (
+                            key, values.min(), expected['min']
+                        ))
+                    if 'max' in expected and values.max() > expected['max']:
+                        raise EPTestingException('Output variable "%s" went up to %g, expected at most %g' % (
+                            key, values.max(), expected['max']
+                        ))
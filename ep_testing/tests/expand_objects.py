@@ -1,25 +1,34 @@
 import os
 from shutil import copyfile
-from subprocess import check_call, CalledProcessError, STDOUT
+from typing import List
 
 from ep_testing.exceptions import EPTestingException
-from ep_testing.tests.base import BaseTest
+from ep_testing.tests.base import BaseTest, example_file_paths, RUNTIME_PATHS
 
 
-class TestExpandObjectsAndRun(BaseTest):
+class TestExpandObjects(BaseTest):
+    """Leaves the expanded file as expanded.idf in the working directory, for a later test to simulate"""
 
     def name(self):
         return 'Test running ExpandObjects on a template file and make sure it exits OK'
 
+    def input_paths(self, kwargs: dict) -> List[str]:
+        return RUNTIME_PATHS + ['ExpandObjects*'] + example_file_paths(kwargs.get('test_file', ''))
+
     def run(self, install_root: str, verbose: bool, kwargs: dict):
+        self.expand(install_root, kwargs)
+        self._print(' [DONE]!')
+
+    def expand(self, install_root: str, kwargs: dict) -> str:
         if 'test_file' not in kwargs:
             raise EPTestingException('Bad call to %s -- must pass test_file in kwargs' % self.__class__.__name__)
         test_file = kwargs['test_file']
-        print('* Running test class "%s" on file "%s"... ' % (self.__class__.__name__, test_file), end='')
+        self._print('* Running test class "%s" on file "%s"... ' % (self.__class__.__name__, test_file), end='')
         original_idf_path = os.path.join(install_root, 'ExampleFiles', test_file)
-        target_idf_path = os.path.join(os.getcwd(), 'in.idf')
+        target_idf_path = os.path.join(self.working_dir, 'in.idf')
         try:
-            copyfile(original_idf_path, target_idf_path)
+            with self.phase('file write'):
+                copyfile(original_idf_path, target_idf_path)
         except Exception as e:
             raise EPTestingException(
                 'Could not copy file for expansion, original file "%s", target file "%s", reason: %s' % (
@@ -27,23 +36,31 @@ class TestExpandObjectsAndRun(BaseTest):
                 )
             )
         expand_objects_binary = os.path.join(install_root, 'ExpandObjects')
-        dev_null = open(os.devnull, 'w')
-        try:
-            check_call([expand_objects_binary], stdout=dev_null, stderr=STDOUT)
-        except CalledProcessError:
-            raise EPTestingException('ExpandObjects failed!')
-        expanded_idf_path = os.path.join(os.getcwd(), 'expanded.idf')
+        with self.phase('expand objects'):
+            result = self.run_process([expand_objects_binary])
+        result.check('ExpandObjects failed!', self.output)
+        expanded_idf_path = os.path.join(self.working_dir, 'expanded.idf')
         if os.path.exists(expanded_idf_path):
-            print(' [EXPANDED] ', end='')
+            self._print(' [EXPANDED] ', end='')
         else:
             raise EPTestingException(
                 'ExpandObjects did not produce an expanded idf at "%s", aborting' % expanded_idf_path
             )
+        return expanded_idf_path
+
+
+class TestExpandObjectsAndRun(TestExpandObjects):
+
+    def name(self):
+        return 'Test running ExpandObjects on a template file and simulating the result'
+
+    def run(self, install_root: str, verbose: bool, kwargs: dict):
+        expanded_idf_path = self.expand(install_root, kwargs)
+        target_idf_path = os.path.join(self.working_dir, 'in.idf')
         os.remove(target_idf_path)
         copyfile(expanded_idf_path, target_idf_path)
         eplus_binary = os.path.join(install_root, 'energyplus')
-        try:
-            check_call([eplus_binary, '-D', target_idf_path], stdout=dev_null, stderr=STDOUT)
-            print(' [DONE]!')
-        except CalledProcessError:
-            raise EPTestingException('EnergyPlus failed!')
+        with self.phase('execute'):
+            result = self.run_process([eplus_binary, '-D', target_idf_path])
+        result.check('EnergyPlus failed!', self.output)
+        self._print(' [DONE]!')
@@ -1,94 +1,128 @@
 import os
-import subprocess
-import urllib.request
+import re
+import shutil
+from typing import List, Tuple
 
 from ep_testing.exceptions import EPTestingException
-from ep_testing.tests.base import BaseTest
+from ep_testing.idf_mirror import IdfMirror
+from ep_testing.tests.base import BaseTest, RUNTIME_PATHS
 
 
-class TransitionOldFile(BaseTest):
+TRANSITION_BINARY = re.compile(r'^Transition-V(\d+)-(\d+)-(\d+)-to-V(\d+)-(\d+)-(\d+)(\.exe)?$', re.IGNORECASE)
+IDF_VERSION = re.compile(r'^\s*Version\s*,\s*(\d+)\.(\d+)', re.IGNORECASE | re.MULTILINE)
+
+
+def transition_chain(transition_dir: str) -> List[Tuple[Tuple[int, int], Tuple[int, int], str]]:
+    """All Transition-* binaries as ((from major, minor), (to major, minor), path), oldest first"""
+    chain = []
+    for f in os.scandir(transition_dir):
+        match = TRANSITION_BINARY.match(f.name)
+        if f.is_file() and match:
+            values = [int(x) for x in match.groups()[:6]]
+            chain.append(((values[0], values[1]), (values[3], values[4]), f.path))
+    chain.sort()
+    return chain
+
+
+def idf_version(idf_path: str) -> Tuple[int, int]:
+    with open(idf_path, errors='replace') as f:
+        match = IDF_VERSION.search(f.read())
+    if not match:
+        raise EPTestingException('Could not find the Version object in ' + idf_path)
+    return int(match.group(1)), int(match.group(2))
+
+
+class TransitionChain(BaseTest):
+    """Takes a test file from the prior release through every applicable Transition-* binary, then simulates it
+
+    The file comes from the local IDF mirror.  The binaries want their IDDs next to the input file, so the transition
+    runs right in IDFVersionUpdater, but in the test's private overlay of the install, so any number of these can run
+    concurrently without touching the install itself."""
+
+    mutates_install = True
 
     def name(self):
-        return 'Test running 1ZoneUncontrolled.idf and make sure it exits OK'
+        return 'Test transitioning a prior release file through the full Transition chain and running it'
+
+    def prepare(self, kwargs: dict) -> None:
+        if 'last_version' in kwargs and 'mirror_dir' in kwargs:
+            IdfMirror(kwargs['mirror_dir'], kwargs['last_version']).populate([
+                kwargs.get('test_file', '1ZoneUncontrolled.idf')
+            ])
+
+    def input_paths(self, kwargs: dict) -> List[str]:
+        return RUNTIME_PATHS + [os.path.join('PreProcess', 'IDFVersionUpdater')]
+
+    def writable_paths(self, kwargs: dict) -> List[str]:
+        return [os.path.join('PreProcess', 'IDFVersionUpdater')]
 
     def run(self, install_root: str, verbose: bool, kwargs: dict):
-        if 'last_version' not in kwargs:
-            raise EPTestingException('Bad call to %s -- must pass last_version in kwargs' % self.__class__.__name__)
+        for required in ('last_version', 'mirror_dir'):
+            if required not in kwargs:
+                raise EPTestingException('Bad call to %s -- must pass %s in kwargs' % (
+                    self.__class__.__name__, required
+                ))
 
         allow_failure = kwargs.get('allow_failure', False)
-
-        last_version = kwargs['last_version']
         test_file = kwargs.get('test_file', '1ZoneUncontrolled.idf')
-        print('* Running test class "%s" on file "%s"... ' % (self.__class__.__name__, test_file), end='')
-        transition_dir = os.path.join(install_root, 'PreProcess', 'IDFVersionUpdater')
-        all_transition_binaries = [
-            f.path for f in os.scandir(transition_dir) if f.is_file() and f.name.startswith('Transition-')
-        ]
-        if len(all_transition_binaries) < 1:
+        self._print('* Running test class "%s" on file "%s"... ' % (self.__class__.__name__, test_file), end='')
+        run_dir = os.path.join(install_root, 'PreProcess', 'IDFVersionUpdater')
+        chain = transition_chain(run_dir)
+        if len(chain) < 1:
             raise EPTestingException('Could not find any transition binaries...weird')
-        all_transition_binaries.sort()
-        most_recent_binary = all_transition_binaries[-1]
-        idf_url = 'https://raw.githubusercontent.com/NREL/EnergyPlus/%s/testfiles/%s' % (last_version, test_file)
-        saved_dir = os.getcwd()
-        os.chdir(transition_dir)
-        idf_path = os.path.join(transition_dir, test_file)
-        try:
-            _, headers = urllib.request.urlretrieve(idf_url, idf_path)
-        except Exception as e:
-            raise EPTestingException('Could not download file from prior release at %s; error: %s' % (idf_url, str(e)))
-
-        result = subprocess.run([most_recent_binary, os.path.basename(idf_path)],
-                                # capture_output added in python 3.7 only...
-                                # capture_output=True,
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                check=False)
-        try:
-            # Throw if failed
-            result.check_returncode()
-            if verbose:
-                print("STDOUT: {}".format(result.stdout.decode('utf-8')))
-                print("STDERR: {}".format(result.stderr.decode('utf-8')))
-            print(' [TRANSITIONED]! ', end='')
-        except subprocess.CalledProcessError:
-            # If it fails, I assume you'd be interested in the stdout&stderr
-            # to be able to diagnose
-            print("STDOUT: {}".format(result.stdout.decode('utf-8')))
-            print("STDERR: {}".format(result.stderr.decode('utf-8')))
-            msg = 'Transition failed!'
+
+        with self.phase('prepare'):
+            idf_path = os.path.join(run_dir, test_file)
+            shutil.copyfile(IdfMirror(kwargs['mirror_dir'], kwargs['last_version']).path(test_file), idf_path)
+
+        version = idf_version(idf_path)
+        steps = [step for step in chain if step[0] >= version]
+        if not steps:
+            msg = 'No transition binary applies to %s at version %i.%i!' % (test_file, version[0], version[1])
             if not allow_failure:
                 raise EPTestingException(msg)
-            else:
-                print(msg)
+            self._print(msg)
+            return
+
+        with self.phase('transition'):
+            for from_version, to_version, binary in steps:
+                command = [binary, test_file]
+                if not self._run_step(command, run_dir, 'Transition %s failed!' % os.path.basename(binary),
+                                      allow_failure):
+                    return
+                if idf_version(idf_path) != to_version:
+                    msg = '%s did not update %s to %i.%i!' % (
+                        os.path.basename(binary), test_file, to_version[0], to_version[1]
+                    )
+                    if not allow_failure:
+                        raise EPTestingException(msg)
+                    self._print(msg)
+                    return
+        self._print(' [TRANSITIONED %i.%i -> %i.%i in %i steps]! ' % (
+            steps[0][0][0], steps[0][0][1], steps[-1][1][0], steps[-1][1][1], len(steps)
+        ), end='')
 
-        os.chdir(install_root)
         eplus_binary = os.path.join(install_root, 'energyplus')
-        result = subprocess.run([eplus_binary, '-D', idf_path],
-                                # capture_output added in python 3.7 only...
-                                # capture_output=True,
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                check=False)
+        with self.phase('execute'):
+            if not self._run_step([eplus_binary, '-D', idf_path], self.working_dir,
+                                  'EnergyPlus failed to run Transitionned file!', allow_failure):
+                return
+        self._print(' [DONE]!')
+
+    def _run_step(self, command: List[str], cwd: str, failure_msg: str, allow_failure: bool) -> bool:
+        result = self.run_process(command, cwd=cwd)
         try:
-            # Throw if failed
-            result.check_returncode()
-            if verbose:
-                print("STDOUT: {}".format(result.stdout.decode('utf-8')))
-                print("STDERR: {}".format(result.stderr.decode('utf-8')))
-            print(' [TRANSITIONED]! ', end='')
-        except subprocess.CalledProcessError:
-            # If it fails, I assume you'd be interested in the stdout&stderr
-            # to be able to diagnose
-            print("STDOUT: {}".format(result.stdout.decode('utf-8')))
-            print("STDERR: {}".format(result.stderr.decode('utf-8')))
-            msg = 'EnergyPlus failed to run Transitionned file!'
+            result.check(failure_msg, self.output)
+            return True
+        except EPTestingException:
             if not allow_failure:
-                raise EPTestingException(msg)
-            else:
-                print(msg)
-
-        os.chdir(saved_dir)
+                raise
+            self._print(failure_msg)
+            return False
 
 
 # if __name__ == '__main__':
-#     t = TransitionOldFile().run(
-#         '/tmp/ep_package/EnergyPlus-9.3.0-5eeaa0ed25-Linux-x86_64', {'last_version': 'v9.2.0'}
+#     t = TransitionChain().run(
+#         '/tmp/ep_package/EnergyPlus-9.3.0-5eeaa0ed25-Linux-x86_64', False,
+#         {'last_version': 'v9.2.0', 'mirror_dir': '/tmp/idf_mirror'}
 #     )
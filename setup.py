@@ -1,9 +1,31 @@
 import distutils.cmd
 import distutils.log
+import json
 from setuptools import setup
+from ep_testing.benchmark import SimulationBenchmark
 from ep_testing.downloader import Downloader
+from ep_testing.history import format_growth, format_trends, ResultsStore
+from ep_testing.http_client import shared_client
+from ep_testing.manifest import load_manifest, ManifestDiff
+from ep_testing.matrix import Matrix
+from ep_testing.pipeline import Pipeline
 from ep_testing.tester import Tester
-from ep_testing.config import TestConfiguration, CONFIGURATIONS
+from ep_testing.tests.comparison import TestOutputsMatchLastRelease
+from ep_testing.config import default_history_db_path, TestConfiguration, CONFIGURATIONS
+from ep_testing.scheduler import default_job_count, format_summary, Scheduler, TestTask
+from ep_testing.sweep import merge_reports, parse_shard, Sweep
+
+
+def parse_jobs(jobs) -> int:
+    if jobs is None:
+        return default_job_count()
+    try:
+        jobs = int(jobs)
+    except ValueError:
+        raise Exception("Parameter --jobs must be an integer")
+    if jobs < 1:
+        raise Exception("Parameter --jobs must be at least 1")
+    return jobs
 
 
 class Runner(distutils.cmd.Command):
@@ -13,11 +35,16 @@ class Runner(distutils.cmd.Command):
     user_options = [
         # The format is (long option, short option, description).
         ('run-config=', None, 'Run configuration, see possible options in config.py'),
+        ('jobs=', 'j', 'Number of tests to run concurrently, defaults to the number of CPUs'),
+        ('force', 'f', 'Run every test, even those that passed before against identical inputs'),
     ]
+    boolean_options = ['force']
 
     def __init__(self, dist):
         super().__init__(dist)
         self.run_config = None
+        self.jobs = None
+        self.force = False
 
     def initialize_options(self):
         ...
@@ -27,16 +54,331 @@ class Runner(distutils.cmd.Command):
             raise Exception("Parameter --run_config is missing")
         if self.run_config not in CONFIGURATIONS:
             raise Exception("Parameter --run_config has invalid value, see options in config.py")
+        self.jobs = parse_jobs(self.jobs)
 
     def run(self):
         verbose = True
         c = TestConfiguration(self.run_config)
         self.announce('Attempting to test tag name: %s' % c.tag_this_version, level=distutils.log.INFO)
-        d = Downloader(c, self.announce)
+        # the tests are prepared while the installer downloads, and start as soon as the install and their
+        # preparations are there; the API builds run inside the scheduler, concurrently with the other tests
+        t = Tester(c, None, verbose, self.jobs, force=bool(self.force))
+        tasks = t.tasks()
+        p = Pipeline()
+        p.add('download', lambda: Downloader(c, self.announce))
+        p.add('prepare tests', lambda: t.prepare(tasks))
+        p.add('tests', lambda d, _: self._run_tests(t, tasks, d, p), ['download', 'prepare tests'])
+        try:
+            # unhandled exceptions should cause this to fail
+            p.wait()
+        finally:
+            self.announce(shared_client().timing_summary(), level=distutils.log.INFO)
+
+    def _run_tests(self, t: Tester, tasks: list, d: Downloader, p: Pipeline) -> None:
         self.announce('EnergyPlus package extracted to: ' + d.extracted_install_path(), level=distutils.log.INFO)
-        t = Tester(c, d.extracted_install_path(), verbose)
-        # unhandled exceptions should cause this to fail
-        t.run()
+        t.install_path = d.extracted_install_path()
+        t.asset = d.asset_metadata()
+        t.prior_phases = d.instrumentation.records + p.instrumentation.records
+        t.run(tasks)
+
+
+class MatrixRunner(distutils.cmd.Command):
+    """A custom command to run E+ tests on several configurations using `setup.py matrix --run-configs <key>,<key>`"""
+
+    description = 'Run E+ tests for several run configurations and release tags in one process'
+    user_options = [
+        ('run-configs=', None, 'Comma separated run configurations, see possible options in config.py'),
+        ('tags=', None, 'Comma separated release tags to test, defaults to the tag in config.py'),
+        ('jobs=', 'j', 'Number of tests to run concurrently, defaults to the number of CPUs'),
+        ('force', 'f', 'Run every test, even those that passed before against identical inputs'),
+    ]
+    boolean_options = ['force']
+
+    def __init__(self, dist):
+        super().__init__(dist)
+        self.run_configs = None
+        self.tags = None
+        self.jobs = None
+        self.force = False
+
+    def initialize_options(self):
+        ...
+
+    def finalize_options(self):
+        if self.run_configs is None:
+            raise Exception("Parameter --run-configs is missing")
+        self.run_configs = [key.strip() for key in self.run_configs.split(',') if key.strip()]
+        for key in self.run_configs:
+            if key not in CONFIGURATIONS:
+                raise Exception("Parameter --run-configs has invalid value %s, see options in config.py" % key)
+        if self.tags is not None:
+            self.tags = [tag.strip() for tag in self.tags.split(',') if tag.strip()]
+        self.jobs = parse_jobs(self.jobs)
+
+    def run(self):
+        verbose = True
+        m = Matrix(self.run_configs, self.tags, verbose, self.jobs, self.announce, bool(self.force))
+        try:
+            # unhandled exceptions should cause this to fail
+            m.run()
+        finally:
+            self.announce(shared_client().timing_summary(), level=distutils.log.INFO)
+
+
+class BenchmarkRunner(distutils.cmd.Command):
+    """A custom command to compare simulation performance against the last release using `setup.py benchmark`"""
+
+    description = 'Benchmark EnergyPlus simulations of this release against the last release'
+    user_options = [
+        ('run-config=', None, 'Run configuration, see possible options in config.py'),
+        ('files=', None, 'Comma separated ExampleFiles IDFs to benchmark, defaults to the list in config.py'),
+        ('repetitions=', 'n', 'Number of runs of each file on each release'),
+        ('threshold=', None, 'Relative median slowdown that counts as a regression, like 0.05'),
+    ]
+
+    def __init__(self, dist):
+        super().__init__(dist)
+        self.run_config = None
+        self.files = None
+        self.repetitions = None
+        self.threshold = None
+
+    def initialize_options(self):
+        ...
+
+    def finalize_options(self):
+        if self.run_config is None:
+            raise Exception("Parameter --run_config is missing")
+        if self.run_config not in CONFIGURATIONS:
+            raise Exception("Parameter --run_config has invalid value, see options in config.py")
+        if self.files is not None:
+            self.files = [f.strip() for f in self.files.split(',') if f.strip()]
+        try:
+            self.repetitions = int(self.repetitions) if self.repetitions is not None else None
+            self.threshold = float(self.threshold) if self.threshold is not None else None
+        except ValueError:
+            raise Exception("Parameters --repetitions and --threshold must be numbers")
+
+    def run(self):
+        c = TestConfiguration(self.run_config)
+        last_c = TestConfiguration(self.run_config, c.tag_last_version)
+        self.announce('Benchmarking tag %s against %s' % (c.tag_this_version, c.tag_last_version), distutils.log.INFO)
+        this_install = Downloader(c, self.announce).extracted_install_path()
+        last_install = Downloader(last_c, self.announce).extracted_install_path()
+        b = SimulationBenchmark(
+            this_install, last_install,
+            self.files if self.files else c.benchmark_files,
+            self.repetitions if self.repetitions else c.benchmark_repetitions,
+            self.threshold if self.threshold is not None else c.benchmark_threshold,
+            c.benchmark_alpha, timeout=c.test_timeout
+        )
+        b.run()
+        print(b.summary_table())
+        self.announce('Benchmark report written to ' + b.write_report(c.report_dir), level=distutils.log.INFO)
+        regressions = b.regressions()
+        if regressions:
+            raise Exception('Significant slowdown on: ' + ', '.join(r['test_file'] for r in regressions))
+
+
+class CompareRunner(distutils.cmd.Command):
+    """A custom command to compare simulation outputs against the last release using `setup.py compare`"""
+
+    description = 'Compare the reported time series of this release against the last release'
+    user_options = [
+        ('run-config=', None, 'Run configuration, see possible options in config.py'),
+        ('files=', None, 'Comma separated ExampleFiles IDFs to compare, defaults to the list in config.py'),
+        ('atol=', None, 'Absolute tolerance on every reported value'),
+        ('rtol=', None, 'Relative tolerance on every reported value, relative to the last release'),
+        ('jobs=', 'j', 'Number of files to run concurrently, defaults to the number of CPUs'),
+    ]
+
+    def __init__(self, dist):
+        super().__init__(dist)
+        self.run_config = None
+        self.files = None
+        self.atol = None
+        self.rtol = None
+        self.jobs = None
+
+    def initialize_options(self):
+        ...
+
+    def finalize_options(self):
+        if self.run_config is None:
+            raise Exception("Parameter --run_config is missing")
+        if self.run_config not in CONFIGURATIONS:
+            raise Exception("Parameter --run_config has invalid value, see options in config.py")
+        if self.files is not None:
+            self.files = [f.strip() for f in self.files.split(',') if f.strip()]
+        try:
+            self.atol = float(self.atol) if self.atol is not None else None
+            self.rtol = float(self.rtol) if self.rtol is not None else None
+        except ValueError:
+            raise Exception("Parameters --atol and --rtol must be numbers")
+        self.jobs = parse_jobs(self.jobs)
+
+    def run(self):
+        c = TestConfiguration(self.run_config)
+        last_c = TestConfiguration(self.run_config, c.tag_last_version)
+        self.announce('Comparing tag %s against %s' % (c.tag_this_version, c.tag_last_version), distutils.log.INFO)
+        this_install = Downloader(c, self.announce).extracted_install_path()
+        last_install = Downloader(last_c, self.announce).extracted_install_path()
+        kwargs = {
+            'last_install': last_install,
+            'atol': self.atol if self.atol is not None else c.compare_atol,
+            'rtol': self.rtol if self.rtol is not None else c.compare_rtol,
+        }
+        tasks = [
+            TestTask(TestOutputsMatchLastRelease(), dict(kwargs, test_file=f))
+            for f in (self.files if self.files else c.compare_files)
+        ]
+        results = Scheduler(this_install, True, self.jobs, timeout=c.test_timeout).run(tasks)
+        print(format_summary(results))
+        failures = [r for r in results if not r.passed]
+        if failures:
+            raise Exception('Outputs differ on: ' + ', '.join(r.task.kwargs['test_file'] for r in failures))
+
+
+class SweepRunner(distutils.cmd.Command):
+    """A custom command to run every ExampleFiles IDF using `setup.py sweep --run-config <key> --shard i/N`"""
+
+    description = 'Run all ExampleFiles through EnergyPlus, optionally split in shards across machines'
+    user_options = [
+        ('run-config=', None, 'Run configuration, see possible options in config.py'),
+        ('shard=', None, 'Run only shard i of N (1-based), like 2/4'),
+        ('jobs=', 'j', 'Number of simulations to run concurrently, defaults to the number of CPUs'),
+        ('merge-reports=', None, 'Instead of running, merge these comma separated shard reports into one'),
+    ]
+
+    def __init__(self, dist):
+        super().__init__(dist)
+        self.run_config = None
+        self.shard = None
+        self.jobs = None
+        self.merge_reports = None
+
+    def initialize_options(self):
+        ...
+
+    def finalize_options(self):
+        if self.merge_reports is not None:
+            self.merge_reports = [p.strip() for p in self.merge_reports.split(',') if p.strip()]
+            return
+        if self.run_config is None:
+            raise Exception("Parameter --run_config is missing")
+        if self.run_config not in CONFIGURATIONS:
+            raise Exception("Parameter --run_config has invalid value, see options in config.py")
+        self.shard = parse_shard(self.shard) if self.shard else (0, 1)
+        self.jobs = parse_jobs(self.jobs)
+
+    def run(self):
+        if self.merge_reports:
+            merged = merge_reports(self.merge_reports)
+            with open('ep_testing_sweep_merged.json', 'w') as f:
+                json.dump(merged, f, indent=2)
+            self.announce('Merged %i results, %i passed' % (merged['total'], merged['passed']), distutils.log.INFO)
+            if merged['missing_shards']:
+                raise Exception('Shard reports missing for shards %s' % merged['missing_shards'])
+            if merged['passed'] != merged['total']:
+                raise Exception('Failed: ' + ', '.join(r['test_file'] for r in merged['results'] if not r['passed']))
+            return
+        c = TestConfiguration(self.run_config)
+        d = Downloader(c, self.announce)
+        s = Sweep(d.extracted_install_path(), True, self.jobs, self.shard, c.sweep_history_path, c.test_timeout)
+        results = s.run()
+        self.announce('Sweep report written to ' + s.write_report(c.report_dir, results), distutils.log.INFO)
+        failures = [r for r in results if not r.passed]
+        if failures:
+            raise Exception('%i of %i simulations failed' % (len(failures), len(results)))
+
+
+class DiffRunner(distutils.cmd.Command):
+    """A custom command to compare install manifests using `setup.py diff --run-config <key>`"""
+
+    description = 'Compare the installed files of this release against the last release before running any test'
+    user_options = [
+        ('run-config=', None, 'Run configuration, see possible options in config.py'),
+        ('manifests=', None, 'Instead of downloading, compare these two manifests: last.json,this.json'),
+    ]
+
+    def __init__(self, dist):
+        super().__init__(dist)
+        self.run_config = None
+        self.manifests = None
+
+    def initialize_options(self):
+        ...
+
+    def finalize_options(self):
+        if self.manifests is not None:
+            self.manifests = [p.strip() for p in self.manifests.split(',') if p.strip()]
+            if len(self.manifests) != 2:
+                raise Exception("Parameter --manifests must be two comma separated paths")
+            return
+        if self.run_config is None:
+            raise Exception("Parameter --run_config is missing")
+        if self.run_config not in CONFIGURATIONS:
+            raise Exception("Parameter --run_config has invalid value, see options in config.py")
+
+    def run(self):
+        if self.manifests:
+            last_manifest, this_manifest = (load_manifest(p) for p in self.manifests)
+            diff = ManifestDiff(last_manifest, this_manifest)
+        else:
+            c = TestConfiguration(self.run_config)
+            last_c = TestConfiguration(self.run_config, c.tag_last_version)
+            self.announce('Comparing installed files of %s against %s' % (c.tag_this_version, c.tag_last_version),
+                          distutils.log.INFO)
+            this_manifest = Downloader(c, self.announce).manifest
+            last_manifest = Downloader(last_c, self.announce).manifest
+            diff = ManifestDiff(last_manifest, this_manifest, c.manifest_library_growth)
+        print(diff.report())
+        if diff.problems():
+            raise Exception('%i problems in the installed files' % len(diff.problems()))
+
+
+class HistoryRunner(distutils.cmd.Command):
+    """A custom command to query the results of earlier runs using `setup.py history --trends`"""
+
+    description = 'Show duration trends and the slowest growing tests across release tags, or export them as CSV'
+    user_options = [
+        ('run-config=', None, 'Only show runs of this run configuration'),
+        ('test=', None, 'Only show tests whose label contains this'),
+        ('growth=', None, 'Show this many of the tests whose duration grew the most, instead of the trends'),
+        ('csv=', None, 'Instead of showing anything, export every stored result to this CSV file'),
+    ]
+
+    def __init__(self, dist):
+        super().__init__(dist)
+        self.run_config = None
+        self.test = None
+        self.growth = None
+        self.csv = None
+
+    def initialize_options(self):
+        ...
+
+    def finalize_options(self):
+        if self.run_config is not None and self.run_config not in CONFIGURATIONS:
+            raise Exception("Parameter --run_config has invalid value, see options in config.py")
+        if self.growth is not None:
+            try:
+                self.growth = int(self.growth)
+            except ValueError:
+                raise Exception("Parameter --growth must be an integer")
+
+    def run(self):
+        store = ResultsStore(default_history_db_path())
+        if self.csv:
+            with open(self.csv, 'w', newline='') as f:
+                rows = store.export_csv(f, self.run_config)
+            self.announce('Exported %i results to %s' % (rows, self.csv), distutils.log.INFO)
+        elif self.growth is not None:
+            growing = store.slowest_growing(self.run_config, self.growth)
+            print(format_growth(growing) if growing else 'No test has results on more than one release tag')
+        else:
+            trends = store.trends(self.run_config, self.test)
+            print(format_trends(trends) if trends else 'No results stored yet')
 
 
 setup(
@@ -50,5 +392,11 @@ setup(
     description='A small set of test scripts that will pull E+ installers and run a series of tests on them',
     cmdclass={
         'run': Runner,
+        'matrix': MatrixRunner,
+        'benchmark': BenchmarkRunner,
+        'compare': CompareRunner,
+        'sweep': SweepRunner,
+        'diff': DiffRunner,
+        'history': HistoryRunner,
     },
 )
@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+
+from ep_testing.cache import InstallerCache, ResultCache
+from ep_testing.tests.base import BaseTest
+
+
+def test_one_downloader_builds_a_shared_entry(tmp_path):
+    cache = InstallerCache(str(tmp_path / 'cache'), 10 * 1024 * 1024)
+    key = cache.key('v9.4.0', {'id': 1, 'size': 100})
+    builds = []
+    install_paths = []
+
+    def download():
+        entry = cache.lookup(key)
+        if entry is None:
+            with cache.building(key):
+                entry = cache.lookup(key)
+                if entry is None:
+                    staging = cache.staging_dir(key)
+                    os.makedirs(os.path.join(staging, 'ep_package', 'EnergyPlus'))
+                    # slow enough for the others to miss too and queue up on the lock
+                    time.sleep(0.2)
+                    builds.append(threading.get_ident())
+                    entry = cache.commit(key, staging, {'install_subpath': 'ep_package/EnergyPlus'})
+        install_paths.append(cache.install_path(key, entry))
+
+    threads = [threading.Thread(target=download) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert len(install_paths) == 4
+    assert all(os.path.isdir(path) for path in install_paths)
+
+
+class Inputs(BaseTest):
+
+    def name(self):
+        return 'inputs'
+
+    def input_paths(self, kwargs: dict):
+        return ['energyplus*']
+
+
+def test_result_cache_shared_by_concurrent_runs(tmp_path):
+    install = tmp_path / 'install'
+    install.mkdir()
+    (install / 'energyplus').write_bytes(b'binary')
+    first, second = (ResultCache(str(tmp_path / 'cache'), 100) for _ in range(2))
+    key = first.key(Inputs(), {}, str(install))
+    assert second.key(Inputs(), {}, str(install)) == key
+    # the memo is only written at the end of a run, merged with what the other one wrote
+    assert not os.path.exists(first.digests_path)
+    first.store(key, 'inputs', 1.0)
+    second.store('other', 'other', 2.0)
+    assert first.lookup(key) is not None and first.lookup('other') is not None
+    (install / 'energyplus.dll').write_bytes(b'library')
+    second.file_digest(str(install / 'energyplus.dll'))
+    first.save_file_digests()
+    second.save_file_digests()
+    assert len(ResultCache(str(tmp_path / 'cache'), 100)._file_digests) == 2
@@ -0,0 +1,60 @@
+import sqlite3
+
+import numpy as np
+
+from ep_testing.compare import load_csv, load_outputs, load_sql
+
+CSV = """Date/Time,Environment:Site Outdoor Air Drybulb Temperature [C](Hourly),Electricity:Facility [J](Daily)
+ 12/21  01:00:00,-16.0,
+ 12/21  02:00:00,-17.5,
+ 12/21  24:00:00,-18.0,3000.0
+"""
+
+
+def test_csv_drops_the_blank_cells_of_less_frequent_variables(tmp_path):
+    csv_path = tmp_path / 'eplusout.csv'
+    csv_path.write_text(CSV)
+    outputs = load_csv(str(csv_path))
+    assert list(outputs['Environment:Site Outdoor Air Drybulb Temperature [C] (Hourly)']) == [-16.0, -17.5, -18.0]
+    assert list(outputs['Electricity:Facility [J] (Daily)']) == [3000.0]
+
+
+def test_sql_series_come_out_in_time_order_whatever_the_row_order(tmp_path):
+    sql_path = str(tmp_path / 'eplusout.sql')
+    connection = sqlite3.connect(sql_path)
+    connection.execute(
+        'CREATE TABLE ReportDataDictionary (ReportDataDictionaryIndex INTEGER PRIMARY KEY, KeyValue TEXT, Name TEXT, '
+        'Units TEXT, ReportingFrequency TEXT)'
+    )
+    connection.execute(
+        'CREATE TABLE ReportData (ReportDataIndex INTEGER PRIMARY KEY, TimeIndex INTEGER, '
+        'ReportDataDictionaryIndex INTEGER, Value REAL)'
+    )
+    connection.executemany('INSERT INTO ReportDataDictionary VALUES (?, ?, ?, ?, ?)', [
+        (7, 'Environment', 'Site Outdoor Air Drybulb Temperature', 'C', 'Hourly'),
+        (8, None, 'Electricity:Facility', 'J', 'Hourly'),
+        (9, None, 'Gas:Facility', 'J', 'Hourly'),
+    ])
+    connection.executemany('INSERT INTO ReportData (TimeIndex, ReportDataDictionaryIndex, Value) VALUES (?, ?, ?)', [
+        (2, 8, 2000.0), (1, 7, -16.0), (2, 7, -17.5), (1, 8, 1000.0),
+    ])
+    connection.commit()
+    connection.close()
+    outputs = load_sql(sql_path)
+    assert list(outputs['Environment:Site Outdoor Air Drybulb Temperature [C] (Hourly)']) == [-16.0, -17.5]
+    assert list(outputs['Electricity:Facility [J] (Hourly)']) == [1000.0, 2000.0]
+    assert outputs['Gas:Facility [J] (Hourly)'].shape == (0,)
+
+
+def test_run_directory_prefers_the_eso(tmp_path):
+    (tmp_path / 'eplusout.csv').write_text(CSV)
+    (tmp_path / 'eplusout.eso').write_text(
+        'Program Version,EnergyPlus, Version 9.4.0-998c4b761e, YMD=2020.10.01 12:00\n'
+        '7,1,Environment,Site Outdoor Air Drybulb Temperature [C] !Hourly\n'
+        'End of Data Dictionary\n'
+        '7,-1.0\n'
+        'End of Data\n'
+    )
+    outputs = load_outputs(str(tmp_path))
+    assert list(outputs) == ['Environment:Site Outdoor Air Drybulb Temperature [C] (Hourly)']
+    assert np.array_equal(outputs['Environment:Site Outdoor Air Drybulb Temperature [C] (Hourly)'], [-1.0])
@@ -0,0 +1,46 @@
+import os
+import stat
+
+import pytest
+
+from ep_testing.cache import ResultCache
+from ep_testing.tests import documentation
+from ep_testing.tests.documentation import TestVersionInfoInAllDocumentation as AllDocumentation
+
+
+def fake_pdftotext(bin_dir, log_path):
+    """A pdftotext that logs the PDFs it converts and prints their contents as the front page"""
+    script = bin_dir / 'pdftotext'
+    # called as pdftotext -f 1 -l 1 <pdf> -
+    script.write_text('#!/bin/sh\necho "$5" >> "%s"\ncat "$5"\n' % log_path)
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='the fake pdftotext is a shell script')
+def test_first_pages_are_keyed_by_the_result_cache_digests(tmp_path, monkeypatch):
+    install = tmp_path / 'install'
+    (install / 'Documentation').mkdir(parents=True)
+    for name in ('InputOutputReference.pdf', 'EngineeringReference.pdf'):
+        (install / 'Documentation' / name).write_text('EnergyPlus Version 9.5 ' + name)
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    converted = tmp_path / 'converted.log'
+    fake_pdftotext(bin_dir, converted)
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ['PATH'])
+
+    def no_rehash(path):
+        raise AssertionError('%s hashed a second time' % path)
+
+    monkeypatch.setattr(documentation, 'file_sha256', no_rehash)
+    kwargs = {'version_string': '9.5', 'cache_dir': str(tmp_path / 'cache')}
+    for run in range(2):
+        test = AllDocumentation()
+        test.working_dir = str(tmp_path / ('run%i' % run))
+        os.makedirs(test.working_dir)
+        test.result_cache = ResultCache(str(tmp_path / 'cache'), 100)
+        # what the scheduler does before running a cacheable test
+        test.result_cache.key(test, kwargs, str(install))
+        test.run(str(install), False, kwargs)
+        test.result_cache.save_file_digests()
+    # the second run found both front pages in the cache
+    assert len(converted.read_text().splitlines()) == 2
@@ -0,0 +1,61 @@
+from ep_testing.eso import EsoReader
+
+DAILY_TIME_CODE = (
+    '3,5,Cumulative Day of Simulation[],Month[],Day of Month[],DST Indicator[1=yes 0=no],DayType  '
+    '! When Daily Report Variables Requested'
+)
+
+ESO_9X = """Program Version,EnergyPlus, Version 9.4.0-998c4b761e, YMD=2020.10.01 12:00
+1,5,Environment Title[],Latitude[deg],Longitude[deg],Time Zone[],Elevation[m]
+2,8,Day of Simulation[],Month[],Day of Month[],DST Indicator[1=yes 0=no],Hour[],StartMinute[],EndMinute[],DayType
+{daily}
+4,2,Cumulative Days of Simulation[],Month[]  ! When Monthly Report Variables Requested
+5,1,Cumulative Days of Simulation[] ! When Run Period Report Variables Requested
+6,1,Calendar Year of Simulation[] ! When Annual Report Variables Requested
+7,1,Environment,Site Outdoor Air Drybulb Temperature [C] !Hourly
+8,1,Electricity:Facility [J] !Hourly
+End of Data Dictionary
+1,DENVER ANN HTG 99.6% CONDNS DB,  39.83, -104.65,  -7.00, 1650.00
+2,1, 12,21, 0, 1, 0.00,60.00,WinterDesignDay
+7,-16.0
+8,1000.0
+2,1, 12,21, 0, 2, 0.00,60.00,WinterDesignDay
+7,-17.5
+8,2000.0
+End of Data
+Number of Records Written=6
+""".format(daily=DAILY_TIME_CODE)
+
+ESO_8X = """Program Version,EnergyPlus, Version 8.9.0-40101eaafd, YMD=2018.03.27 12:00
+1,5,Environment Title[],Latitude[deg],Longitude[deg],Time Zone[],Elevation[m]
+2,8,Day of Simulation[],Month[],Day of Month[],DST Indicator[1=yes 0=no],Hour[],StartMinute[],EndMinute[],DayType
+{daily}
+4,2,Cumulative Days of Simulation[],Month[]  ! When Monthly Report Variables Requested
+5,1,Cumulative Days of Simulation[] ! When Run Period Report Variables Requested
+6,1,Environment,Site Outdoor Air Drybulb Temperature [C] !Hourly
+End of Data Dictionary
+2,1, 12,21, 0, 1, 0.00,60.00,WinterDesignDay
+6,-16.0
+End of Data
+""".format(daily=DAILY_TIME_CODE)
+
+
+def test_calendar_year_code_is_not_a_variable(tmp_path):
+    eso_path = tmp_path / 'eplusout.eso'
+    eso_path.write_text(ESO_9X)
+    with EsoReader(str(eso_path)) as reader:
+        assert sorted(reader.keys()) == [
+            'Electricity:Facility [J] (Hourly)',
+            'Environment:Site Outdoor Air Drybulb Temperature [C] (Hourly)',
+        ]
+        key, = reader.find('Site Outdoor Air Drybulb Temperature', 'Environment')
+        assert list(reader.series(key)) == [-16.0, -17.5]
+        assert list(reader.series('Electricity:Facility [J] (Hourly)')) == [1000.0, 2000.0]
+
+
+def test_first_variable_right_after_five_time_codes(tmp_path):
+    eso_path = tmp_path / 'eplusout.eso'
+    eso_path.write_text(ESO_8X)
+    with EsoReader(str(eso_path)) as reader:
+        assert reader.keys() == ['Environment:Site Outdoor Air Drybulb Temperature [C] (Hourly)']
+        assert list(reader.series(reader.keys()[0])) == [-16.0]
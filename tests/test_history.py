@@ -0,0 +1,32 @@
+from ep_testing import scheduler as ep_scheduler
+from ep_testing.history import ResultsStore, task_identity
+from ep_testing.tests.base import BaseTest
+
+
+class Transition(BaseTest):
+
+    def name(self):
+        return 'transition'
+
+
+def transition_task(tmp_path, run: str) -> ep_scheduler.TestTask:
+    return ep_scheduler.TestTask(Transition(), {
+        'test_file': '1ZoneUncontrolled.idf', 'last_version': '9.3.0',
+        'mirror_dir': str(tmp_path / run / 'idf_mirror'), 'cache_dir': None if run == 'first' else str(tmp_path),
+    })
+
+
+def test_runs_with_different_temp_dirs_share_one_identity(tmp_path):
+    first, second = transition_task(tmp_path, 'first'), transition_task(tmp_path, 'second')
+    assert task_identity(first) == task_identity(second)
+    other_file = transition_task(tmp_path, 'second')
+    other_file.kwargs['test_file'] = '5ZoneAirCooled.idf'
+    assert task_identity(other_file) != task_identity(first)
+
+    store = ResultsStore(str(tmp_path / 'results.db'))
+    result = ep_scheduler.TestResult(first, str(tmp_path / 'first'))
+    result.passed = True
+    result.duration = 12.5
+    store.record_run('v9.4.0', 'linux', None, [result])
+    assert store.estimate_durations([second], 'linux') == 1
+    assert second.estimate == 12.5
@@ -0,0 +1,18 @@
+import gc
+import logging
+import sys
+import time
+
+from ep_testing.process import shared_runner
+
+
+def test_timeout_kills_the_child_without_asyncio_noise(caplog):
+    with caplog.at_level(logging.ERROR, logger='asyncio'):
+        result = shared_runner().run([sys.executable, '-c', 'import time; time.sleep(30)'], timeout=0.5)
+        # the cancelled gather only complains once it is collected
+        time.sleep(0.2)
+        gc.collect()
+        time.sleep(0.2)
+    assert result.timed_out
+    assert result.returncode != 0
+    assert not [r for r in caplog.records if 'never retrieved' in r.getMessage()]
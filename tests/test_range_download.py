@@ -0,0 +1,133 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import hashlib
+import json
+import os
+from socketserver import ThreadingMixIn
+import threading
+
+import pytest
+
+from ep_testing.exceptions import EPTestingException
+from ep_testing.http_client import HttpClient
+from ep_testing.range_download import RangeDownloader
+
+PART_SIZE = 64 * 1024
+CONTENT = os.urandom(10 * PART_SIZE + 123)
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FileServer:
+    """Serves CONTENT on localhost, with or without Range support, and can cut a range short once to test retries"""
+
+    def __init__(self, ranges: bool = True, drop_once: str = None):
+        self.ranges = ranges
+        self.drop_once = drop_once
+        self.requested = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                requested = self.headers.get('Range')
+                with server._lock:
+                    server.requested.append(requested)
+                    drop = requested is not None and requested == server.drop_once
+                    if drop:
+                        server.drop_once = None
+                if requested and server.ranges:
+                    start, end = (int(v) for v in requested[len('bytes='):].split('-'))
+                    body = CONTENT[start:end + 1]
+                    self.send_response(206)
+                    self.send_header('Content-Range', 'bytes %i-%i/%i' % (start, end, len(CONTENT)))
+                else:
+                    body = CONTENT
+                    self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                # a dropped connection sends half the promised body
+                self.wfile.write(body[:len(body) // 2] if drop else body)
+
+            def log_message(self, *_):
+                pass
+
+        self.httpd = ThreadingServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%i/ep.tar.gz' % self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def part_requests(self):
+        # leaves out the probe for the first byte
+        return [r for r in self.requested if r and r != 'bytes=0-0']
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(**kwargs):
+        servers.append(FileServer(**kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def downloader(server: FileServer, target_path: str, **kwargs) -> RangeDownloader:
+    return RangeDownloader(
+        server.url, target_path, expected_size=len(CONTENT), part_size=PART_SIZE, connections=4,
+        announce=lambda *_: None, client=HttpClient(max_retries=1), **kwargs
+    )
+
+
+def test_parallel_parts_with_a_dropped_connection(serve, tmp_path):
+    server = serve(drop_once='bytes=%i-%i' % (3 * PART_SIZE, 4 * PART_SIZE - 1))
+    target_path = str(tmp_path / 'ep.tar.gz')
+    sha256 = downloader(server, target_path, expected_sha256=hashlib.sha256(CONTENT).hexdigest()).download()
+    with open(target_path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert sha256 == hashlib.sha256(CONTENT).hexdigest()
+    # eleven parts, one of them twice
+    assert len(server.part_requests()) == 12
+    assert not os.path.exists(target_path + '.part') and not os.path.exists(target_path + '.part.json')
+
+
+def test_resumes_from_the_state_file(serve, tmp_path):
+    server = serve()
+    target_path = str(tmp_path / 'ep.tar.gz')
+    # an earlier attempt got the first five parts before it was interrupted
+    with open(target_path + '.part', 'wb') as f:
+        f.write(CONTENT[:5 * PART_SIZE])
+        f.truncate(len(CONTENT))
+    with open(target_path + '.part.json', 'w') as f:
+        json.dump({'url': server.url, 'size': len(CONTENT), 'part_size': PART_SIZE, 'completed': [0, 1, 2, 3, 4]}, f)
+    downloader(server, target_path).download()
+    with open(target_path, 'rb') as f:
+        assert f.read() == CONTENT
+    starts = sorted(int(r[len('bytes='):].split('-')[0]) for r in server.part_requests())
+    assert starts == [index * PART_SIZE for index in range(5, 11)]
+
+
+def test_falls_back_to_one_stream_without_range_support(serve, tmp_path):
+    server = serve(ranges=False)
+    target_path = str(tmp_path / 'ep.tar.gz')
+    downloader(server, target_path).download()
+    with open(target_path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert server.requested == ['bytes=0-0', None]
+
+
+def test_digest_mismatch_throws_the_download_away(serve, tmp_path):
+    server = serve()
+    target_path = str(tmp_path / 'ep.tar.gz')
+    with pytest.raises(EPTestingException, match='Digest mismatch'):
+        downloader(server, target_path, expected_sha256='0' * 64).download()
+    assert not os.path.exists(target_path)
+    assert not os.path.exists(target_path + '.part') and not os.path.exists(target_path + '.part.json')
@@ -0,0 +1,67 @@
+import threading
+
+from ep_testing import scheduler as ep_scheduler
+from ep_testing.tests.base import BaseTest
+
+
+class Instant(BaseTest):
+
+    cacheable = False
+
+    def name(self):
+        return 'instant'
+
+    def run(self, install_root: str, verbose: bool, kwargs: dict):
+        if kwargs.get('fail'):
+            raise Exception('failed on purpose')
+        self.seen = kwargs.get('seen')
+
+    def input_paths(self, kwargs: dict):
+        return []
+
+
+def run_within(scheduler, tasks, timeout=30):
+    """Runs the scheduler on another thread, so that a deadlock fails the test instead of hanging it"""
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.update(results=scheduler.run(tasks)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'scheduler did not finish within %s seconds' % timeout
+    return outcome['results']
+
+
+def test_instantly_finishing_chains(tmp_path):
+    for jobs in (1, 2, 4):
+        for trial in range(20):
+            tasks = []
+            for chain in range(5):
+                for step in range(4):
+                    tasks.append(ep_scheduler.TestTask(
+                        Instant(), {}, name='c%i_%i' % (chain, step),
+                        depends_on=['c%i_%i' % (chain, step - 1)] if step else [],
+                    ))
+            sandbox_root = str(tmp_path / ('%i_%i' % (jobs, trial)))
+            results = run_within(ep_scheduler.Scheduler('', False, jobs=jobs, sandbox_root=sandbox_root), tasks)
+            assert [r.task for r in results] == tasks
+            assert all(r.passed for r in results)
+
+
+def test_failure_skips_everything_downstream(tmp_path):
+    tasks = [
+        ep_scheduler.TestTask(Instant(), {'fail': True}, name='broken'),
+        ep_scheduler.TestTask(Instant(), {}, name='direct', depends_on=['broken']),
+        ep_scheduler.TestTask(Instant(), {}, name='indirect', depends_on=['direct']),
+        ep_scheduler.TestTask(Instant(), {}, name='unrelated'),
+    ]
+    results = run_within(ep_scheduler.Scheduler('', False, jobs=2, sandbox_root=str(tmp_path / 'sandbox')), tasks)
+    assert [(r.passed, r.skipped) for r in results] == [(False, False), (False, True), (False, True), (True, False)]
+
+
+def test_workdir_reference_resolves_to_the_prerequisite_sandbox(tmp_path):
+    tasks = [
+        ep_scheduler.TestTask(Instant(), {}, name='producer'),
+        ep_scheduler.TestTask(Instant(), {'seen': '${workdir:producer}/out.idf'}, name='consumer'),
+    ]
+    results = run_within(ep_scheduler.Scheduler('', False, jobs=2, sandbox_root=str(tmp_path / 'sandbox')), tasks)
+    assert all(r.passed for r in results)
+    assert tasks[1].test.seen == results[0].working_dir.replace('\\', '/') + '/out.idf'